@@ -0,0 +1,234 @@
+import heapq
+import os
+from array import array
+
+from query import SEVERITY_RANK, QueryError, parse_int
+from store import NO_TIME, epoch_seconds, mutable_array
+
+# Threats merged per (ipAddress, type).
+#
+# Ingest stores one threat per CSV row, so a noisy address appears thousands
+# of times. ThreatAggregates is attached to the threat table and folds every
+# appended row (CSV load, follow mode, log replay) into one entry per address
+# and type: its row count, first and last seen, highest severity and a few
+# distinct descriptions. Entries live in parallel arrays indexed by a slot
+# number, with one dict from the packed (address, type) key to the slot, so an
+# entry costs a few dozen bytes besides its dict item, and the record fields
+# are read back from the rows it refers to.
+#
+# The table never holds more than capacity entries. Past that, it works as a
+# Space-Saving heavy-hitter summary: a new key takes over the slot with the
+# smallest count and inherits that count as its error bound. Every key seen
+# more than rows / capacity times is then still present, with a count at most
+# its error above the true one, so the top entries by count stay right on an
+# unbounded stream.
+#
+# This is a summary served next to the records, not a replacement for them:
+# the threat table still stores every row. Its state (the slot arrays) is saved
+# in the snapshot and restored like the map grid's, and the dict of keys is
+# rebuilt from each slot's last row, so a warm start costs one step per entry
+# instead of one per row.
+#
+#   GET /api/threats/aggregated?sort=-count|-lastSeen|-severity&limit=&offset=
+
+# Most entries kept (CTI_THREAT_AGGREGATES overrides)
+DEFAULT_CAPACITY = 200000
+
+# Distinct descriptions kept per entry, taken from its first SAMPLE_ROWS rows
+SAMPLE_DESCRIPTIONS = 3
+SAMPLE_ROWS = 32
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+SEVERITIES = {rank: name for name, rank in SEVERITY_RANK.items()}
+
+# Per-slot arrays saved in the snapshot state
+SLOT_ARRAYS = ('counts', 'errors', 'first_rows', 'last_rows', 'first_times', 'last_times', 'severities', 'samples')
+
+# Sort names of the aggregated list -> function of (aggregates, slot)
+SORTS = {
+    'count': lambda aggregates, slot: aggregates.counts[slot],
+    'lastSeen': lambda aggregates, slot: aggregates.last_times[slot],
+    'severity': lambda aggregates, slot: (aggregates.severities[slot], aggregates.counts[slot]),
+}
+
+
+def capacity_from_env():
+    return int(os.environ.get('CTI_THREAT_AGGREGATES') or DEFAULT_CAPACITY)
+
+
+# Attach to the threat table with replay_from=aggregates.rows. state is a
+# previous state(), e.g. from a snapshot of the same table; it is ignored when
+# it was kept with another capacity.
+class ThreatAggregates:
+    def __init__(self, table, capacity=DEFAULT_CAPACITY, state=None):
+        self.table = table
+        self.capacity = max(1, capacity)
+        columns = table.columns
+        self.addresses = columns['ipAddress']
+        self.types = columns['type']
+        self.severity_column = columns['severity']
+        self.descriptions = columns['description']
+        self.seen = columns['lastSeen']
+        # packed (address, type) key -> slot, and back
+        self.slots = {}
+        self.keys = []
+        self.counts = array('Q')
+        self.errors = array('Q')
+        self.first_rows = array('I')
+        self.last_rows = array('I')
+        self.first_times = array('q')
+        self.last_times = array('q')
+        self.severities = array('b')
+        # SAMPLE_DESCRIPTIONS rows per slot, -1 where unused
+        self.samples = array('q')
+        # (count, slot) per slot once the table is full, smallest first; a
+        # count older than the slot's is refreshed when it reaches the top
+        self.heap = None
+        self.rows = 0
+        self.evictions = 0
+        if state is not None and state['capacity'] == self.capacity:
+            for name in SLOT_ARRAYS:
+                setattr(self, name, mutable_array(state[name]))
+            self.keys = [self._key(row) for row in self.last_rows]
+            self.slots = {key: slot for slot, key in enumerate(self.keys)}
+            self.rows = state['rows']
+            self.evictions = state['evictions']
+
+    # The (address, type) key of row, packed into one int when it fits
+    def _key(self, row):
+        address = self.addresses.key(row)
+        code = self.types.codes[row]
+        return address << 16 | code if address.__class__ is int and code < 0x10000 else (address, code)
+
+    def _claim(self, key):
+        if len(self.keys) < self.capacity:
+            slot = len(self.keys)
+            self.keys.append(key)
+            for data in (self.counts, self.errors, self.first_rows, self.last_rows,
+                         self.first_times, self.last_times, self.severities):
+                data.append(0)
+            self.samples.extend([-1] * SAMPLE_DESCRIPTIONS)
+            return slot
+        heap = self.heap
+        if heap is None:
+            heap = self.heap = [(count, slot) for slot, count in enumerate(self.counts)]
+            heapq.heapify(heap)
+        counts = self.counts
+        while True:
+            count, slot = heap[0]
+            if counts[slot] == count:
+                break
+            heapq.heapreplace(heap, (counts[slot], slot))
+        # The entry now counts the row add() is about to add
+        heapq.heapreplace(heap, (count + 1, slot))
+        del self.slots[self.keys[slot]]
+        self.keys[slot] = key
+        self.errors[slot] = count
+        self.evictions += 1
+        start = slot * SAMPLE_DESCRIPTIONS
+        self.samples[start:start + SAMPLE_DESCRIPTIONS] = array('q', [-1] * SAMPLE_DESCRIPTIONS)
+        return slot
+
+    def add(self, row):
+        self.rows += 1
+        addresses = self.addresses
+        if addresses.kinds[row] == addresses.EMPTY:
+            return
+        address = addresses.key(row)
+        code = self.types.codes[row]
+        key = address << 16 | code if address.__class__ is int and code < 0x10000 else (address, code)
+        time = epoch_seconds(self.seen.get(row))
+        severity = SEVERITY_RANK.get(self.severity_column.get(row), -1)
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots[key] = self._claim(key)
+            self.first_rows[slot] = self.last_rows[slot] = row
+            self.first_times[slot] = self.last_times[slot] = time
+            self.severities[slot] = severity
+            self.samples[slot * SAMPLE_DESCRIPTIONS] = row
+            self.counts[slot] = self.errors[slot] + 1
+            return
+        counts = self.counts
+        count = counts[slot] = counts[slot] + 1
+        if time != NO_TIME:
+            first_times = self.first_times
+            if time < first_times[slot] or first_times[slot] == NO_TIME:
+                first_times[slot] = time
+                self.first_rows[slot] = row
+            if time >= self.last_times[slot]:
+                self.last_times[slot] = time
+                self.last_rows[slot] = row
+        if severity > self.severities[slot]:
+            self.severities[slot] = severity
+        # New descriptions are only looked for among the entry's first rows
+        if count <= SAMPLE_ROWS:
+            samples = self.samples
+            start = slot * SAMPLE_DESCRIPTIONS
+            if samples[start + SAMPLE_DESCRIPTIONS - 1] < 0:
+                get = self.descriptions.get
+                description = get(row)
+                for i in range(start, start + SAMPLE_DESCRIPTIONS):
+                    if samples[i] < 0:
+                        samples[i] = row
+                        break
+                    if get(samples[i]) == description:
+                        break
+
+    # Snapshot state: copies of the slot arrays and the counters (the keys are
+    # those of the slots' last rows)
+    def state(self):
+        state = {'capacity': self.capacity, 'rows': self.rows, 'evictions': self.evictions}
+        for name in SLOT_ARRAYS:
+            data = getattr(self, name)
+            state[name] = array(data.typecode, data)
+        return state
+
+    # Whether every count is exact (no entry was ever evicted)
+    @property
+    def exact(self):
+        return self.evictions == 0
+
+    def entry(self, slot):
+        table = self.table
+        last = self.last_rows[slot]
+        start = slot * SAMPLE_DESCRIPTIONS
+        entry = {
+            'ipAddress': self.addresses.get(last),
+            'type': self.types.get(last),
+            'count': self.counts[slot],
+            'severity': SEVERITIES.get(self.severities[slot], self.severity_column.get(last)),
+            'firstSeen': self.seen.get(self.first_rows[slot]),
+            'lastSeen': self.seen.get(last),
+            'descriptions': [self.descriptions.get(row) for row in self.samples[start:start + SAMPLE_DESCRIPTIONS]
+                             if row >= 0],
+            'lastThreatId': table.value(last, 'id'),
+            'location': table.row(last)['location'],
+        }
+        if not self.exact:
+            entry['countError'] = self.errors[slot]
+        return entry
+
+    # One page of the entries: ?sort=count|lastSeen|severity (descending
+    # with a leading '-', the default -count), limit and offset
+    def page(self, args):
+        limit = parse_int(args, 'limit', DEFAULT_LIMIT, 1, MAX_LIMIT)
+        offset = parse_int(args, 'offset', 0, 0, 1 << 62)
+        sort = args.get('sort') or '-count'
+        descending = sort.startswith('-')
+        key = SORTS.get(sort.lstrip('-'))
+        if key is None:
+            raise QueryError(f"'sort' must be one of {', '.join(SORTS)} (with '-' for descending)")
+        slots = range(len(self.keys))
+        pick = heapq.nlargest if descending else heapq.nsmallest
+        best = pick(offset + limit, slots, key=lambda slot: key(self, slot))
+        return {
+            'items': [self.entry(slot) for slot in best[offset:]],
+            'total': len(self.keys),
+            'rows': self.rows,
+            'exact': self.exact,
+            'capacity': self.capacity,
+            'offset': offset,
+            'limit': limit,
+        }
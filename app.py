@@ -1,184 +1,97 @@
-from flask import Flask, render_template, jsonify
-import json
+from flask import Flask, Response, abort, render_template, request
 import os
-import csv
 import datetime
-import ipaddress
-import random
+import multiprocessing
+
+from ingest import IngestStats, process_cybersecurity_data
+from serialize import jsonify
+import aggregate
+import bulkmatch
+import cache
+import correlate
+import detect
+import geo
+import geogrid
+import live
+import metrics
+import query
+import search
+import segments
+import serialize
+import snapshot
+import stats
+import store
+import timeseries
 
 app = Flask(__name__)
 
 # Create necessary directories if they don't exist
-data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+data_dir = os.environ.get('CTI_DATA_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
 os.makedirs(data_dir, exist_ok=True)
 os.makedirs('templates', exist_ok=True)
 os.makedirs('static', exist_ok=True)
 print(f"Data directory created at: {data_dir}")
 
-# Function to read and process CSV data
-def process_cybersecurity_data(csv_path):
-    ip_threats = []
-    traffic_analysis = []
-    login_attempts = []
-
-    # Mapping for severity levels
-    severity_mapping = {
-        'Low': 'Low',
-        'Medium': 'Medium',
-        'High': 'High'
-    }
-
-    # Mapping for attack types
-    attack_type_mapping = {
-        'Malware': 'Malicious',
-        'DDoS': 'Scanning',
-        'Intrusion': 'Data Exfiltration',
-        'Phishing': 'Suspicious'
-    }
-
-    # Mapping for status
-    status_mapping = {
-        'Blocked': 'Blocked',
-        'Logged': 'Allowed',
-        'Ignored': 'Flagged'
-    }
-
-    # Geo-location mapping (for demonstration purposes)
-    geo_locations = {
-        'Jamshedpur': {'lat': 22.8046, 'lng': 86.2029, 'country': 'India'},
-        'Bilaspur': {'lat': 22.0797, 'lng': 82.1409, 'country': 'India'},
-        'Bokaro': {'lat': 23.6693, 'lng': 86.1511, 'country': 'India'},
-        'Jaunpur': {'lat': 25.7464, 'lng': 82.6837, 'country': 'India'},
-        'Anantapur': {'lat': 14.6819, 'lng': 77.6006, 'country': 'India'},
-        'Aurangabad': {'lat': 19.8762, 'lng': 75.3433, 'country': 'India'},
-        'Eluru': {'lat': 16.7107, 'lng': 81.0952, 'country': 'India'},
-        'Phagwara': {'lat': 31.2240, 'lng': 75.7707, 'country': 'India'},
-        'Ambala': {'lat': 30.3752, 'lng': 76.7821, 'country': 'India'},
-        'Rampur': {'lat': 28.8086, 'lng': 79.0252, 'country': 'India'},
-        'Gangtok': {'lat': 27.3389, 'lng': 88.6065, 'country': 'India'},
-        'Nandyal': {'lat': 15.4777, 'lng': 78.4870, 'country': 'India'},
-        'Silchar': {'lat': 24.8333, 'lng': 92.7789, 'country': 'India'}
-    }
-
-    try:
-        with open(csv_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-
-            # Process each row in the CSV
-            for i, row in enumerate(reader):
-                # Skip if we have enough data
-                if i >= 50:  # Limit to 50 rows for performance
-                    break
-
-                # Extract location data
-                location_parts = row.get('Geo-location Data', '').split(',')
-                city = location_parts[0].strip() if location_parts else 'Unknown'
-
-                # Get geo coordinates
-                geo_data = geo_locations.get(city, {
-                    'lat': random.uniform(10, 40),
-                    'lng': random.uniform(70, 90),
-                    'country': 'India'
-                })
-
-                # Process IP threat data
-                if row.get('Source IP Address') and row.get('Attack Type'):
-                    severity = severity_mapping.get(row.get('Severity Level', 'Low'), 'Low')
-                    threat_type = attack_type_mapping.get(row.get('Attack Type', 'Malware'), 'Suspicious')
-
-                    ip_threat = {
-                        'id': str(len(ip_threats) + 1),
-                        'ipAddress': row.get('Source IP Address', ''),
-                        'type': threat_type,
-                        'severity': severity,
-                        'lastSeen': row.get('Timestamp', ''),
-                        'count': int(float(row.get('Anomaly Scores', '0')) * 2) or random.randint(5, 50),
-                        'description': row.get('Payload Data', 'No description available'),
-                        'source': row.get('Log Source', 'Unknown'),
-                        'location': {
-                            'lat': geo_data['lat'],
-                            'lng': geo_data['lng'],
-                            'country': geo_data['country'],
-                            'city': city
-                        }
-                    }
-                    ip_threats.append(ip_threat)
-
-                # Process traffic analysis data
-                if row.get('Source IP Address') and row.get('Destination IP Address'):
-                    status = status_mapping.get(row.get('Action Taken', 'Logged'), 'Allowed')
-
-                    traffic_entry = {
-                        'id': str(len(traffic_analysis) + 1),
-                        'timestamp': row.get('Timestamp', ''),
-                        'sourceIP': row.get('Source IP Address', ''),
-                        'destinationIP': row.get('Destination IP Address', ''),
-                        'protocol': row.get('Protocol', 'TCP'),
-                        'port': int(row.get('Destination Port', '0')) or random.randint(1, 65535),
-                        'bytesTransferred': int(row.get('Packet Length', '0')) * 10 or random.randint(256, 10240),
-                        'packetsTransferred': random.randint(1, 32),
-                        'duration': round(random.uniform(0.5, 10.0), 1),
-                        'status': status
-                    }
-                    traffic_analysis.append(traffic_entry)
-
-                # Process login attempts and suspicious behavior
-                if row.get('User Information') and (
-                    'authentication' in row.get('Payload Data', '').lower() or
-                    'login' in row.get('Payload Data', '').lower() or
-                    'access' in row.get('Payload Data', '').lower() or
-                    'authorization' in row.get('Payload Data', '').lower() or
-                    'suspicious' in row.get('Payload Data', '').lower() or
-                    'unusual' in row.get('Payload Data', '').lower() or
-                    int(float(row.get('Anomaly Scores', '0')) or 0) > 30
-                ):
-                    # Determine status based on action taken and anomaly score
-                    anomaly_score = float(row.get('Anomaly Scores', '0') or 0)
-                    status = 'Failed'
-                    if row.get('Action Taken') == 'Blocked':
-                        status = 'Blocked'
-                    elif row.get('Action Taken') == 'Logged' and anomaly_score < 30:
-                        status = 'Successful'
-
-                    # Determine behavior type
-                    behavior_type = 'Suspicious Login'
-                    if 'authentication' in row.get('Payload Data', '').lower():
-                        behavior_type = 'Authentication Attempt'
-                    elif anomaly_score > 70:
-                        behavior_type = 'Highly Suspicious Activity'
-                    elif 'unusual' in row.get('Payload Data', '').lower():
-                        behavior_type = 'Unusual Behavior'
-
-                    login_entry = {
-                        'id': str(len(login_attempts) + 1),
-                        'timestamp': row.get('Timestamp', ''),
-                        'username': row.get('User Information', 'Unknown User'),
-                        'ipAddress': row.get('Source IP Address', ''),
-                        'deviceInfo': row.get('Device Information', 'Unknown Device'),
-                        'location': city + ', ' + geo_data['country'],
-                        'status': status,
-                        'behaviorType': behavior_type,
-                        'anomalyScore': anomaly_score,
-                        'description': row.get('Payload Data', 'No description available')[:100] + '...' if len(row.get('Payload Data', '')) > 100 else row.get('Payload Data', 'No description available')
-                    }
-                    login_attempts.append(login_entry)
-
-        return ip_threats, traffic_analysis, login_attempts
-
-    except Exception as e:
-        print(f"Error processing CSV file: {e}")
-        return [], [], []
-
-# Try to read data from CSV, otherwise use sample data
-csv_path = r"c:\Users\vamsh\Downloads\cybersecurity_attacks.csv"
+# Try to read data from CSV, otherwise from the JSON datasets in data/, otherwise use sample data
+csv_path = os.environ.get('CTI_CSV_PATH', r"c:\Users\vamsh\Downloads\cybersecurity_attacks.csv")
+ingest_workers = int(os.environ.get('CTI_INGEST_WORKERS', '1'))
+snapshot_file = os.path.join(data_dir, 'snapshot.bin')
+ip_threats_file = os.path.join(data_dir, 'ip_threats.json')
+traffic_file = os.path.join(data_dir, 'traffic_analysis.json')
+login_file = os.path.join(data_dir, 'login_attempts.json')
+json_files = [ip_threats_file, traffic_file, login_file]
+# Records ingested in follow mode after the snapshot was written (see segments.py)
+segment_log = segments.SegmentLog(os.path.join(data_dir, 'log'))
 ip_threats, traffic_analysis, login_attempts = [], [], []
+tables = (store.threat_table(), store.traffic_table(), store.login_table())
+loaded_snapshot = None
+data_source = None
+ingest_stats = IngestStats()
 
 if os.path.exists(csv_path):
-    print(f"Reading data from CSV file: {csv_path}")
-    ip_threats, traffic_analysis, login_attempts = process_cybersecurity_data(csv_path)
+    # The CSV rows are placed on the map by the gazetteer, so it is a source too
+    source_files = [csv_path] + [path for path in [geo.gazetteer_path()] if os.path.exists(path)]
+elif all(os.path.exists(path) for path in json_files):
+    source_files = json_files
+else:
+    source_files = []
+
+# Ingest workers started with "spawn" re-import this module; only the parent reads the data.
+# The datasets are memory-mapped from a snapshot of the same source files, so all server
+# worker processes share one read-only copy; only the first worker to start rebuilds it.
+if source_files and multiprocessing.parent_process() is None:
+    with snapshot.build_lock(snapshot_file):
+        loaded_snapshot = snapshot.load(snapshot_file, source_files)
+        if loaded_snapshot is not None:
+            print(f"Loaded snapshot {snapshot_file}")
+            data_source = 'snapshot'
+        elif source_files[0] == csv_path:
+            print(f"Reading data from CSV file: {csv_path}")
+            ip_threats, traffic_analysis, login_attempts = process_cybersecurity_data(
+                csv_path, workers=ingest_workers, stats=ingest_stats, targets=tables)
+            data_source = 'csv'
+        else:
+            print(f"Reading data from JSON files in {data_dir}")
+            try:
+                ip_threats, traffic_analysis, login_attempts = snapshot.read_json_datasets(json_files)
+                data_source = 'json'
+            except (OSError, ValueError, TypeError, KeyError) as e:
+                print(f"Error reading JSON data: {e}")
+        if loaded_snapshot is None and ip_threats:
+            try:
+                # The log holds records added to the previous snapshot; removed
+                # first, so a crash can never replay it onto the new one
+                segment_log.clear()
+                loaded_snapshot = snapshot.build(
+                    snapshot_file, (ip_threats, traffic_analysis, login_attempts), source_files)
+                print(f"Saved snapshot to {snapshot_file}")
+            except OSError as e:
+                print(f"Could not save snapshot: {e}")
+    if loaded_snapshot is not None:
+        ip_threats, traffic_analysis, login_attempts = loaded_snapshot.datasets()
     print(f"Processed {len(ip_threats)} IP threats, {len(traffic_analysis)} traffic entries, and {len(login_attempts)} login attempts")
 
-# If no data was loaded from CSV, use sample data
+# If no data was loaded, use sample data
 if not ip_threats:
     print("Using sample data instead")
     ip_threats = [
@@ -582,22 +495,119 @@ if not login_attempts:
         }
     ]
 
-# Save sample data to JSON files
-ip_threats_file = os.path.join(data_dir, 'ip_threats.json')
-traffic_file = os.path.join(data_dir, 'traffic_analysis.json')
-login_file = os.path.join(data_dir, 'login_attempts.json')
-
-with open(ip_threats_file, 'w') as f:
-    json.dump(ip_threats, f, indent=2)
-    print(f"Saved IP threats data to {ip_threats_file}")
-
-with open(traffic_file, 'w') as f:
-    json.dump(traffic_analysis, f, indent=2)
-    print(f"Saved traffic analysis data to {traffic_file}")
-
-with open(login_file, 'w') as f:
-    json.dump(login_attempts, f, indent=2)
-    print(f"Saved login attempts data to {login_file}")
+# Keep the datasets in columnar tables; records are turned back into dicts per request
+if not isinstance(ip_threats, store.Table):
+    ip_threats = store.threat_table(ip_threats)
+if not isinstance(traffic_analysis, store.Table):
+    traffic_analysis = store.traffic_table(traffic_analysis)
+if not isinstance(login_attempts, store.Table):
+    login_attempts = store.login_table(login_attempts)
+
+# Replay the records logged since the snapshot was written, before the
+# observers below attach (they take the replayed rows from the tables)
+log_position = None
+if loaded_snapshot is not None and multiprocessing.parent_process() is None:
+    saved_log = loaded_snapshot.extras.get('log') or {}
+    log_position = saved_log.get('follow')
+
+    def replay_frame(frame):
+        global log_position
+        for table, records in zip((ip_threats, traffic_analysis, login_attempts), frame['records']):
+            table.extend(records)
+        log_position = frame['follow']
+
+    segment_log.recover(saved_log.get('segment', 0), replay_frame)
+    if segment_log.replayed:
+        print(f"Replayed {segment_log.replayed} logged batches: {len(ip_threats)} IP threats, "
+              f"{len(traffic_analysis)} traffic entries, {len(login_attempts)} login attempts")
+else:
+    segment_log = None
+
+# Chart counts are maintained incrementally as records are appended
+dataset_stats = stats.attach_dataset_stats(
+    ip_threats, traffic_analysis, login_attempts,
+    loaded_snapshot.extras.get('stats') if loaded_snapshot is not None else None)
+
+# Map clusters of the threats per grid cell, maintained like the chart counts
+threat_grid = geogrid.GeoGrid(
+    ip_threats, loaded_snapshot.extras.get('geo_grid') if loaded_snapshot is not None else None)
+ip_threats.attach(threat_grid, replay_from=threat_grid.total)
+
+# Traffic per minute, hour and day, for time-series charts
+traffic_rollups = timeseries.TrafficRollups(
+    traffic_analysis, loaded_snapshot.extras.get('traffic_rollups') if loaded_snapshot is not None else None)
+traffic_analysis.attach(traffic_rollups, replay_from=traffic_rollups.total)
+
+# Brute-force and port-scan detection over the login and traffic records
+detections = detect.attach_detectors(
+    traffic_analysis, login_attempts,
+    loaded_snapshot.extras.get('detections') if loaded_snapshot is not None else None)
+
+# Threat addresses for bulk matching (restored from the snapshot), kept up to date on append
+threat_matcher = bulkmatch.ThreatMatcher(
+    ip_threats, state=loaded_snapshot.extras.get('threat_matcher') if loaded_snapshot is not None else None)
+ip_threats.attach(threat_matcher, replay_from=threat_matcher.total)
+
+# Join of the three datasets by IP address (through their IP indexes), for the
+# per-address profiles
+ip_correlation = correlate.correlate_tables(ip_threats, traffic_analysis, login_attempts)
+
+# Threats merged per address and type, bounded in size (heavy hitters past the capacity)
+threat_aggregates = aggregate.ThreatAggregates(
+    ip_threats, aggregate.capacity_from_env(),
+    loaded_snapshot.extras.get('threat_aggregates') if loaded_snapshot is not None else None)
+ip_threats.attach(threat_aggregates, replay_from=threat_aggregates.rows)
+
+# Export the datasets to JSON files in data/ when they are missing (so the sample data
+# or the ingested CSV can be edited and loaded from there). They are never rewritten:
+# the snapshot and the segment log are what keeps the loaded data. The records are
+# encoded a batch at a time (serialize.stream_array) into a temporary file renamed
+# into place, so no list of every record is built and no truncated file is left.
+if not all(os.path.exists(path) for path in json_files):
+    for path, table, label in ((ip_threats_file, ip_threats, 'IP threats'),
+                               (traffic_file, traffic_analysis, 'traffic analysis'),
+                               (login_file, login_attempts, 'login attempts')):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.writelines(serialize.stream_array(iter(table)))
+        os.replace(tmp_path, path)
+        print(f"Saved {label} data to {path}")
+
+# Follow mode: tail an append-only attack log (CSV or JSONL) and push new records to
+# dashboards over /api/stream. When the log is the CSV loaded above, only rows
+# appended after that load are new.
+follow_path = os.environ.get('CTI_FOLLOW_PATH')
+live_broker = live.Broker()
+log_follower = None
+# (app.run's reloader runs this module in a watcher process that serves nothing)
+reloader_watcher = __name__ == '__main__' and 'WERKZEUG_RUN_MAIN' not in os.environ
+if follow_path and multiprocessing.parent_process() is None and not reloader_watcher:
+    follow_offset = 0
+    if log_position is not None and log_position[0] == os.path.abspath(follow_path):
+        # Resume after the last batch in the snapshot or the segment log
+        follow_offset = log_position[1]
+    elif os.path.abspath(follow_path) == os.path.abspath(csv_path) and data_source in ('csv', 'snapshot'):
+        follow_offset = (loaded_snapshot.sources[0]['size'] if loaded_snapshot is not None
+                         else os.path.getsize(follow_path))
+    log_follower = live.LogFollower(follow_path, (ip_threats, traffic_analysis, login_attempts),
+                                    live_broker, dataset_stats, detections, offset=follow_offset,
+                                    log=segment_log)
+    log_follower.start()
+    print(f"Following {follow_path} from byte {follow_offset}")
+
+    # Fold the segment log into a new snapshot in the background as it grows
+    if segment_log is not None:
+        def checkpoint(segment):
+            with snapshot.build_lock(snapshot_file):
+                snapshot.write(
+                    snapshot_file, dict(zip(snapshot.DATASETS, (ip_threats, traffic_analysis, login_attempts))),
+                    loaded_snapshot.sources,
+                    snapshot.state_extras(dataset_stats, threat_grid, traffic_rollups, detections,
+                                          threat_aggregates, threat_matcher,
+                                          {'segment': segment, 'follow': log_follower.position}))
+
+        log_compactor = segments.Compactor(segment_log, checkpoint)
+        log_compactor.start()
 
 @app.route('/')
 def index():
@@ -611,24 +621,271 @@ def test():
 def simple():
     return render_template('simple.html')
 
+# Serialized API responses, reused until the tables they were computed from change
+response_cache = cache.ResponseCache(int(os.environ.get('CTI_RESPONSE_CACHE_MB', '64')) << 20)
+
+# Without query parameters a list endpoint returns the whole dataset as before
+# (streamed when it is large); with any of limit/offset/cursor/sort or a filter
+# it returns one page
+def list_response(table, dataset):
+    if not request.args:
+        if len(table) > serialize.STREAM_MIN_ITEMS:
+            return serialize.stream_response(iter(table))
+        return jsonify(list(table))
+    try:
+        return jsonify(query.run(table, dataset, request.args))
+    except query.QueryError as e:
+        return jsonify({"error": str(e)}), 400
+
 @app.route('/api/threats')
+@response_cache.cached(ip_threats)
 def get_threats():
-    return jsonify(ip_threats)
+    return list_response(ip_threats, 'threats')
 
 @app.route('/api/traffic')
+@response_cache.cached(traffic_analysis)
 def get_traffic():
-    return jsonify(traffic_analysis)
+    return list_response(traffic_analysis, 'traffic')
+
+# Traffic over time from the rollups: ?since=&until= (epoch seconds or
+# timestamps, default: the whole data) and ?step=5m|1h|7d... (default: the
+# finest step giving about as many points as the range has non-empty minutes)
+@app.route('/api/traffic/timeseries')
+@response_cache.cached(traffic_analysis)
+def get_traffic_timeseries():
+    args = request.args
+    try:
+        since = timeseries.parse_time(args['since'], 'since') if args.get('since') else None
+        until = timeseries.parse_time(args['until'], 'until') if args.get('until') else None
+        step = timeseries.parse_step(args['step']) if args.get('step') else None
+        return jsonify(traffic_rollups.series(since, until, step))
+    except query.QueryError as e:
+        return jsonify({"error": str(e)}), 400
+
+# Pre-aggregated counts for the dashboard charts; ?histogram=hour|day|month
+# adds record counts per time bucket
+@app.route('/api/stats')
+@response_cache.cached(ip_threats, traffic_analysis, login_attempts)
+def get_stats():
+    bucket = request.args.get('histogram')
+    if bucket is not None and bucket not in stats.BUCKETS:
+        return jsonify({"error": f"histogram must be one of {', '.join(stats.BUCKETS)}"}), 400
+    return jsonify({name: group.to_dict(bucket) for name, group in dataset_stats.items()})
 
 @app.route('/api/threat/<threat_id>')
+@response_cache.cached(ip_threats)
 def get_threat_details(threat_id):
-    for threat in ip_threats:
-        if threat['id'] == threat_id:
-            return jsonify(threat)
+    row = ip_threats.find_id(threat_id)
+    if row is not None:
+        return jsonify(ip_threats[row])
     return jsonify({"error": "Threat not found"}), 404
 
+@app.route('/api/threats/by-ip/<ip>')
+@response_cache.cached(ip_threats)
+def get_threats_by_ip(ip):
+    return jsonify(ip_threats.rows(ip_threats.positions('ipAddress', ip)))
+
+# Threats merged per (ipAddress, type): count, first/last seen, highest severity
+# and sample descriptions, ?sort=-count|-lastSeen|-severity&limit=&offset=
+@app.route('/api/threats/aggregated')
+@response_cache.cached(ip_threats)
+def get_threat_aggregates():
+    try:
+        return jsonify(threat_aggregates.page(request.args))
+    except query.QueryError as e:
+        return jsonify({"error": str(e)}), 400
+
+# Everything involving one address: threats naming it, its traffic in either
+# direction and its login attempts, as a newest-first timeline (?limit=&offset=)
+# with counts per dataset
+@app.route('/api/ip/<ip>/profile')
+@response_cache.cached(ip_threats, traffic_analysis, login_attempts)
+def get_ip_profile(ip):
+    try:
+        return jsonify(ip_correlation.profile(ip, request.args))
+    except query.QueryError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/threats/by-severity/<severity>')
+@response_cache.cached(ip_threats)
+def get_threats_by_severity(severity):
+    return jsonify(ip_threats.rows(ip_threats.positions('severity', severity)))
+
+@app.route('/api/threats/by-type/<threat_type>')
+@response_cache.cached(ip_threats)
+def get_threats_by_type(threat_type):
+    return jsonify(ip_threats.rows(ip_threats.positions('type', threat_type)))
+
+@app.route('/api/threats/by-country/<country>')
+@response_cache.cached(ip_threats)
+def get_threats_by_country(country):
+    return jsonify(ip_threats.rows(ip_threats.positions('location.country', country)))
+
+# Threat map clusters for a viewport: ?bbox=west,south,east,north&zoom=<map zoom>
+# gives the threats per grid cell (count, counts per severity, position) at a
+# resolution that follows the zoom, so the payload depends on the viewport only
+@app.route('/api/threats/clusters')
+@response_cache.cached(ip_threats)
+def get_threat_clusters():
+    try:
+        bbox = geogrid.parse_bbox(request.args.get('bbox', '-180,-90,180,90'))
+        zoom = geogrid.parse_zoom(request.args.get('zoom', '0'))
+    except query.QueryError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(threat_grid.clusters(bbox, zoom))
+
+# Bulk check of an address list against the threats. The body holds IPv4/IPv6
+# addresses, CIDR blocks or address ranges separated by whitespace (e.g. one per
+# line); every threat matching an entry is returned with the entry it matched.
+@app.route('/api/threats/match', methods=['POST'])
+def match_threats():
+    result = threat_matcher.match_stream(request.stream)
+    if len(result) > serialize.STREAM_MIN_ITEMS:
+        return serialize.stream_document('matches', result.records(), {'summary': result.summary()})
+    return jsonify({'matches': list(result.records()), 'summary': result.summary()})
+
+# Bloom filter of the threat addresses, for clients that drop non-matching
+# addresses before uploading a list (see bulkmatch.py)
+@app.route('/api/threats/match/bloom')
+@response_cache.cached(ip_threats)
+def get_threat_bloom():
+    return jsonify(threat_matcher.bloom().to_dict())
+
 @app.route('/api/login-attempts')
+@response_cache.cached(login_attempts)
 def get_login_attempts():
-    return jsonify(login_attempts)
+    return list_response(login_attempts, 'logins')
+
+# Full-text search over the threat and login attempt descriptions: ?q= (words
+# and "phrases" a record must all contain, OR between alternatives),
+# ?dataset=threats,logins, ?limit= and ?offset=; results are ranked (BM25)
+@app.route('/api/search')
+@response_cache.cached(ip_threats, login_attempts)
+def search_descriptions():
+    try:
+        return jsonify(search.run({'threats': (ip_threats, 'description'),
+                                   'logins': (login_attempts, 'description')}, request.args))
+    except query.QueryError as e:
+        return jsonify({"error": str(e)}), 400
+
+# Rows and distinct addresses of every IP field within CIDR blocks or address
+# ranges, e.g. ?cidr=103.216.0.0/16 or ?cidr=rfc1918 (answered from the sorted
+# IP indexes)
+@app.route('/api/ip-ranges')
+@response_cache.cached(ip_threats, traffic_analysis, login_attempts)
+def get_ip_ranges():
+    try:
+        return jsonify(query.ip_ranges(
+            {'threats': ip_threats, 'traffic': traffic_analysis, 'logins': login_attempts}, request.args))
+    except query.QueryError as e:
+        return jsonify({"error": str(e)}), 400
+
+# Live updates as Server-Sent Events: 'delta' events with the records appended by
+# the log follower (plus totals and chart counts), 'resync' when the client fell
+# behind and should reload. Reconnecting clients resume from Last-Event-ID.
+# The EventStream is passed through as the WSGI body, so that asgi.WSGIBridge
+# can await it instead of parking a thread on every idle connection.
+@app.route('/api/stream')
+def stream_events():
+    subscriber = live_broker.subscribe(request.headers.get('Last-Event-ID'))
+    return Response(live_broker.stream(subscriber), mimetype='text/event-stream', direct_passthrough=True,
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/stream/stats')
+def get_stream_stats():
+    result = live_broker.stats()
+    result['follower'] = log_follower.stats() if log_follower is not None else None
+    result['log'] = segment_log.stats() if segment_log is not None else None
+    return jsonify(result)
+
+# Alerts of the streaming detectors, newest first: ?rule=port-scan|
+# failed-logins-by-user|failed-logins-by-ip and ?limit= (default 100)
+@app.route('/api/detections')
+def get_detections():
+    try:
+        limit = int(request.args.get('limit', '100'))
+    except ValueError:
+        return jsonify({"error": "'limit' must be an integer"}), 400
+    return jsonify(detections.to_dict(request.args.get('rule'), max(0, limit)))
+
+# Instrumentation: per-route latency histograms (unless CTI_METRICS=0) and
+# the counters the app keeps anyway, read when /metrics is scraped
+metrics_registry = metrics.Registry()
+request_metrics = metrics.RequestMetrics(metrics_registry)
+if os.environ.get('CTI_METRICS', '1') != '0':
+    request_metrics.attach(app)
+
+@metrics_registry.collector
+def collect_app_metrics():
+    datasets = {'threats': ip_threats, 'traffic': traffic_analysis, 'logins': login_attempts}
+    cache_stats = response_cache.stats()
+    ingests = {'load': ingest_stats}
+    if log_follower is not None:
+        ingests['follow'] = log_follower.ingest_stats
+    return [
+        ('cti_dataset_records', 'gauge', 'Records per dataset',
+         [({'dataset': name}, len(table)) for name, table in datasets.items()]),
+        ('cti_dataset_memory_bytes', 'gauge', 'Bytes held by the columns of each dataset',
+         [({'dataset': name}, table.memory_bytes()) for name, table in datasets.items()]),
+        ('cti_ingest_rows_total', 'counter', 'CSV rows read per ingest path',
+         [({'source': source}, stats.rows) for source, stats in ingests.items()]),
+        ('cti_ingest_skipped_rows_total', 'counter', 'Malformed CSV rows skipped per ingest path',
+         [({'source': source}, stats.skipped) for source, stats in ingests.items()]),
+        ('cti_ingest_stage_seconds_total', 'counter', 'Time spent per ingest stage',
+         [({'source': source, 'stage': stage}, seconds)
+          for source, stats in ingests.items() for stage, seconds in stats.stages.items()]),
+        ('cti_response_cache_requests_total', 'counter', 'Response cache lookups by result',
+         [({'result': 'hit'}, cache_stats['hits']), ({'result': 'miss'}, cache_stats['misses'])]),
+        ('cti_response_cache_not_modified_total', 'counter', 'Responses answered with 304 Not Modified',
+         [({}, cache_stats['notModified'])]),
+        ('cti_response_cache_evictions_total', 'counter', 'Responses evicted from the cache',
+         [({}, cache_stats['evictions'])]),
+        ('cti_response_cache_bytes', 'gauge', 'Bytes of cached response bodies',
+         [({}, cache_stats['bytes'])]),
+        ('cti_response_cache_hit_ratio', 'gauge', 'Share of cache lookups that hit',
+         [({}, cache_stats['hitRatio'])]),
+        ('cti_detector_alerts_total', 'counter', 'Alerts raised per detector rule',
+         [({'rule': rule}, count) for rule, count in sorted(detections.counts.items())]),
+        ('cti_stream_subscribers', 'gauge', 'Connected live stream subscribers',
+         [({}, live_broker.stats()['subscribers'])]),
+    ]
+
+# Prometheus metrics
+@app.route('/metrics')
+def get_metrics():
+    return metrics_registry.response()
+
+# Sampling profiler, opt-in with CTI_PROFILER=1: POST ?action=start
+# (&interval=<seconds>) or ?action=stop toggles it, GET returns the collapsed
+# stacks sampled so far (for flame graph tools) after a status line
+profiler = metrics.SamplingProfiler()
+
+@app.route('/debug/profiler', methods=['GET', 'POST'])
+def toggle_profiler():
+    if os.environ.get('CTI_PROFILER') != '1':
+        abort(404)
+    if request.method == 'GET':
+        status = ' '.join(f'{name}={value}' for name, value in profiler.stats().items())
+        return Response(f'# {status}\n' + profiler.collapsed(), content_type='text/plain; charset=utf-8')
+    action = request.args.get('action')
+    if action == 'start':
+        try:
+            interval = float(request.args.get('interval', metrics.PROFILE_INTERVAL))
+        except ValueError:
+            interval = 0.0
+        if not 0.0005 <= interval <= 1.0:
+            return jsonify({"error": "'interval' must be between 0.0005 and 1 seconds"}), 400
+        profiler.start(interval)
+    elif action == 'stop':
+        profiler.stop()
+    else:
+        return jsonify({"error": "'action' must be start or stop"}), 400
+    return jsonify(profiler.stats())
+
+# Hit/miss counters and size of the response cache
+@app.route('/api/cache-stats')
+def get_cache_stats():
+    return jsonify(response_cache.stats())
 
 @app.errorhandler(404)
 def page_not_found(e):
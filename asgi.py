@@ -0,0 +1,349 @@
+import argparse
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+# Asynchronous (ASGI) serving mode.
+#
+#   python asgi.py --port 8000          (built-in asyncio HTTP/1.1 server)
+#   uvicorn asgi:application            (or any other ASGI server)
+#
+# The threaded development server ties one thread to each connection for as
+# long as its response is being written, so a few slow clients downloading a
+# large list can occupy every thread. Here connections are handled by an asyncio
+# event loop: the Flask views still run unchanged (in a small thread pool, as
+# they are synchronous), but sending the body happens on the loop, which waits
+# for the socket to drain between chunks without holding a thread. A client
+# reading slowly only costs the memory of its pending response.
+#
+# Streamed bodies (the large lists) are produced one chunk at a time on a
+# separate pool, so they never block the views. A body that can be iterated
+# asynchronously (the live.EventStream of /api/stream) is awaited on the loop
+# instead: an idle event stream holds no thread at all, only its subscriber.
+
+# Threads running the Flask views
+VIEW_THREADS = 8
+
+# Threads producing chunks of streamed responses (one per chunk being made)
+STREAM_THREADS = 32
+
+# Largest piece of a body handed to the server per send
+SEND_CHUNK = 256 << 10
+
+# Longest request head accepted by the built-in server
+MAX_HEAD_BYTES = 64 << 10
+
+# Largest request body accepted (the whole body is read into memory before the
+# view runs); bigger ones are refused with 413
+MAX_BODY_BYTES = 64 << 20
+
+# Seconds an idle keep-alive connection is kept open by the built-in server
+KEEP_ALIVE_SECONDS = 5
+
+STATUS_REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+                  413: 'Payload Too Large', 500: 'Internal Server Error', 501: 'Not Implemented'}
+
+
+# Wrap a WSGI application (the Flask app) as an ASGI application
+class WSGIBridge:
+    def __init__(self, wsgi_app, view_threads=VIEW_THREADS, stream_threads=STREAM_THREADS):
+        self.wsgi_app = wsgi_app
+        self.views = ThreadPoolExecutor(view_threads, thread_name_prefix='asgi-view')
+        self.streams = ThreadPoolExecutor(stream_threads, thread_name_prefix='asgi-stream')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+
+        body = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message.get('body', b''))
+            size += len(body[-1])
+            if size > MAX_BODY_BYTES:
+                await send({'type': 'http.response.start', 'status': 413,
+                            'headers': [(b'content-length', b'0'), (b'connection', b'close')]})
+                await send({'type': 'http.response.body', 'body': b''})
+                return
+            if not message.get('more_body'):
+                break
+        environ = wsgi_environ(scope, b''.join(body))
+
+        loop = asyncio.get_running_loop()
+        status, headers, chunk, rest = await loop.run_in_executor(self.views, self._start, environ)
+        try:
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            while chunk is not None:
+                for start in range(0, len(chunk), SEND_CHUNK):
+                    await send({'type': 'http.response.body', 'body': chunk[start:start + SEND_CHUNK],
+                                'more_body': True})
+                chunk = None if rest is None else await self._next_chunk(loop, rest)
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if rest is not None and hasattr(rest, 'close'):
+                # Generators clean up when closed (e.g. an event stream unsubscribes)
+                await loop.run_in_executor(self.streams, rest.close)
+
+    # Next chunk of a streamed body, None at its end
+    async def _next_chunk(self, loop, rest):
+        if hasattr(rest, '__anext__'):
+            try:
+                return await rest.__anext__()
+            except StopAsyncIteration:
+                return None
+        return await loop.run_in_executor(self.streams, next, rest, None)
+
+    # Run the WSGI app: status, headers, the first chunk of the body (None if
+    # empty) and the iterable with the rest (None once the body is complete)
+    def _start(self, environ):
+        response = []
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response[:] = [int(status.split(' ', 1)[0]),
+                           [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]]
+            return written.append
+
+        result = self.wsgi_app(environ, start_response)
+        rest = iter(result)
+        first = next(rest, None)
+        if written:
+            first = b''.join(written) + (first or b'')
+        status, headers = response
+        # A body of known length that arrived in one piece (every response that
+        # is not streamed) is complete: no need to come back for the rest
+        length = dict(headers).get(b'content-length')
+        if first is None or (length is not None and int(length) == len(first)):
+            if hasattr(result, 'close'):
+                result.close()
+            return status, headers, first, None
+        # Close through the WSGI result (e.g. werkzeug's ClosingIterator)
+        return status, headers, first, result if iter(result) is rest else rest
+
+
+# WSGI environ for an ASGI http scope and its request body
+def wsgi_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1')
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'content-length':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+# Raised by the built-in server for requests it cannot parse
+class BadRequest(ValueError):
+    pass
+
+
+def parse_head(head):
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ')
+    except ValueError:
+        raise BadRequest(f'malformed request line {lines[0]!r}')
+    if not version.startswith('HTTP/1.'):
+        raise BadRequest(f'unsupported protocol {version}')
+    headers = []
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(':')
+        if not sep:
+            raise BadRequest(f'malformed header {line!r}')
+        headers.append((name.strip().lower().encode('latin-1'), value.strip().encode('latin-1')))
+    return method, target, version[5:], headers
+
+
+def response_head(status, headers):
+    lines = [f"HTTP/1.1 {status} {STATUS_REASONS.get(status, '')}".rstrip()]
+    lines.extend(f"{name.decode('latin-1')}: {value.decode('latin-1')}" for name, value in headers)
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+# Empty response with status after which the connection is closed
+def closing_head(status):
+    return response_head(status, [(b'content-length', b'0'), (b'connection', b'close')])
+
+
+# One HTTP/1.1 connection of the built-in server: requests are read and
+# answered in turn (keep-alive), each by one call of the ASGI application
+async def handle_connection(application, reader, writer):
+    server = writer.get_extra_info('sockname')[:2]
+    client = (writer.get_extra_info('peername') or ('', 0))[:2]
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE_SECONDS)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                return
+            except asyncio.LimitOverrunError:
+                writer.write(closing_head(400))
+                return
+            try:
+                method, target, http_version, headers = parse_head(head[:-4])
+            except BadRequest:
+                writer.write(closing_head(400))
+                return
+            header_map = dict(headers)
+            if b'chunked' in header_map.get(b'transfer-encoding', b'').lower():
+                writer.write(closing_head(501))
+                return
+            length = header_map.get(b'content-length') or b'0'
+            if not length.isdigit():
+                writer.write(closing_head(400))
+                return
+            # Compared as digits first: int() refuses very long numbers
+            if len(length) > len(str(MAX_BODY_BYTES)) or int(length) > MAX_BODY_BYTES:
+                writer.write(closing_head(413))
+                return
+            body = await reader.readexactly(int(length))
+            connection = header_map.get(b'connection', b'').lower()
+            keep_alive = connection != b'close' if http_version == '1.1' else connection == b'keep-alive'
+
+            path, _, query_string = target.partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0', 'spec_version': '2.3'},
+                'http_version': http_version, 'method': method, 'scheme': 'http',
+                'path': unquote(path), 'raw_path': path.encode('latin-1'),
+                'query_string': query_string.encode('latin-1'), 'root_path': '',
+                'headers': headers, 'client': client, 'server': server,
+            }
+            keep_alive = await respond(application, scope, body, writer, keep_alive)
+            if not keep_alive:
+                return
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+# Run application for one request, writing its response to writer. Bodies of
+# unknown length are sent chunked. Returns whether the connection stays open.
+async def respond(application, scope, body, writer, keep_alive):
+    state = {'head': None, 'started': False, 'chunked': False, 'request_sent': False}
+    disconnected = asyncio.Event()
+
+    async def receive():
+        if not state['request_sent']:
+            state['request_sent'] = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            state['head'] = (message['status'], list(message.get('headers', [])))
+            return
+        data = message.get('body', b'')
+        more = message.get('more_body', False)
+        if not state['started']:
+            status, headers = state['head']
+            state['started'] = True
+            names = {name for name, _ in headers}
+            if b'content-length' not in names:
+                if more:
+                    state['chunked'] = True
+                    headers.append((b'transfer-encoding', b'chunked'))
+                else:
+                    headers.append((b'content-length', str(len(data)).encode()))
+            if not keep_alive:
+                headers.append((b'connection', b'close'))
+            writer.write(response_head(status, headers))
+        if state['chunked']:
+            if data:
+                writer.write(b'%x\r\n' % len(data) + data + b'\r\n')
+            if not more:
+                writer.write(b'0\r\n\r\n')
+        elif data and scope['method'] != 'HEAD':
+            writer.write(data)
+        # Wait here (not in a thread) while the client is slow to read
+        await writer.drain()
+
+    try:
+        await application(scope, receive, send)
+    except ConnectionError:
+        disconnected.set()
+        return False
+    except Exception as e:
+        print(f"Error handling {scope['method']} {scope['path']}: {e!r}", file=sys.stderr)
+        if not state['started']:
+            writer.write(closing_head(500))
+        return False
+    disconnected.set()
+    return keep_alive
+
+
+# Serve application on host:port with the built-in asyncio server until interrupted
+def serve(application, host='127.0.0.1', port=8000, backlog=2048):
+    async def main():
+        server = await asyncio.start_server(
+            lambda reader, writer: handle_connection(application, reader, writer),
+            host, port, backlog=backlog, limit=MAX_HEAD_BYTES)
+        print(f"Serving on http://{host}:{port}/ (asyncio)")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+def create_application(view_threads=VIEW_THREADS, stream_threads=STREAM_THREADS):
+    from app import app as flask_app
+    return WSGIBridge(flask_app, view_threads, stream_threads)
+
+
+# ASGI entry point for external servers (uvicorn asgi:application)
+application = create_application() if __name__ != '__main__' else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the dashboard with the built-in asyncio server')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--view-threads', type=int, default=VIEW_THREADS)
+    parser.add_argument('--stream-threads', type=int, default=STREAM_THREADS)
+    args = parser.parse_args()
+    serve(create_application(args.view_threads, args.stream_threads), args.host, args.port)
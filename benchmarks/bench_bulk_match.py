@@ -0,0 +1,126 @@
+# Bulk threat matching benchmark: per-address index lookups vs. bulkmatch.py.
+#
+#   python benchmarks/bench_bulk_match.py --threats 100000 --lookups 1000000
+#
+# Fills a threat table with --threats random addresses (--ipv6-share of them
+# IPv6) and checks a list of --lookups addresses against it, --hit-share of
+# them known threats, the rest random (as in a firewall log). Times one lookup
+# per address through the by-IP index (what checking a list through
+# /api/threats/by-ip/<ip> costs before any HTTP), the matcher on the token list
+# and on the raw newline-separated body as the endpoint reads it, a matcher
+# restored from its snapshot state (binary search over the saved IPv4 values),
+# and the client-side Bloom prefilter with its false-positive rate. All methods must
+# find the same matches.
+import argparse
+import io
+import ipaddress
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bulkmatch  # noqa: E402
+import store  # noqa: E402
+
+
+def random_address(rng, ipv6_share):
+    if rng.random() < ipv6_share:
+        return str(ipaddress.IPv6Address((0x2001_0db8 << 96) | rng.getrandbits(64)))
+    return f'{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}'
+
+
+def threat_table(count, ipv6_share, rng):
+    table = store.threat_table()
+    for i in range(count):
+        table.append({
+            'id': str(i + 1), 'ipAddress': random_address(rng, ipv6_share),
+            'type': rng.choice(['Malicious', 'Scanning', 'Data Exfiltration', 'Suspicious']),
+            'severity': rng.choice(['Low', 'Medium', 'High']), 'lastSeen': '2023-05-30 06:33:58',
+            'count': 1, 'description': '', 'source': 'Server',
+            'location': {'lat': 0.0, 'lng': 0.0, 'country': '', 'city': ''},
+        })
+    return table
+
+
+def index_lookups(table, addresses):
+    matches = []
+    for address in addresses:
+        matches.extend((address, row) for row in table.positions('ipAddress', address))
+    return matches
+
+
+def best_time(run, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk threat matching: index lookups vs. the packed hash table')
+    parser.add_argument('--threats', type=int, default=100000, help='threat records')
+    parser.add_argument('--lookups', type=int, default=1000000, help='addresses to check')
+    parser.add_argument('--hit-share', type=float, default=0.01, help='share of checked addresses that are threats')
+    parser.add_argument('--ipv6-share', type=float, default=0.05, help='share of IPv6 addresses')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per method (best is kept)')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    table = threat_table(args.threats, args.ipv6_share, rng)
+    started = time.perf_counter()
+    matcher = table.attach(bulkmatch.ThreatMatcher(table))
+    built = time.perf_counter() - started
+    known = [table.value(rng.randrange(len(table)), 'ipAddress') for _ in range(1000)]
+    addresses = [rng.choice(known) if rng.random() < args.hit_share else random_address(rng, args.ipv6_share)
+                 for _ in range(args.lookups)]
+    body = '\n'.join(addresses).encode('latin-1')
+    print(f"{args.threats:,} threats, {args.lookups:,} addresses ({args.hit_share:.0%} threats, "
+          f"{args.ipv6_share:.0%} IPv6); hash table built in {built * 1000:.0f} ms")
+
+    started = time.perf_counter()
+    restored = bulkmatch.ThreatMatcher(table, state=matcher.state())
+    print(f"state saved and restored in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def tokens(matcher):
+        result = bulkmatch.MatchResult(table)
+        matcher.match_tokens(addresses, result)
+        return result.matches
+
+    methods = [
+        ('by-IP index lookups', lambda: index_lookups(table, addresses)),
+        ('matcher (tokens)', lambda: tokens(matcher)),
+        ('matcher (request body)', lambda: matcher.match_stream(io.BytesIO(body)).matches),
+        ('restored (tokens)', lambda: tokens(restored)),
+    ]
+    print(f"{'method':<26}{'seconds':>9}{'lookups/s':>13}{'speed-up':>10}  matches")
+    reference = None
+    baseline = None
+    for name, run in methods:
+        elapsed, matches = best_time(run, args.repeat)
+        reference = reference or sorted(matches)
+        baseline = baseline or elapsed
+        same = 'identical' if sorted(matches) == reference else 'DIFFERENT'
+        print(f"{name:<26}{elapsed:>9.3f}{args.lookups / elapsed:>13,.0f}{baseline / elapsed:>9.1f}x  "
+              f"{len(matches):,} {same}")
+
+    started = time.perf_counter()
+    bloom = matcher.bloom()
+    built = time.perf_counter() - started
+    elapsed, kept = best_time(lambda: bulkmatch.prefilter(addresses, bloom), 1)
+    threats = {table.value(row, 'ipAddress') for row in range(len(table))}
+    false_positives = sum(1 for address in kept if address not in threats)
+    negatives = sum(1 for address in addresses if address not in threats)
+    assert all(address in kept for address in addresses if address in threats)
+    print(f"Bloom filter: {len(bloom.data) / 1024:,.0f} KiB, {bloom.hashes} hashes, built in {built * 1000:.0f} ms; "
+          f"prefilter {args.lookups / elapsed:,.0f} addresses/s, kept {len(kept):,} of {args.lookups:,} "
+          f"(false-positive rate {false_positives / max(negatives, 1):.2%}), "
+          f"upload {len(chr(10).join(kept)) / 1024:,.0f} KiB instead of {len(body) / 1024:,.0f} KiB")
+
+
+if __name__ == '__main__':
+    main()
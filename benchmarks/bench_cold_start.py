@@ -0,0 +1,103 @@
+# Cold-start benchmark: parsing the CSV on every start vs. loading a snapshot.
+#
+#   python benchmarks/bench_cold_start.py --rows 200000
+#
+# A synthetic CSV is written to a temporary directory and the server's start-up
+# work is timed three ways: the CSV ingest plus the JSON exports (what every
+# start did before snapshots), the same ingest plus writing the snapshot (the
+# first start after the CSV changes), and memory-mapping the snapshot (every
+# later start). The first page of a sorted list query is timed after each, as
+# a first request would see it.
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingest  # noqa: E402
+import query  # noqa: E402
+import snapshot  # noqa: E402
+import stats  # noqa: E402
+import store  # noqa: E402
+from synthetic import write_csv  # noqa: E402
+
+DATASETS = ('threats', 'traffic', 'logins')
+
+
+def ingest_tables(csv_path, workers):
+    tables = (store.threat_table(), store.traffic_table(), store.login_table())
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            ingest.process_cybersecurity_data(csv_path, workers=workers, targets=tables)
+        finally:
+            sys.stdout = stdout
+    return dict(zip(DATASETS, tables))
+
+
+def first_request(tables):
+    started = time.perf_counter()
+    query.run(tables['traffic'], 'traffic', {'sort': '-timestamp', 'limit': '100'})
+    return time.perf_counter() - started
+
+
+def csv_and_json(csv_path, workdir, workers):
+    tables = ingest_tables(csv_path, workers)
+    stats.attach_dataset_stats(tables['threats'], tables['traffic'], tables['logins'])
+    for name, table in tables.items():
+        with open(os.path.join(workdir, name + '.json'), 'w') as f:
+            json.dump(list(table), f, indent=2)
+    return tables
+
+
+def csv_and_snapshot(csv_path, snapshot_path, workers):
+    tables = ingest_tables(csv_path, workers)
+    group_stats = stats.attach_dataset_stats(tables['threats'], tables['traffic'], tables['logins'])
+    for name, table in tables.items():
+        query.prepare(table, name)
+    snapshot.write(snapshot_path, tables, [snapshot.fingerprint(csv_path)],
+                   {'stats': {name: group.state() for name, group in group_stats.items()}})
+    return tables
+
+
+def load_snapshot(csv_path, snapshot_path):
+    loaded = snapshot.load(snapshot_path, [csv_path])
+    tables = loaded.tables
+    stats.attach_dataset_stats(tables['threats'], tables['traffic'], tables['logins'],
+                               loaded.extras['stats'])
+    return tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CSV ingest vs. snapshot load start-up benchmark')
+    parser.add_argument('--rows', type=int, default=100000, help='synthetic CSV rows')
+    parser.add_argument('--workers', type=int, default=1, help='ingest worker processes')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = write_csv(os.path.join(workdir, 'attacks.csv'), args.rows)
+        snapshot_path = os.path.join(workdir, 'snapshot.bin')
+        runs = [
+            ('CSV + JSON dump', lambda: csv_and_json(csv_path, workdir, args.workers)),
+            ('CSV + snapshot write', lambda: csv_and_snapshot(csv_path, snapshot_path, args.workers)),
+            ('snapshot load', lambda: load_snapshot(csv_path, snapshot_path)),
+        ]
+        print(f"{args.rows:,} CSV rows ({os.path.getsize(csv_path) / (1024 * 1024):.1f} MiB)")
+        print(f"{'start-up':<24}{'seconds':>10}{'first query ms':>16}")
+        results = {}
+        for name, run in runs:
+            started = time.perf_counter()
+            tables = run()
+            elapsed = time.perf_counter() - started
+            results[name] = elapsed
+            print(f"{name:<24}{elapsed:>10.3f}{first_request(tables) * 1000:>16.2f}")
+            del tables
+        print(f"snapshot file: {os.path.getsize(snapshot_path) / (1024 * 1024):.1f} MiB; "
+              f"load is {results['CSV + JSON dump'] / results['snapshot load']:.0f}x faster than CSV + JSON")
+
+
+if __name__ == '__main__':
+    main()
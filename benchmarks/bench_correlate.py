@@ -0,0 +1,80 @@
+# IP correlation benchmark: profile latency.
+#
+#   python benchmarks/bench_correlate.py --records 300000 --addresses 20000
+#
+# Fills the three tables with --records records each whose addresses are drawn
+# from --addresses addresses with Zipf-like frequencies (a few addresses in a
+# large share of the records, most of them rare). Then times profiles of the
+# busiest address, a typical one and an unknown one, and the index lookups
+# they are joined from, and checks the lookups against a scan of the IP
+# columns.
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import correlate  # noqa: E402
+import store  # noqa: E402
+
+
+def tables(count, addresses, rng):
+    pool = [f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}' for i in range(addresses)]
+    weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(addresses)))
+    pick = lambda: rng.choices(pool, cum_weights=weights)[0]  # noqa: E731
+    threats, traffic, logins = store.threat_table(), store.traffic_table(), store.login_table()
+    for i in range(count):
+        stamp = f'2023-{i % 12 + 1:02d}-{i % 28 + 1:02d} {i % 24:02d}:00:00'
+        threats.append({'id': str(i + 1), 'ipAddress': pick(), 'type': 'Malicious', 'severity': 'High',
+                        'lastSeen': stamp, 'count': 1, 'description': 'scan', 'source': 'Firewall',
+                        'location': {'lat': 0.0, 'lng': 0.0, 'country': 'India', 'city': 'Pune'}})
+        traffic.append({'id': str(i + 1), 'timestamp': stamp, 'sourceIP': pick(), 'destinationIP': pick(),
+                        'protocol': 'TCP', 'port': 443, 'bytesTransferred': 1200, 'packetsTransferred': 3,
+                        'duration': 1.0, 'status': 'Allowed'})
+        logins.append({'id': str(i + 1), 'timestamp': stamp, 'username': f'user{i % 1000}', 'ipAddress': pick(),
+                       'deviceInfo': 'Linux', 'location': 'Pune, India', 'status': 'Failed',
+                       'behaviorType': 'Authentication Attempt', 'anomalyScore': 10.0, 'description': 'login'})
+    return threats, traffic, logins, pool
+
+
+# (source, row) pairs of ip found by reading every IP field
+def scanned_matches(tables, ip):
+    return [(source, row) for source, (dataset, field, _) in enumerate(correlate.SOURCES)
+            for row, value in enumerate(map(tables[dataset].columns[field].get, range(len(tables[dataset]))))
+            if value == ip]
+
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='IP correlation: build cost and profile latency')
+    parser.add_argument('--records', type=int, default=300000, help='records per dataset')
+    parser.add_argument('--addresses', type=int, default=20000, help='distinct addresses')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per profile (best is kept)')
+    args = parser.parse_args()
+
+    threats, traffic, logins, pool = tables(args.records, args.addresses, random.Random(42))
+    correlation = correlate.correlate_tables(threats, traffic, logins)
+    print(f"{args.records:,} records per dataset, {args.addresses:,} addresses")
+
+    print(f"{'address':<18}{'records':>10}{'profile ms':>12}{'index join ms':>15}")
+    for ip in (pool[0], pool[len(pool) // 2], '192.0.2.1'):
+        elapsed, profile = best_time(lambda: correlation.profile(ip, {'limit': '100'}), args.repeat)
+        joined, rows = best_time(lambda: correlation.matches(ip), args.repeat)
+        assert rows == scanned_matches(correlation.tables, ip), ip
+        print(f"{ip:<18}{profile['records']:>10,}{elapsed * 1000:>12.2f}{joined * 1000:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
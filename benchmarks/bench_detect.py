@@ -0,0 +1,108 @@
+# Streaming detector benchmark: throughput and memory of the sliding windows.
+#
+#   python benchmarks/bench_detect.py --events 1000000 --keys 50000
+#
+# Appends --events login attempts and --events traffic records in time order
+# (about --rate per second, from --keys usernames and addresses) with the
+# default detectors attached, and injects --attacks brute-force bursts (one
+# user failing to log in every few seconds) and port scans (one address
+# probing a new port several times a second). Reports the detector cost per
+# record on top of the append, the windows kept, and checks that every
+# injected attack was reported.
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import detect  # noqa: E402
+import store  # noqa: E402
+
+START = 1672531200  # 2023-01-01 00:00:00 UTC
+
+
+def timestamp(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+# Login and traffic records, attacks mixed in; returns them and the attackers
+def records(count, keys, rate, attacks, rng):
+    logins, traffic = [], []
+    attack_every = count // (attacks + 1)
+    brute_forcers, scanners = set(), set()
+    for i in range(count):
+        epoch = START + i // rate
+        logins.append({
+            'id': str(i + 1), 'timestamp': timestamp(epoch), 'username': f'user{rng.randrange(keys)}',
+            'ipAddress': f'10.{rng.randrange(keys) >> 8 & 255}.{rng.randrange(256)}.1', 'deviceInfo': 'Linux',
+            'location': 'Pune, India', 'status': rng.choice(['Successful', 'Successful', 'Failed', 'Blocked']),
+            'behaviorType': 'Authentication Attempt', 'anomalyScore': 10.0, 'description': 'login',
+        })
+        traffic.append({
+            'id': str(i + 1), 'timestamp': timestamp(epoch),
+            'sourceIP': f'172.16.{rng.randrange(keys) >> 8 & 255}.{rng.randrange(256)}',
+            'destinationIP': '192.168.1.10', 'protocol': 'TCP', 'port': rng.choice([22, 80, 443, 3389, 8080]),
+            'bytesTransferred': 1200, 'packetsTransferred': 3, 'duration': 1.0, 'status': 'Allowed',
+        })
+        if i % attack_every == attack_every - 1 and len(brute_forcers) < attacks:
+            n = len(brute_forcers)
+            brute_forcers.add(f'victim{n}')
+            scanners.add(f'203.0.113.{n % 250 + 1}')
+            for step in range(8):
+                logins.append(dict(logins[-1], username=f'victim{n}', ipAddress='198.51.100.7',
+                                   status='Failed', timestamp=timestamp(epoch + step * 3)))
+            for step in range(30):
+                traffic.append(dict(traffic[-1], sourceIP=f'203.0.113.{n % 250 + 1}', port=1000 + step,
+                                    timestamp=timestamp(epoch + step // 4)))
+    logins.sort(key=lambda record: record['timestamp'])
+    traffic.sort(key=lambda record: record['timestamp'])
+    return logins, traffic, brute_forcers, scanners
+
+
+def append_all(login_table, traffic_table, logins, traffic):
+    started = time.perf_counter()
+    login_table.extend(logins)
+    traffic_table.extend(traffic)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming detectors: throughput and memory')
+    parser.add_argument('--events', type=int, default=1000000, help='login attempts and traffic records each')
+    parser.add_argument('--keys', type=int, default=50000, help='distinct usernames and addresses')
+    parser.add_argument('--rate', type=int, default=200, help='records per second of log time')
+    parser.add_argument('--attacks', type=int, default=100, help='brute-force bursts and port scans injected')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    logins, traffic, brute_forcers, scanners = records(args.events, args.keys, args.rate, args.attacks, rng)
+    count = len(logins) + len(traffic)
+    print(f"{len(logins):,} login attempts and {len(traffic):,} traffic records over "
+          f"{args.events // args.rate / 3600:.1f} h, {args.attacks} attacks injected")
+
+    plain = append_all(store.login_table(), store.traffic_table(), logins, traffic)
+    login_table, traffic_table = store.login_table(), store.traffic_table()
+    detections = detect.attach_detectors(traffic_table, login_table)
+    detected = append_all(login_table, traffic_table, logins, traffic)
+    cost = detected - plain
+    print(f"append only: {plain:.2f} s; with detectors: {detected:.2f} s -> {cost / count * 1e6:.2f} us/record "
+          f"for the detectors ({count / max(cost, 1e-9):,.0f} records/s)")
+
+    for detector in detections.detectors:
+        events = sum(len(state[0]) for state in detector.windows.values())
+        print(f"  {detector.rule:<22} {len(detector.windows):>8,} keys {events:>10,} events kept "
+              f"{detections.counts[detector.rule]:>8,} alerts")
+
+    alerted = {(alert['rule'], alert['key']) for alert in detections.alerts}
+    missed = ([user for user in brute_forcers if ('failed-logins-by-user', user) not in alerted] +
+              [address for address in scanners if ('port-scan', address) not in alerted])
+    assert not missed or len(detections.alerts) == detect.MAX_ALERTS, missed
+    print(f"Injected attacks reported: {len(brute_forcers) + len(scanners) - len(missed)} of "
+          f"{len(brute_forcers) + len(scanners)}")
+
+
+if __name__ == '__main__':
+    main()
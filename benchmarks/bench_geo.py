@@ -0,0 +1,94 @@
+# Geo-location benchmark: per-row random coordinates vs. the gazetteer.
+#
+#   python benchmarks/bench_geo.py --rows 1000000 --ranges 1000000
+#
+# Places --rows attack-log rows, --unknown-share of them in cities the
+# gazetteer does not list, the way map_row used to (the hard-coded dict plus
+# two random draws per unknown row) and with geo.Gazetteer.locate, with and
+# without its LRU cache, and counts the distinct points each method gives one
+# city. A second gazetteer with --ranges synthetic IPv4 ranges is then built
+# and random addresses are placed by bisection over its sorted range starts.
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geo  # noqa: E402
+from ingest import RowFiller  # noqa: E402
+
+UNKNOWN_CITIES = [f'Unlisted town {i}' for i in range(200)]
+
+# The 13 cities of the dict map_row used before the gazetteer
+LEGACY_CITIES = ['Jamshedpur', 'Bilaspur', 'Bokaro', 'Jaunpur', 'Anantapur', 'Aurangabad', 'Eluru',
+                 'Phagwara', 'Ambala', 'Rampur', 'Gangtok', 'Nandyal', 'Silchar']
+
+
+def legacy_locate(legacy, city, seed):
+    location = legacy.get(city)
+    if location is None:
+        filler = RowFiller(seed)
+        location = {'lat': filler.uniform(10, 40), 'lng': filler.uniform(70, 90), 'country': 'India'}
+    return location['lat'], location['lng'], location['country']
+
+
+def timed(run):
+    started = time.perf_counter()
+    result = run()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Geo-location: random coordinates vs. the gazetteer')
+    parser.add_argument('--rows', type=int, default=1000000, help='rows to place')
+    parser.add_argument('--unknown-share', type=float, default=0.3,
+                        help='share of rows in cities missing from the gazetteer')
+    parser.add_argument('--ranges', type=int, default=1000000, help='IPv4 ranges in the range gazetteer')
+    parser.add_argument('--lookups', type=int, default=1000000, help='addresses placed by range')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    gazetteer = geo.default_gazetteer()
+    known = list(gazetteer.names)
+    legacy = {city: dict(zip(('lat', 'lng', 'country'), gazetteer.city(city))) for city in LEGACY_CITIES}
+    cities = [rng.choice(UNKNOWN_CITIES) if rng.random() < args.unknown_share else rng.choice(known).title()
+              for _ in range(args.rows)]
+    seeds = [rng.getrandbits(32) for _ in range(args.rows)]
+    print(f"{args.rows:,} rows, {len(known)} gazetteer cities, {args.unknown_share:.0%} in unlisted towns")
+
+    uncached = geo.Gazetteer.load(geo.gazetteer_path(), cache_size=0)
+    methods = [
+        ('random per row (before)', lambda: [legacy_locate(legacy, city, seed) for city, seed in zip(cities, seeds)]),
+        ('gazetteer, no cache', lambda: [uncached.locate(city) for city in cities]),
+        ('gazetteer + LRU', lambda: [gazetteer.locate(city) for city in cities]),
+    ]
+    print(f"{'method':<26}{'seconds':>9}{'ns/row':>9}{'points per city':>17}")
+    for name, run in methods:
+        elapsed, points = timed(run)
+        per_city = {}
+        for city, point in zip(cities, points):
+            per_city.setdefault(city, set()).add(point)
+        most = max(len(found) for found in per_city.values())
+        print(f"{name:<26}{elapsed:>9.3f}{elapsed / args.rows * 1e9:>9.0f}{most:>17,}")
+    print(f"LRU cache: {gazetteer.cache_info()}")
+
+    # Non-overlapping IPv4 ranges of random sizes covering about half the space
+    bounds = sorted(rng.sample(range(1 << 32), args.ranges * 2))
+    ranges = [(f'{bounds[i] >> 24}.{bounds[i] >> 16 & 255}.{bounds[i] >> 8 & 255}.{bounds[i] & 255}-'
+               f'{bounds[i + 1] >> 24}.{bounds[i + 1] >> 16 & 255}.{bounds[i + 1] >> 8 & 255}.{bounds[i + 1] & 255}',
+               '', 'Country %d' % (i % 250), rng.uniform(-60, 60), rng.uniform(-180, 180))
+              for i in range(0, len(bounds), 2)]
+    elapsed, by_range = timed(lambda: geo.Gazetteer(ranges=ranges))
+    print(f"{args.ranges:,} address ranges indexed in {elapsed:.1f} s")
+    addresses = [f'{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}'
+                 for _ in range(args.lookups)]
+    elapsed, found = timed(lambda: [by_range.address(address) for address in addresses])
+    hits = sum(1 for location in found if location is not None)
+    print(f"{args.lookups:,} addresses placed in {elapsed:.2f} s ({args.lookups / elapsed:,.0f}/s), "
+          f"{hits / args.lookups:.0%} inside a range")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# Threat map benchmark: the full threat list vs. server-side clusters.
+#
+#   python benchmarks/bench_geo_clusters.py --threats 500000 --locations 20000
+#
+# Fills a threat table with --threats records spread over --locations distinct
+# points (the gazetteer's cities plus random points in India-sized boxes around
+# the world, the way address ranges would place them), builds the cluster grid
+# incrementally as the app does and compares the payload the map used to fetch
+# (every threat) with /api/threats/clusters for typical viewports: the world,
+# a country, a region and a city. Cluster counts are checked against a scan of
+# the table.
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geo  # noqa: E402
+import geogrid  # noqa: E402
+import serialize  # noqa: E402
+import store  # noqa: E402
+
+# Viewports (name, zoom, west, south, east, north) of a roughly 1200x800 px map
+VIEWPORTS = [
+    ('world', 2, -180.0, -75.0, 180.0, 75.0),
+    ('country', 5, 68.0, 8.0, 94.0, 30.0),
+    ('region', 8, 84.5, 21.5, 87.8, 23.7),
+    ('city', 12, 86.1, 22.75, 86.31, 22.86),
+]
+
+
+def random_locations(count, rng):
+    gazetteer = geo.default_gazetteer()
+    points = [(lat, lng) for lat, lng, _ in gazetteer.locations]
+    centers = [(rng.uniform(-45, 60), rng.uniform(-170, 170)) for _ in range(40)]
+    while len(points) < count:
+        lat, lng = rng.choice(centers)
+        points.append((round(lat + rng.uniform(-10, 10), 4), round(lng + rng.uniform(-10, 10), 4)))
+    return points
+
+
+def threat_table(count, locations, rng):
+    table = store.threat_table()
+    for i in range(count):
+        lat, lng = rng.choice(locations)
+        table.append({
+            'id': str(i + 1), 'ipAddress': f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}',
+            'type': rng.choice(['Malicious', 'Scanning', 'Data Exfiltration', 'Suspicious']),
+            'severity': rng.choice(['Low', 'Medium', 'High']), 'lastSeen': '2023-05-30 06:33:58',
+            'count': 1, 'description': 'synthetic threat', 'source': 'Server',
+            'location': {'lat': lat, 'lng': lng, 'country': 'India', 'city': 'Somewhere'},
+        })
+    return table
+
+
+def scan_count(table, bbox):
+    west, south, east, north = bbox
+    lat, lng = table.columns['location.lat'], table.columns['location.lng']
+    return sum(1 for row in range(len(table))
+               if south <= lat.get(row) <= north and west <= lng.get(row) <= east)
+
+
+# Bytes of the arrays of a snapshot state (written as snapshot buffers)
+def array_bytes(state):
+    return sum(len(value) * value.itemsize for value in state.values() if hasattr(value, 'itemsize'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Threat map: full list vs. server-side clusters')
+    parser.add_argument('--threats', type=int, default=500000, help='threat records')
+    parser.add_argument('--locations', type=int, default=20000, help='distinct threat locations')
+    parser.add_argument('--repeat', type=int, default=20, help='runs per cluster query (best is kept)')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    table = threat_table(args.threats, random_locations(args.locations, rng), rng)
+    started = time.perf_counter()
+    grid = table.attach(geogrid.GeoGrid(table))
+    built = time.perf_counter() - started
+    cells = sum(len(level) for level in grid.levels)
+    print(f"{args.threats:,} threats at {len(grid.locations):,} locations: grid built in {built:.2f} s "
+          f"({built / args.threats * 1e6:.1f} us/threat), {cells:,} cells; "
+          f"state {array_bytes(grid.state()['locations']) / 1024:,.0f} KiB")
+
+    started = time.perf_counter()
+    full = sum(len(chunk) for chunk in serialize.stream_array(iter(table)))
+    print(f"Full threat list (what the map loaded before): {full / 2 ** 20:,.1f} MiB, "
+          f"{time.perf_counter() - started:.1f} s to encode")
+
+    print(f"{'viewport':<10}{'zoom':>5}{'clusters':>10}{'threats':>10}{'ms':>8}{'payload KiB':>13}")
+    for name, zoom, *bbox in VIEWPORTS:
+        best = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = grid.clusters(tuple(bbox), zoom)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        payload = len(serialize.dumps(result))
+        # Cells may reach past the box edges; every threat inside it is counted
+        assert result['total'] >= scan_count(table, bbox), name
+        print(f"{name:<10}{zoom:>5}{len(result['clusters']):>10,}{result['total']:>10,}{best * 1000:>8.2f}"
+              f"{payload / 1024:>13,.1f}")
+
+
+if __name__ == '__main__':
+    main()
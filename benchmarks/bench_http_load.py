@@ -0,0 +1,204 @@
+# HTTP load test: the threaded development server vs. the asyncio (ASGI) mode.
+#
+#   python benchmarks/bench_http_load.py --rows 20000 --connections 100,1000,5000
+#
+# The app is started on a synthetic CSV (in a temporary data directory) under
+# each server in turn: 'werkzeug' is the threaded server app.run uses (without
+# the debugger, reloader and request log), 'asgi' is asgi.py's asyncio server.
+# For every --connections level that many keep-alive connections send requests
+# back to back for --duration seconds, cycling through --paths; the latency of
+# each request (send to last body byte) gives p50/p99, and completed requests
+# per second the throughput. --slow adds connections that download the full
+# threat list at --slow-rate bytes/s, like dashboards on poor links, to show
+# how they affect everyone else.
+#
+# The load generator is a single asyncio process; on a machine with few cores
+# it competes with the server for CPU, so compare the servers with each other
+# rather than reading the numbers as absolute capacity.
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_csv  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOST = '127.0.0.1'
+DEFAULT_PATHS = '/api/threats?limit=100,/api/traffic?limit=100&sort=-timestamp,/api/threat/1,/api/login-attempts?limit=100'
+
+
+# Allow as many open files as the hard limit permits (one per connection)
+def raise_file_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard != resource.RLIM_INFINITY else 65536, hard))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+# Server process body: load the app and serve it with the given server
+def serve(server, port):
+    import logging
+
+    raise_file_limit()
+    if server == 'werkzeug':
+        from werkzeug.serving import run_simple
+
+        import app
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        run_simple(HOST, port, app.app, threaded=True)
+    else:
+        import asgi
+        asgi.serve(asgi.create_application(), HOST, port)
+
+
+def start_server(server, port, env):
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', server, str(port)],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        if process.poll() is not None:
+            sys.exit(f'{server} server exited with status {process.returncode}')
+        try:
+            urllib.request.urlopen(f'http://{HOST}:{port}/test', timeout=1).read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    sys.exit(f'{server} server did not start')
+
+
+# Read one response; returns (status, keep_alive). With rate (bytes/s) the
+# body is read slowly.
+async def read_response(reader, rate=None):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+
+    async def read(size):
+        if rate:
+            await asyncio.sleep(size / rate)
+        return await reader.readexactly(size)
+
+    if 'content-length' in headers:
+        remaining = int(headers['content-length'])
+        while remaining:
+            remaining -= len(await read(min(remaining, 16384)))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).strip(), 16)
+            await read(size + 2)
+            if not size:
+                break
+    else:
+        while await reader.read(16384):
+            pass
+        return status, False
+    keep_alive = headers.get('connection') != 'close' and lines[0].startswith('HTTP/1.1')
+    return status, keep_alive
+
+
+async def client(port, paths, deadline, timeout, results, rate=None, offset=0):
+    sent = offset
+    while time.perf_counter() < deadline:
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(HOST, port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            results['errors'] += 1
+            await asyncio.sleep(0.1)
+            continue
+        try:
+            while time.perf_counter() < deadline:
+                path = paths[sent % len(paths)]
+                sent += 1
+                started = time.perf_counter()
+                writer.write(f'GET {path} HTTP/1.1\r\nHost: {HOST}:{port}\r\n\r\n'.encode('latin-1'))
+                status, keep_alive = await asyncio.wait_for(read_response(reader, rate), timeout)
+                if status != 200:
+                    results['errors'] += 1
+                elif time.perf_counter() <= deadline:
+                    results['latencies'].append(time.perf_counter() - started)
+                if not keep_alive:
+                    break
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError, IndexError):
+            results['errors'] += 1
+        finally:
+            writer.close()
+
+
+async def run_level(port, connections, slow, paths, duration, slow_rate, timeout):
+    deadline = time.perf_counter() + duration
+    fast = {'latencies': [], 'errors': 0}
+    slow_results = {'latencies': [], 'errors': 0}
+    tasks = [client(port, paths, deadline, timeout, fast, offset=i) for i in range(connections)]
+    tasks += [client(port, ['/api/threats'], deadline, max(timeout, duration), slow_results, slow_rate)
+              for _ in range(slow)]
+    await asyncio.gather(*tasks)
+    return fast, slow_results
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP load test: threaded server vs. asyncio mode')
+    parser.add_argument('--rows', type=int, default=20000, help='synthetic CSV rows')
+    parser.add_argument('--servers', default='werkzeug,asgi', help='servers to compare')
+    parser.add_argument('--connections', default='100,1000,5000', help='concurrent connections per level')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per level')
+    parser.add_argument('--paths', default=DEFAULT_PATHS, help='comma-separated request paths, used in turn')
+    parser.add_argument('--slow', type=int, default=0, help='extra connections downloading the full threat list slowly')
+    parser.add_argument('--slow-rate', type=int, default=64 << 10, help='bytes/s read by each slow connection')
+    parser.add_argument('--timeout', type=float, default=30.0, help='seconds before a request counts as failed')
+    parser.add_argument('--serve', nargs=2, metavar=('SERVER', 'PORT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve[0], int(args.serve[1]))
+        return
+
+    raise_file_limit()
+    paths = args.paths.split(',')
+    levels = [int(level) for level in args.connections.split(',')]
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = write_csv(os.path.join(tmp, 'attacks.csv'), args.rows)
+        env = dict(os.environ, CTI_CSV_PATH=csv_path, CTI_DATA_DIR=tmp)
+        print(f"{args.rows:,} CSV rows, {args.duration:g} s per level, {args.slow} slow clients; paths: {', '.join(paths)}")
+        print(f"{'server':<10}{'conns':>7}{'requests':>10}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}"
+              f"{'slow done':>10}")
+        for server in args.servers.split(','):
+            port = free_port()
+            process = start_server(server, port, env)
+            try:
+                for connections in levels:
+                    fast, slow = asyncio.run(run_level(port, connections, args.slow, paths, args.duration,
+                                                       args.slow_rate, args.timeout))
+                    latencies = sorted(fast['latencies'])
+                    print(f"{server:<10}{connections:>7}{len(latencies):>10,}{len(latencies) / args.duration:>9,.0f}"
+                          f"{percentile(latencies, 0.5) * 1000:>9.1f}{percentile(latencies, 0.99) * 1000:>9.1f}"
+                          f"{fast['errors']:>8,}{len(slow['latencies']):>10,}", flush=True)
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# CIDR / address range query benchmark on the sorted IP index.
+#
+#   python benchmarks/bench_ip_ranges.py --addresses 10000000
+#
+# Fills an IP column with --addresses random addresses (--ipv6-share of them
+# IPv6, the rest IPv4 clustered in a few hundred /16 blocks like attack sources
+# are), builds its sorted index and times queries of each shape the API takes:
+# single CIDR blocks from /8 to /32, IPv6 prefixes, explicit address ranges and
+# the RFC 1918 union. Each is answered as the list endpoints do (count of
+# matching rows) and as /api/ip-ranges does (rows plus the first 100 distinct
+# addresses); a linear scan over the column gives the baseline and checks the
+# counts.
+import argparse
+import ipaddress
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import query  # noqa: E402
+import store  # noqa: E402
+
+
+def random_addresses(count, ipv6_share, seed=42):
+    rng = random.Random(seed)
+    blocks = [(rng.choice([10, 45, 103, 172, 185, 192, 203]), rng.randint(0, 255)) for _ in range(300)]
+    for _ in range(count):
+        if rng.random() < ipv6_share:
+            yield str(ipaddress.IPv6Address((0x2001_0db8 << 96) | rng.getrandbits(80)))
+        else:
+            a, b = rng.choice(blocks)
+            yield f'{a}.{b}.{rng.randint(0, 255)}.{rng.randint(1, 254)}'
+
+
+def queries(rng, sample):
+    shapes = []
+    for prefix in (8, 16, 24, 32):
+        address = ipaddress.ip_address(rng.choice(sample['v4']))
+        shapes.append((f'/{prefix}', str(ipaddress.ip_network(f'{address}/{prefix}', strict=False))))
+    for prefix in (48, 64):
+        address = ipaddress.ip_address(rng.choice(sample['v6']))
+        shapes.append((f'v6 /{prefix}', str(ipaddress.ip_network(f'{address}/{prefix}', strict=False))))
+    first = ipaddress.ip_address(rng.choice(sample['v4']))
+    shapes.append(('range', f'{first}-{first + 70000}'))
+    shapes.append(('rfc1918', 'rfc1918'))
+    return shapes
+
+
+def best_time(run, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CIDR / address range queries on the sorted IP index')
+    parser.add_argument('--addresses', type=int, default=1000000, help='addresses in the column')
+    parser.add_argument('--ipv6-share', type=float, default=0.1, help='share of IPv6 addresses')
+    parser.add_argument('--repeat', type=int, default=20, help='runs per indexed query (best is kept)')
+    parser.add_argument('--no-scan', action='store_true', help='skip the linear scan baseline')
+    args = parser.parse_args()
+
+    table = store.Table([('ipAddress', store.IP)])
+    started = time.perf_counter()
+    for address in random_addresses(args.addresses, args.ipv6_share):
+        table.append({'ipAddress': address})
+    filled = time.perf_counter() - started
+    key = query.sort_key(table, 'ipAddress')
+    started = time.perf_counter()
+    index = table.sorted_index('ipAddress', key)
+    built = time.perf_counter() - started
+    print(f"{args.addresses:,} addresses ({args.ipv6_share:.0%} IPv6): column filled in {filled:.1f} s, "
+          f"index built in {built:.1f} s ({len(index.order) * index.order.itemsize / 2 ** 20:.0f} MiB)")
+
+    rng = random.Random(7)
+    column = table.columns['ipAddress']
+    picks = [column.get(rng.randrange(len(table))) for _ in range(2000)]
+    sample = {'v4': [a for a in picks if ':' not in a], 'v6': [a for a in picks if ':' in a] or ['2001:db8::1']}
+
+    print(f"{'query':<10}{'cidr':<34}{'rows':>10}{'count us':>11}{'summary us':>12}{'scan ms':>10}{'speed-up':>10}")
+    for shape, cidr in queries(rng, sample):
+        ranges = query.parse_ip_ranges(cidr)
+        count_time, rows = best_time(
+            lambda: query.IPRangeFilter(table, 'ipAddress', key, ranges).size(), args.repeat)
+        summary_time, summary = best_time(
+            lambda: query.ip_ranges({'threats': table}, {'cidr': cidr}), args.repeat)
+        assert summary['threats']['ipAddress']['rows'] == rows
+        scan = ''
+        speedup = ''
+        if not args.no_scan:
+            match = query.IPRangeFilter(table, 'ipAddress', key, ranges).match
+            scan_time, scanned = best_time(lambda: sum(1 for row in range(len(table)) if match(row)), 1)
+            assert scanned == rows, (cidr, scanned, rows)
+            scan = f'{scan_time * 1000:.0f}'
+            speedup = f'{scan_time / count_time:,.0f}x'
+        print(f"{shape:<10}{cidr[:33]:<34}{rows:>10,}{count_time * 1e6:>11.1f}{summary_time * 1e6:>12.1f}"
+              f"{scan:>10}{speedup:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+# JSON encoder benchmark on the API's payload shapes.
+#
+#   python benchmarks/bench_json_encoders.py --rows 50000
+#
+# Payloads are built the way the routes build them (full dataset lists, a
+# sorted page, the chart statistics, a single record) from synthetic CSV rows.
+# Each is encoded with Flask 2.0's json.dumps (what jsonify used) and with
+# every encoder registered in serialize.py; the full lists are also encoded
+# with stream_array. Like in the routes, building the payload from the tables
+# is part of each measurement. Times are the best of --repeat runs; peak memory
+# is the tracemalloc peak while building and encoding.
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flask  # noqa: E402
+
+import ingest  # noqa: E402
+import query  # noqa: E402
+import serialize  # noqa: E402
+import stats  # noqa: E402
+import store  # noqa: E402
+from synthetic import synthetic_rows  # noqa: E402
+
+
+def build_tables(count):
+    tables = (store.threat_table(), store.traffic_table(), store.login_table())
+    for triple in ingest.map_rows(synthetic_rows(count), ingest.IngestStats()):
+        for target, record in zip(tables, triple):
+            if record is not None:
+                target.append(record)
+    return tables
+
+
+def payloads(tables):
+    threats, traffic, logins = tables
+    group_stats = stats.attach_dataset_stats(threats, traffic, logins)
+    return [
+        ('threats list', lambda: list(threats)),
+        ('traffic list', lambda: list(traffic)),
+        ('login list', lambda: list(logins)),
+        ('traffic page', lambda: query.run(traffic, 'traffic', {'sort': '-timestamp', 'limit': '100'})),
+        ('stats+hours', lambda: {name: group.to_dict('hour') for name, group in group_stats.items()}),
+        ('threat detail', lambda: threats[0]),
+    ]
+
+
+def best_time(encode, repeat):
+    best = None
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = encode()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, size
+
+
+def peak_bytes(encode):
+    tracemalloc.start()
+    encode()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON encoder benchmark on API payloads')
+    parser.add_argument('--rows', type=int, default=20000, help='synthetic CSV rows')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement (best is kept)')
+    args = parser.parse_args()
+
+    app = flask.Flask(__name__)
+    tables = build_tables(args.rows)
+
+    with app.app_context():
+        encoders = [('flask.json', lambda obj: flask.json.dumps(obj, separators=(',', ':')).encode('utf-8'))]
+        for name in serialize.ENCODERS:
+            encoder = serialize.get_encoder(name)
+            encoders.append((name, encoder.dumps))
+
+        print(f"{args.rows:,} CSV rows; encoders: {', '.join(name for name, _ in encoders)}")
+        print(f"{'payload':<16}{'encoder':<18}{'ms':>10}{'MB/s':>10}{'peak MiB':>10}")
+        for payload_name, build in payloads(tables):
+            for encoder_name, dumps in encoders:
+                elapsed, size = best_time(lambda: len(dumps(build())), args.repeat)
+                peak = peak_bytes(lambda: dumps(build()))
+                print(f"{payload_name:<16}{encoder_name:<18}{elapsed * 1000:>10.2f}"
+                      f"{size / elapsed / 1e6:>10.1f}{peak / (1024 * 1024):>10.1f}")
+            if not payload_name.endswith(' list'):
+                continue
+            # Streaming straight from the table: records are made per batch
+            table = tables[['threats list', 'traffic list', 'login list'].index(payload_name)]
+            for name in serialize.ENCODERS:
+                serialize.encoder = serialize.get_encoder(name)
+                elapsed, size = best_time(
+                    lambda: sum(len(chunk) for chunk in serialize.stream_array(iter(table))), args.repeat)
+                peak = peak_bytes(lambda: sum(len(chunk) for chunk in serialize.stream_array(iter(table))))
+                print(f"{payload_name:<16}{name + ' (stream)':<18}{elapsed * 1000:>10.2f}"
+                      f"{size / elapsed / 1e6:>10.1f}{peak / (1024 * 1024):>10.1f}")
+            serialize.encoder = serialize.get_encoder()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# Live tail benchmark: rows appended to a followed log and fanned out over SSE.
+#
+#   python benchmarks/bench_live_tail.py --rows 100000 --subscribers 8
+#
+# A writer appends synthetic CSV rows to a log in a temporary directory in
+# chunks of --chunk rows (optionally capped at --rate rows per second) while a
+# LogFollower tails it into the dataset tables and publishes delta events.
+# --subscribers clients drain their queues continuously; one more client only
+# reads every --slow-interval seconds, like a dashboard on a stalled connection.
+# Reported are the rows ingested per second, the events published, the bytes
+# each fast client received and how often the slow client's backlog was
+# replaced by a resync (--queue sets how many events a client may fall behind).
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import live  # noqa: E402
+import stats  # noqa: E402
+import store  # noqa: E402
+from synthetic import synthetic_rows  # noqa: E402
+
+
+def csv_chunks(count, chunk):
+    rows = synthetic_rows(count)
+    header = None
+    while True:
+        buffer = io.StringIO()
+        writer = None
+        written = 0
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(row))
+                if header is None:
+                    writer.writeheader()
+                    header = True
+            writer.writerow(row)
+            written += 1
+            if written == chunk:
+                break
+        if not written:
+            return
+        yield buffer.getvalue().encode('utf-8'), written
+
+
+def append_rows(path, count, chunk, rate):
+    started = time.perf_counter()
+    appended = 0
+    with open(path, 'ab') as f:
+        for data, written in csv_chunks(count, chunk):
+            f.write(data)
+            f.flush()
+            appended += written
+            if rate:
+                delay = started + appended / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+
+def drain(broker, subscriber, interval, received):
+    while not subscriber.closed:
+        chunk = subscriber.take(0.1)
+        received['bytes'] += len(chunk)
+        received['events'] += chunk.count(b'event: ')
+        received['resyncs'] += chunk.count(b'event: resync')
+        if interval:
+            time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Live log tail and SSE fan-out benchmark')
+    parser.add_argument('--rows', type=int, default=50000, help='rows appended to the log')
+    parser.add_argument('--chunk', type=int, default=200, help='rows per append')
+    parser.add_argument('--rate', type=int, default=0, help='append rate in rows/s (0 = as fast as possible)')
+    parser.add_argument('--subscribers', type=int, default=4, help='clients that keep up')
+    parser.add_argument('--slow-interval', type=float, default=1.0, help='seconds between reads of the slow client')
+    parser.add_argument('--queue', type=int, default=live.SUBSCRIBER_QUEUE, help='events queued per subscriber')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'attacks.csv')
+        open(path, 'wb').close()
+        tables = (store.threat_table(), store.traffic_table(), store.login_table())
+        group_stats = stats.attach_dataset_stats(*tables)
+        broker = live.Broker()
+
+        clients = []
+        for interval in [0.0] * args.subscribers + [args.slow_interval]:
+            subscriber = broker.subscribe(max_events=args.queue)
+            received = {'bytes': 0, 'events': 0, 'resyncs': 0}
+            thread = threading.Thread(target=drain, args=(broker, subscriber, interval, received), daemon=True)
+            thread.start()
+            clients.append((subscriber, received, thread))
+
+        follower = live.LogFollower(path, tables, broker, group_stats, poll_interval=0.01)
+        follower.start()
+        started = time.perf_counter()
+        append_rows(path, args.rows, args.chunk, args.rate)
+        while follower.ingest_stats.rows < args.rows:
+            time.sleep(0.005)
+        elapsed = time.perf_counter() - started
+        follower.stop()
+        follower.join()
+        time.sleep(max(0.2, args.slow_interval))
+        for subscriber, _, _ in clients:
+            broker.unsubscribe(subscriber)
+        for _, _, thread in clients:
+            thread.join()
+
+        print(f"{args.rows:,} rows in chunks of {args.chunk}; {args.subscribers} fast + 1 slow subscriber")
+        print(f"ingested      {follower.ingest_stats.rows / elapsed:>12,.0f} rows/s ({elapsed:.2f} s)")
+        print(f"published     {broker.published:>12,} events ({broker.published / elapsed:,.0f}/s, "
+              f"{follower.batches} batches)")
+        fast = [received for _, received, _ in clients[:-1]]
+        if fast:
+            print(f"fast clients  {min(r['events'] for r in fast):>12,} events, "
+                  f"{sum(r['bytes'] for r in fast) / len(fast) / 1e6:.1f} MB each, "
+                  f"{sum(r['resyncs'] for r in fast)} resyncs")
+        slow = clients[-1][1]
+        print(f"slow client   {slow['events']:>12,} events, {slow['bytes'] / 1e6:.1f} MB, "
+              f"{slow['resyncs']} resyncs")
+        print(f"overflows     {broker.stats()['overflows']:>12,}")
+
+
+if __name__ == '__main__':
+    main()
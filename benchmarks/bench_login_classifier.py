@@ -0,0 +1,112 @@
+# Login classification benchmark: the original per-row if-chains vs. classify.py.
+#
+#   python benchmarks/bench_login_classifier.py --rows 1000000
+#
+# Builds columns of payloads, actions and anomaly scores (a --keyword-share of
+# the payloads mention a login keyword, the rest are filler text like the
+# Kaggle export's; the scores include the threshold edge cases), classifies
+# them row by row with the if-chains map_row used to contain and with
+# classify_login, and checks that both give the same labels.
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import classify  # noqa: E402
+
+FILLER = ('qui natus odio asperiores nam optio nobis iusto accusamus ad perferendis esse at '
+          'neque accusantium veritatis aut eum voluptas dolores ratione').split()
+KEYWORDS = ['Login', 'unusual', 'Authentication', 'ACCESS', 'authorization', 'suspicious']
+EDGE_SCORES = [0.0, 29.99, 30.0, 30.5, 30.99, 31.0, 69.99, 70.0, 70.01, 100.0, -1.0]
+
+
+def columns(count, keyword_share, seed=42):
+    rng = random.Random(seed)
+    payloads, actions, scores = [], [], []
+    for i in range(count):
+        words = [rng.choice(FILLER) for _ in range(rng.randint(10, 30))]
+        if rng.random() < keyword_share:
+            words.insert(rng.randrange(len(words)), rng.choice(KEYWORDS))
+        text = ' '.join(words)
+        payloads.append(None if i % 997 == 0 else text[0].upper() + text[1:] + '.')
+        actions.append(rng.choice(['Blocked', 'Logged', 'Ignored']))
+        scores.append(EDGE_SCORES[i % len(EDGE_SCORES)] if i % 50 == 0 else round(rng.uniform(0, 100), 2))
+    return payloads, actions, scores
+
+
+# The classification map_row performed before classify.py
+def original(payload, action, anomaly_score):
+    payload_lower = payload.lower() if payload else ''
+    if (
+        'authentication' in payload_lower or
+        'login' in payload_lower or
+        'access' in payload_lower or
+        'authorization' in payload_lower or
+        'suspicious' in payload_lower or
+        'unusual' in payload_lower or
+        int(anomaly_score) > 30
+    ):
+        status = 'Failed'
+        if action == 'Blocked':
+            status = 'Blocked'
+        elif action == 'Logged' and anomaly_score < 30:
+            status = 'Successful'
+
+        behavior_type = 'Suspicious Login'
+        if 'authentication' in payload_lower:
+            behavior_type = 'Authentication Attempt'
+        elif anomaly_score > 70:
+            behavior_type = 'Highly Suspicious Activity'
+        elif 'unusual' in payload_lower:
+            behavior_type = 'Unusual Behavior'
+        return status, behavior_type
+    return None
+
+
+def per_row(classify_row, payloads, actions, scores, lower=True):
+    statuses, behaviors = [], []
+    for payload, action, score in zip(payloads, actions, scores):
+        if lower:
+            payload = payload.lower() if payload else ''
+        labels = classify_row(payload, action, score) or (None, None)
+        statuses.append(labels[0])
+        behaviors.append(labels[1])
+    return statuses, behaviors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Login classification: per-row if-chains vs. classify.py')
+    parser.add_argument('--rows', type=int, default=200000, help='rows to classify')
+    parser.add_argument('--keyword-share', type=float, default=0.05,
+                        help='share of payloads that mention a login keyword')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per method (best is kept)')
+    args = parser.parse_args()
+
+    data = columns(args.rows, args.keyword_share)
+    methods = [
+        ('original (per row)', lambda: per_row(original, *data, lower=False)),
+        ('classify_login', lambda: per_row(classify.classify_login, *data)),
+    ]
+
+    print(f"{args.rows:,} rows, {args.keyword_share:.0%} with a keyword")
+    print(f"{'method':<24}{'seconds':>10}{'ns/row':>10}{'speed-up':>10}  labels")
+    reference = None
+    baseline = None
+    for name, run in methods:
+        best = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            labels = run()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        reference = reference or labels
+        baseline = baseline or best
+        same = 'identical' if labels == reference else 'DIFFERENT'
+        print(f"{name:<24}{best:>10.3f}{best / args.rows * 1e9:>10.0f}{baseline / best:>9.1f}x  {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# Instrumentation overhead: API requests with and without the request metrics.
+#
+#   python benchmarks/bench_metrics.py --rows 20000 --requests 2000
+#
+# Loads the app on a synthetic CSV (in a temporary data directory) and calls
+# its WSGI application directly - no client or socket in the way, so the
+# overhead is measured against the cheapest possible request - for each
+# --paths entry, --requests times per round, alternating rounds with
+# metrics.RequestMetrics attached and detached. The best round of each is
+# compared. Also times the ingest stage timers on map_row and a /metrics scrape,
+# and checks that the requests were counted under their URL rules.
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import synthetic_rows, write_csv  # noqa: E402
+
+DEFAULT_PATHS = ('/api/threats?limit=100,/api/traffic?limit=100&sort=-timestamp,/api/threat/1,'
+                 '/api/login-attempts?limit=100,/api/stats,/api/traffic/timeseries?step=1d')
+
+
+def environ_for(path):
+    from werkzeug.test import EnvironBuilder
+
+    builder = EnvironBuilder(path=path)
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+
+def run(wsgi_app, base, count):
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    started = time.perf_counter()
+    for _ in range(count):
+        environ = dict(base)
+        environ['wsgi.input'] = io.BytesIO()
+        for _ in wsgi_app(environ, start_response):
+            pass
+    return (time.perf_counter() - started) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Request instrumentation overhead')
+    parser.add_argument('--rows', type=int, default=20000, help='synthetic CSV rows')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per path and round')
+    parser.add_argument('--rounds', type=int, default=5, help='rounds per mode (best is kept)')
+    parser.add_argument('--paths', default=DEFAULT_PATHS, help='comma-separated request paths')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(CTI_CSV_PATH=write_csv(os.path.join(tmp, 'attacks.csv'), args.rows),
+                          CTI_DATA_DIR=tmp, CTI_METRICS='0')
+        import app
+        import ingest
+        import metrics
+
+        print(f"{'path':<44}{'plain us':>10}{'metrics us':>12}{'overhead':>10}")
+        plain_total = measured_total = 0.0
+        for path in args.paths.split(','):
+            base = environ_for(path)
+            run(app.app.wsgi_app, base, 50)
+            best = {False: None, True: None}
+            for _ in range(args.rounds):
+                for attached in (False, True):
+                    if attached:
+                        app.request_metrics.attach(app.app)
+                    try:
+                        elapsed = run(app.app.wsgi_app, base, args.requests)
+                    finally:
+                        if attached:
+                            app.request_metrics.detach(app.app)
+                    best[attached] = elapsed if best[attached] is None else min(best[attached], elapsed)
+            plain_total += best[False]
+            measured_total += best[True]
+            print(f"{path:<44}{best[False] * 1e6:>10.1f}{best[True] * 1e6:>12.1f}"
+                  f"{(best[True] / best[False] - 1) * 100:>9.1f}%")
+        print(f"{'all paths':<44}{plain_total * 1e6:>10.1f}{measured_total * 1e6:>12.1f}"
+              f"{(measured_total / plain_total - 1) * 100:>9.1f}%")
+
+        # The fixed cost of the timing itself, around an application that does nothing
+        class Bare:
+            def wsgi_app(self, environ, start_response):
+                start_response('200 OK', [])
+                return [b'']
+
+        bare = Bare()
+        timings = {}
+        for attached in (False, True):
+            if attached:
+                metrics.RequestMetrics(metrics.Registry()).attach(bare)
+            timings[attached] = min(run(bare.wsgi_app, {'REQUEST_METHOD': 'GET'}, args.requests * 10)
+                                    for _ in range(args.rounds))
+        cost = timings[True] - timings[False]
+        print(f"timing cost: {cost * 1e6:.2f} us/request ({cost / (plain_total / len(args.paths.split(','))) * 100:.1f}% "
+              f"of the mean plain request)")
+
+        rows = list(synthetic_rows(20000))
+        timings = {}
+        for stages in (None, ingest.IngestStats().stages):
+            best = None
+            for _ in range(args.rounds):
+                started = time.perf_counter()
+                for row in rows:
+                    ingest.map_row(row, stages)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            timings[stages is not None] = best / len(rows)
+        print(f"map_row: {timings[False] * 1e6:.2f} us/row, with stage timers {timings[True] * 1e6:.2f} us/row "
+              f"({(timings[True] / timings[False] - 1) * 100:+.1f}%)")
+
+        started = time.perf_counter()
+        scrape = app.metrics_registry.render()
+        print(f"/metrics scrape: {(time.perf_counter() - started) * 1000:.1f} ms, {len(scrape) / 1024:.1f} KiB")
+        # Every timed request is labelled with the URL rule it matched
+        for path in args.paths.split(','):
+            rule = app.app.url_map.bind('localhost').match(path.split('?')[0], return_rule=True)[0].rule
+            assert f'cti_http_requests_total{{route="{rule}",method="GET",status="200"}}' in scrape, rule
+        assert 'route="unmatched"' not in scrape
+
+
+if __name__ == '__main__':
+    main()
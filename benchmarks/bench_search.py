@@ -0,0 +1,83 @@
+# Full-text search benchmark: index build, size and query latency.
+#
+#   python benchmarks/bench_search.py --docs 2000000 --vocabulary 50000
+#
+# Indexes --docs descriptions of 5-40 words drawn from a --vocabulary word
+# list with Zipf-like frequencies (a few words in most descriptions, most of
+# them rare), exports the index and restores it on read-only views as a
+# snapshot load does, then times typical queries (rare, common and mixed
+# words, phrases, alternatives) on the restored index: a full ranked page of
+# 20 results per query, best of --repeat runs.
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search  # noqa: E402
+import store  # noqa: E402
+
+SCHEMA = [('id', store.STRING), ('description', store.STRING)]
+
+
+def descriptions(count, vocabulary, rng):
+    words = [f'w{rank}' for rank in range(vocabulary)]
+    weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(vocabulary)))
+    for _ in range(count):
+        yield ' '.join(rng.choices(words, cum_weights=weights, k=rng.randint(5, 40)))
+
+
+# The table restored from its export on read-only memoryviews (like an mmap)
+def restored(table):
+    meta, buffers = table.export()
+    views = {name: memoryview(bytes(memoryview(data).cast('B'))).cast(
+        data.typecode if hasattr(data, 'typecode') else 'B') for name, data in buffers.items()}
+    return store.Table(SCHEMA, ['description'], (meta, views))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full-text search: index size and query latency')
+    parser.add_argument('--docs', type=int, default=2000000, help='descriptions to index')
+    parser.add_argument('--vocabulary', type=int, default=50000, help='distinct words')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per query (best is kept)')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    table = store.Table(SCHEMA, [])
+    for i, text in enumerate(descriptions(args.docs, args.vocabulary, rng)):
+        table.append({'id': str(i + 1), 'description': text})
+    started = time.perf_counter()
+    index = table.attach(store.TextIndex(table.columns['description']))
+    index.count('')  # (the rows are indexed by the first read)
+    built = time.perf_counter() - started
+    postings = sum(len(tail[1]) for tail in index.tails.values())
+    print(f"{args.docs:,} descriptions, {len(index.tails):,} terms, {postings:,} postings; "
+          f"indexed in {built:.1f} s ({built / args.docs * 1e6:.1f} us/description)")
+
+    table.index_fields.append('description')
+    table.indexes['description'] = index
+    started = time.perf_counter()
+    table = restored(table)
+    index = table.indexes['description']
+    print(f"Exported and restored in {time.perf_counter() - started:.1f} s: row gaps {len(index.gaps) / postings:.2f} "
+          f"bytes/posting (4 for plain row numbers), {len(index.occurrences) / postings:.0f} byte/posting "
+          f"of counts, skips {len(index.skips) * 8 / postings:.2f} bytes/posting")
+
+    queries = ['w40000', 'w900', 'w0', 'w0 w900', 'w1 w2', '"w1 w2"', 'w30000 OR w35000 OR w40000',
+               'w3 w4 w5', '"w0 w1" OR w2000']
+    print(f"{'query':<30}{'matches':>11}{'ms':>10}")
+    for text in queries:
+        best = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = search.run({'docs': (table, 'description')}, {'q': text})
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{text:<30}{result['total']:>11,}{best * 1000:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
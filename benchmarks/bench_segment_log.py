@@ -0,0 +1,111 @@
+# Segment log benchmark: persisting live batches, replay and recovery.
+#
+#   python benchmarks/bench_segment_log.py --rows 100000 --batches 200
+#
+# Loads --rows synthetic CSV rows into the tables, then persists --batches
+# batches of --batch-rows new rows two ways: appending each batch to the
+# segment log (one fsync'd frame) and rewriting the three datasets as JSON
+# after each batch, as the server used to on every ingest. Then replays the
+# log into fresh tables, cuts a frame in half as a crash while appending
+# would, and checks that recovery keeps every complete batch.
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import synthetic_rows  # noqa: E402
+
+import ingest  # noqa: E402
+import segments  # noqa: E402
+import store  # noqa: E402
+
+
+def new_tables():
+    return store.threat_table(), store.traffic_table(), store.login_table()
+
+
+def mapped_batches(rows, batch_rows):
+    for start in range(0, len(rows), batch_rows):
+        batch = ([], [], [])
+        for triple in ingest.map_chunk(rows[start:start + batch_rows], ingest.IngestStats()):
+            for records, record in zip(batch, triple):
+                if record is not None:
+                    records.append(record)
+        yield batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Segment log: append, replay and recovery')
+    parser.add_argument('--rows', type=int, default=100000, help='rows loaded before the live batches')
+    parser.add_argument('--batches', type=int, default=200, help='live batches persisted')
+    parser.add_argument('--batch-rows', type=int, default=50, help='rows per live batch')
+    parser.add_argument('--rewrites', type=int, default=3, help='full JSON rewrites timed (they are slow)')
+    args = parser.parse_args()
+
+    rows = list(synthetic_rows(args.rows + args.batches * args.batch_rows))
+    tables = new_tables()
+    for table, records in zip(tables, next(mapped_batches(rows[:args.rows], args.rows))):
+        ingest.extend_with_ids(table, records)
+    batches = list(mapped_batches(rows[args.rows:], args.batch_rows))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = segments.SegmentLog(os.path.join(tmp, 'log'))
+        log.recover(0, None)
+        started = time.perf_counter()
+        for i, batch in enumerate(batches):
+            for table, records in zip(tables, batch):
+                ingest.extend_with_ids(table, records)
+            log.append({'records': batch, 'follow': ['live.jsonl', i]})
+        appended = (time.perf_counter() - started) / len(batches)
+        log.close()
+        size = sum(os.path.getsize(log.path(number)) for number in log.segments())
+        print(f"{len(batches)} batches of {args.batch_rows} rows on top of {args.rows:,}: "
+              f"segment log {appended * 1000:.2f} ms/batch (tables, append and fsync; "
+              f"{size / len(batches) / 1024:.1f} KiB)")
+
+        started = time.perf_counter()
+        for _ in range(args.rewrites):
+            for name, table in zip(('threats', 'traffic', 'logins'), tables):
+                with open(os.path.join(tmp, name + '.json'), 'w') as f:
+                    json.dump(list(table), f, indent=2)
+        rewritten = (time.perf_counter() - started) / args.rewrites
+        print(f"full JSON rewrite: {rewritten * 1000:.0f} ms/batch ({rewritten / appended:.0f}x)")
+
+        replayed = new_tables()
+
+        def apply(frame):
+            for table, records in zip(replayed, frame['records']):
+                table.extend(records)
+
+        started = time.perf_counter()
+        segments.SegmentLog(os.path.join(tmp, 'log')).recover(0, apply)
+        elapsed = time.perf_counter() - started
+        print(f"replay: {elapsed * 1000:.0f} ms for {len(batches)} batches "
+              f"({sum(map(len, replayed)) / elapsed:,.0f} records/s)")
+        assert [len(table) for table in replayed] == [sum(len(batch[i]) for batch in batches) for i in range(3)]
+
+        # A crash half-way through writing the last frame
+        path = log.path(log.segments()[-1])
+        with open(path, 'rb') as f:
+            data = f.read()
+        last_start = list(segments.read_frames(data))[-2][0]
+        with open(path, 'r+b') as f:
+            f.truncate(last_start + (len(data) - last_start) // 2)
+        frames = []
+        recovered = segments.SegmentLog(os.path.join(tmp, 'log'))
+        recovered.recover(0, frames.append)
+        assert len(frames) == len(batches) - 1 and os.path.getsize(path) == last_start
+        recovered.append({'records': batches[-1], 'follow': ['live.jsonl', len(batches) - 1]})
+        recovered.close()
+        frames = []
+        segments.SegmentLog(os.path.join(tmp, 'log')).recover(0, frames.append)
+        assert len(frames) == len(batches)
+        print(f"recovery: torn frame cut off, {len(frames) - 1} complete batches kept, appending resumed")
+
+
+if __name__ == '__main__':
+    main()
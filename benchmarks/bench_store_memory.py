@@ -0,0 +1,70 @@
+# Memory benchmark: list-of-dicts datasets vs. the columnar store.
+#
+#   python benchmarks/bench_store_memory.py --rows 200000
+#
+# Records are produced by ingest.map_row from synthetic CSV rows, so they have
+# the same shape as a real ingest. Sizes are measured with tracemalloc.
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingest  # noqa: E402
+import store  # noqa: E402
+from synthetic import synthetic_rows  # noqa: E402
+
+
+def mapped_records(count):
+    for triple in ingest.map_rows(synthetic_rows(count), ingest.IngestStats()):
+        yield triple
+
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def build_lists(count):
+    lists = ([], [], [])
+    for triple in mapped_records(count):
+        for target, record in zip(lists, triple):
+            if record is not None:
+                target.append(record)
+    return lists
+
+
+def build_tables(count):
+    tables = (store.threat_table(), store.traffic_table(), store.login_table())
+    for triple in mapped_records(count):
+        for target, record in zip(tables, triple):
+            if record is not None:
+                target.append(record)
+    return tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description='List-of-dicts vs. columnar store memory benchmark')
+    parser.add_argument('--rows', type=int, default=100000, help='synthetic CSV rows to ingest')
+    args = parser.parse_args()
+
+    lists, list_bytes = measure(lambda: build_lists(args.rows))
+    counts = [len(records) for records in lists]
+    del lists
+    tables, table_bytes = measure(lambda: build_tables(args.rows))
+
+    print(f"{args.rows:,} CSV rows -> {counts[0]:,} threats, {counts[1]:,} traffic, {counts[2]:,} logins")
+    print(f"{'layout':<16}{'total MiB':>12}{'bytes/row':>12}")
+    for name, size in (('list of dicts', list_bytes), ('columnar store', table_bytes)):
+        print(f"{name:<16}{size / (1024 * 1024):>12.1f}{size / max(args.rows, 1):>12.0f}")
+    print(f"columnar store uses {table_bytes / list_bytes:.1%} of the list-of-dicts memory")
+    print(f"(store.Table.memory_bytes reports {sum(t.memory_bytes() for t in tables) / (1024 * 1024):.1f} MiB "
+          f"of column data)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# Threat aggregation benchmark: reduction, cost per row and heavy-hitter accuracy.
+#
+#   python benchmarks/bench_threat_aggregates.py --threats 1000000 --addresses 100000 --capacity 2000
+#
+# Appends --threats threats whose addresses are drawn from --addresses
+# addresses with Zipf-like frequencies (and one of three types), first with
+# an aggregation large enough to be exact, then with one limited to
+# --capacity entries (Space-Saving). Reports the entries kept against the
+# rows stored, the cost per row on top of the append and the memory per
+# entry, and checks the bounded summary against the exact counts: every
+# reported count is within its error bound, and the top --top entries are the
+# true heaviest ones.
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aggregate  # noqa: E402
+import store  # noqa: E402
+
+TYPES = ('Malicious', 'Suspicious', 'Botnet')
+SEVERITIES = ('Low', 'Medium', 'High')
+
+
+def threats(count, addresses, rng):
+    pool = [f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}' for i in range(addresses)]
+    weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(addresses)))
+    for i, ip in enumerate(rng.choices(pool, cum_weights=weights, k=count)):
+        yield {'id': str(i + 1), 'ipAddress': ip, 'type': TYPES[len(ip) % 3], 'severity': rng.choice(SEVERITIES),
+               'lastSeen': f'2023-{i % 12 + 1:02d}-{i % 28 + 1:02d} {i % 24:02d}:00:00', 'count': 1,
+               'description': rng.choice(('port scan', 'brute force', 'malware beacon', 'sql injection')),
+               'source': 'Firewall', 'location': {'lat': 0.0, 'lng': 0.0, 'country': 'India', 'city': 'Pune'}}
+
+
+def timed_fill(records, capacity):
+    table = store.Table(store.THREAT_SCHEMA, ['id'])
+    aggregates = None
+    if capacity:
+        aggregates = table.attach(aggregate.ThreatAggregates(table, capacity))
+    started = time.perf_counter()
+    table.extend(records)
+    return time.perf_counter() - started, table, aggregates
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Threat aggregation: reduction and heavy hitters')
+    parser.add_argument('--threats', type=int, default=1000000, help='threat rows appended')
+    parser.add_argument('--addresses', type=int, default=100000, help='distinct addresses')
+    parser.add_argument('--capacity', type=int, default=2000, help='entries of the bounded summary')
+    parser.add_argument('--top', type=int, default=100, help='heaviest entries checked')
+    args = parser.parse_args()
+
+    records = list(threats(args.threats, args.addresses, random.Random(42)))
+    plain = min(timed_fill(records, 0)[0] for _ in range(2))
+    exact_time, table, exact = timed_fill(records, args.threats)
+    _, _, bounded = timed_fill(records, args.capacity)
+
+    entries = len(exact.keys)
+    print(f"{args.threats:,} threat rows -> {entries:,} (address, type) entries ({args.threats / entries:.0f}x fewer); "
+          f"{(exact_time - plain) / args.threats * 1e6:.2f} us/row on top of the append")
+    started = time.perf_counter()
+    rebuilt = aggregate.ThreatAggregates(table, args.threats)
+    for row in range(len(table)):
+        rebuilt.add(row)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    rebuilt = aggregate.ThreatAggregates(table, args.threats)
+    for row in range(len(table)):
+        rebuilt.add(row)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"exact summary: {memory / entries:.0f} bytes/entry, rebuilt from the table in {elapsed:.2f} s")
+
+    true_counts = {exact.keys[slot]: exact.counts[slot] for slot in range(entries)}
+    for slot, key in enumerate(bounded.keys):
+        count, error = bounded.counts[slot], bounded.errors[slot]
+        assert count - error <= true_counts[key] <= count, key
+    heaviest = sorted(true_counts, key=true_counts.get, reverse=True)[:args.top]
+    reported = sorted(range(len(bounded.keys)), key=bounded.counts.__getitem__, reverse=True)[:args.top]
+    recall = len(set(heaviest) & {bounded.keys[slot] for slot in reported}) / len(heaviest)
+    guaranteed = sum(1 for count in true_counts.values() if count > args.threats / args.capacity)
+    print(f"bounded summary of {args.capacity:,} entries: {bounded.evictions:,} evictions, "
+          f"top {args.top} recall {recall:.0%}, every count within its error bound; "
+          f"{guaranteed:,} entries above rows/capacity are guaranteed to be kept")
+    assert all(key in bounded.slots for key, count in true_counts.items() if count > args.threats / args.capacity)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# Lookup latency of /api/threat/<id> and the by-IP index as the dataset grows.
+#
+#   python benchmarks/bench_threat_lookup.py --max-rows 10000000
+#
+# One threat table is grown step by step (10, 1k, 100k, ...) and at each size
+# random ids / IPs are looked up through the indexes. The linear scan that
+# get_threat_details used before the indexes is timed as a baseline up to
+# --scan-limit rows.
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import store  # noqa: E402
+
+
+def synthetic_threat(i, rng):
+    return {
+        'id': str(i + 1),
+        'ipAddress': f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+        'type': rng.choice(['Malicious', 'Scanning', 'Data Exfiltration', 'Suspicious']),
+        'severity': rng.choice(['Low', 'Medium', 'High']),
+        'lastSeen': '2023-05-30 06:33:58',
+        'count': rng.randint(1, 200),
+        'description': 'synthetic threat',
+        'source': 'Server',
+        'location': {'lat': 22.8046, 'lng': 86.2029, 'country': 'India', 'city': 'Jamshedpur'},
+    }
+
+
+def linear_scan(table, threat_id):
+    for i in range(len(table)):
+        if table.value(i, 'id') == threat_id:
+            return i
+    return None
+
+
+def time_per_call(func, args_list):
+    started = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - started) / len(args_list) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Indexed threat lookup latency benchmark')
+    parser.add_argument('--max-rows', type=int, default=1000000, help='largest table size (e.g. 10000000)')
+    parser.add_argument('--lookups', type=int, default=2000, help='lookups timed per size')
+    parser.add_argument('--scan-limit', type=int, default=100000, help='largest size for the linear-scan baseline')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    table = store.threat_table()
+    sizes = [10]
+    while sizes[-1] * 10 <= args.max_rows:
+        sizes.append(sizes[-1] * 10)
+
+    print(f"{'threats':>12}{'by id (us)':>14}{'by ip (us)':>14}{'scan (us)':>14}")
+    for size in sizes:
+        for i in range(len(table), size):
+            table.append(synthetic_threat(i, rng))
+
+        ids = [(str(rng.randint(1, size)),) for _ in range(args.lookups)]
+        ips = [('ipAddress', table.value(rng.randrange(size), 'ipAddress')) for _ in range(args.lookups)]
+        by_id = time_per_call(table.find_id, ids)
+        by_ip = time_per_call(table.positions, ips)
+        scan = '-'
+        if size <= args.scan_limit:
+            scan_ids = [(table, threat_id) for (threat_id,) in ids[:max(1, min(args.lookups, 2000000 // size))]]
+            scan = f"{time_per_call(linear_scan, scan_ids):.2f}"
+        print(f"{size:>12,}{by_id:>14.2f}{by_ip:>14.2f}{scan:>14}")
+
+
+if __name__ == '__main__':
+    main()
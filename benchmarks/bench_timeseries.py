@@ -0,0 +1,112 @@
+# Traffic time-series benchmark: scanning the records vs. the rollups.
+#
+#   python benchmarks/bench_timeseries.py --rows 1000000 --days 180
+#
+# Fills a traffic table with --rows records spread over --days days, builds the
+# rollups incrementally as the app does and answers typical chart queries (the
+# whole range, a month hourly, a day per minute) twice: the way the list
+# endpoints could before - the rows of the range from the sorted index of the
+# timestamp strings, each timestamp parsed and added to its bucket - and with
+# TrafficRollups.series. The totals of both are checked against each other.
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import query  # noqa: E402
+import store  # noqa: E402
+import timeseries  # noqa: E402
+
+START = 1672531200  # 2023-01-01 00:00:00 UTC
+
+
+def traffic_table(rows, days, rng):
+    table = store.traffic_table()
+    for i in range(rows):
+        epoch = START + rng.randrange(days * 86400)
+        table.append({
+            'id': str(i + 1),
+            'timestamp': datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+            'sourceIP': f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}', 'destinationIP': '192.168.1.10',
+            'protocol': rng.choice(['TCP', 'UDP', 'ICMP']), 'port': rng.randrange(1, 65536),
+            'bytesTransferred': rng.randrange(64, 1500 * 50), 'packetsTransferred': rng.randrange(1, 50),
+            'duration': 1.0, 'status': rng.choice(['Allowed', 'Blocked', 'Flagged']),
+        })
+    return table
+
+
+# Count and bytes per step between since and until, from the records
+def scan_series(table, index, since, until, step):
+    timestamps = table.columns['timestamp']
+    nbytes = table.columns['bytesTransferred']
+    lo = datetime.fromtimestamp(since, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    hi = datetime.fromtimestamp(until, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    buckets = {}
+    for row in index.between(lo, hi):
+        epoch = store.epoch_seconds(timestamps.get(row))
+        bucket = buckets.setdefault(epoch - epoch % step, [0, 0])
+        bucket[0] += 1
+        bucket[1] += nbytes.get(row)
+    return buckets
+
+
+def best_of(repeat, run):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+# Bytes of the arrays of a snapshot state (written as snapshot buffers)
+def array_bytes(state):
+    return sum(len(value) * value.itemsize for value in state.values() if hasattr(value, 'itemsize'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Traffic time series: record scan vs. rollups')
+    parser.add_argument('--rows', type=int, default=1000000, help='traffic records')
+    parser.add_argument('--days', type=int, default=180, help='days the records are spread over')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per query (best is kept)')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    started = time.perf_counter()
+    table = traffic_table(args.rows, args.days, rng)
+    print(f"{args.rows:,} traffic records over {args.days} days appended in {time.perf_counter() - started:.1f} s")
+
+    started = time.perf_counter()
+    rollups = table.attach(timeseries.TrafficRollups(table))
+    built = time.perf_counter() - started
+    sizes = ', '.join(f'{name} {len(rollup):,}' for name, rollup in rollups.rollups.items())
+    print(f"Rollups built in {built:.2f} s ({built / args.rows * 1e6:.1f} us/record): {sizes} buckets; "
+          f"state {sum(map(array_bytes, rollups.state()['rollups'].values())) / 2 ** 20:,.1f} MiB")
+    index = table.sorted_index('timestamp', query.sort_key(table, 'timestamp', 'timestamp'))
+    index.order
+
+    end = START + args.days * 86400 - 1
+    queries = [
+        ('whole range, auto step', START, end, None),
+        ('30 days hourly', START + 86400 * 30, START + 86400 * 60 - 1, 3600),
+        ('1 day per minute', START + 86400 * 45, START + 86400 * 46 - 1, 60),
+        ('whole range daily', START, end, 86400),
+    ]
+    print(f"{'query':<24}{'step':>7}{'buckets':>9}{'scan ms':>10}{'rollup ms':>11}{'speedup':>9}")
+    for name, since, until, step in queries:
+        rollup_time, result = best_of(args.repeat, lambda: rollups.series(since, until, step))
+        step = result['step']
+        scan_time, scanned = best_of(args.repeat, lambda: scan_series(table, index, since, until, step))
+        assert sum(count for count, _ in scanned.values()) == result['total']['count'], name
+        assert sum(nbytes for _, nbytes in scanned.values()) == result['total']['bytesTransferred'], name
+        print(f"{name:<24}{step:>7}{len(result['time']):>9,}{scan_time * 1000:>10.1f}{rollup_time * 1000:>11.2f}"
+              f"{scan_time / rollup_time:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
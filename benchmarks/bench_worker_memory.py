@@ -0,0 +1,104 @@
+# Per-worker memory with heap-built datasets vs. the shared snapshot mapping.
+#
+#   python benchmarks/bench_worker_memory.py --rows 200000 --workers 4
+#
+# Starts --workers independent Python processes (like the workers of a WSGI
+# server) that each either build the tables from the CSV in their own heap or
+# memory-map the snapshot, then touch every row of every column, and reports
+# their private and proportional set sizes from /proc/<pid>/smaps_rollup
+# (Linux only). With the snapshot the private memory stays flat as --rows
+# grows; the mapped pages are counted once across all workers.
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import snapshot  # noqa: E402
+import store  # noqa: E402
+from ingest import process_cybersecurity_data  # noqa: E402
+from synthetic import write_csv  # noqa: E402
+
+
+def memory_kib():
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0), fields.get('Pss', 0)
+
+
+def quiet_ingest(csv_path):
+    tables = (store.threat_table(), store.traffic_table(), store.login_table())
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            process_cybersecurity_data(csv_path, targets=tables)
+        finally:
+            sys.stdout = stdout
+    return tables
+
+
+# Read every value of every column, as serving the full datasets would
+def touch(tables):
+    total = 0
+    for table in tables:
+        for column in table.columns.values():
+            for i in range(len(column)):
+                total += column.get(i) is not None
+    return total
+
+
+def worker(mode, csv_path, snapshot_path):
+    before, _ = memory_kib()
+    if mode == 'heap':
+        tables = quiet_ingest(csv_path)
+    else:
+        tables = snapshot.load(snapshot_path, [csv_path]).datasets()
+    touch(tables)
+    private, pss = memory_kib()
+    print(private - before, pss, flush=True)
+    # Stay alive until every worker has reported
+    sys.stdin.readline()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-worker memory: heap tables vs. shared snapshot')
+    parser.add_argument('--rows', type=int, default=100000, help='synthetic CSV rows')
+    parser.add_argument('--workers', type=int, default=4, help='worker processes to start')
+    parser.add_argument('--worker', nargs=3, metavar=('MODE', 'CSV', 'SNAPSHOT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(*args.worker)
+        return
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        sys.exit('this benchmark reads /proc/self/smaps_rollup and only runs on Linux')
+
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = write_csv(os.path.join(workdir, 'attacks.csv'), args.rows)
+        snapshot_path = os.path.join(workdir, 'snapshot.bin')
+        snapshot.build(snapshot_path, quiet_ingest(csv_path), [csv_path])
+
+        print(f"{args.rows:,} CSV rows, {args.workers} workers, "
+              f"snapshot {os.path.getsize(snapshot_path) / (1024 * 1024):.1f} MiB")
+        print(f"{'datasets':<12}{'private MiB/worker':>20}{'PSS MiB/worker':>16}")
+        for mode in ('heap', 'snapshot'):
+            procs = [subprocess.Popen([sys.executable, __file__, '--worker', mode, csv_path, snapshot_path],
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+                     for _ in range(args.workers)]
+            # No worker exits before all have loaded, so the proportional set
+            # sizes reflect the pages they share
+            results = [proc.stdout.readline().split() for proc in procs]
+            for proc in procs:
+                proc.communicate('\n')
+            private = sum(int(r[0]) for r in results) / len(results) / 1024
+            pss = sum(int(r[1]) for r in results) / len(results) / 1024
+            print(f"{mode:<12}{private:>20.1f}{pss:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
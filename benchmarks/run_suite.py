@@ -0,0 +1,270 @@
+# Pipeline benchmark suite: generation, ingest, start-up and endpoint latency,
+# saved as JSON so that versions can be compared.
+#
+#   python benchmarks/run_suite.py --rows 1000000 --output before.json
+#   python benchmarks/run_suite.py --rows 1000000 --output after.json --compare before.json
+#
+# A synthetic CSV of --rows rows (benchmarks/synthetic.py, --seed) is written
+# to a temporary directory, then every stage runs in a child process of its
+# own, so its peak RSS is its own:
+#   ingest      the CSV parsed into the three tables (rows/s, peak RSS)
+#   coldStart   importing the app with an empty data directory: CSV ingest,
+#               observers, snapshot and JSON exports (seconds, peak RSS)
+#   warmStart   importing it again: the snapshot is memory-mapped (seconds,
+#               peak RSS), then every path of ENDPOINTS is requested through
+#               the Flask test client, --requests times with the response
+#               cache cleared before each request and --requests times cached
+#               (p50/p95 ms)
+#
+# The JSON holds the environment (commit, Python, CPUs, rows, seed) and a flat
+# "metrics" object. With --compare, the metrics are checked against an earlier
+# result: one worse by more than --threshold (a fraction) is reported, and
+# the exit status is 1 if there is any. Rates (names ending in PerSecond) are
+# better higher, the rest lower; latencies within NOISE_MS of each other are
+# not compared. Compare results of the same --rows on the same machine.
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import pool_address, write_csv  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Paths timed on the warm-started app; {busy_ip} is the busiest synthetic
+# source address (entry 0 of the attackers pool)
+ENDPOINTS = [
+    '/api/threats?limit=100',
+    '/api/threats?limit=100&sort=-severity',
+    '/api/traffic?limit=100&sort=-timestamp',
+    '/api/login-attempts?limit=100&status=Failed',
+    '/api/threat/1',
+    '/api/threats/by-ip/{busy_ip}',
+    '/api/threats/by-severity/High?limit=100',
+    '/api/threats/aggregated?limit=100',
+    '/api/ip/{busy_ip}/profile?limit=100',
+    '/api/stats',
+    '/api/traffic/timeseries?step=1d',
+    '/api/threats/clusters?bbox=68,6,98,37&zoom=5',
+    '/api/ip-ranges?cidr=0.0.0.0/1',
+    '/api/search?q=login',
+    '/api/search?q="failed password"',
+    '/api/detections?limit=100',
+]
+
+# Latency differences below this many milliseconds are noise
+NOISE_MS = 0.05
+
+
+def peak_rss_mib():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def quietly(function, *args):
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            return function(*args)
+        finally:
+            sys.stdout = stdout
+
+
+# Child process bodies; each returns its metrics
+
+def stage_ingest(args):
+    import ingest
+    import store
+
+    tables = (store.threat_table(), store.traffic_table(), store.login_table())
+    started = time.perf_counter()
+    quietly(ingest.process_cybersecurity_data, args.csv, ingest.DEFAULT_CHUNK_ROWS, None, args.workers, tables)
+    elapsed = time.perf_counter() - started
+    return {
+        'ingest.seconds': elapsed,
+        'ingest.rowsPerSecond': args.rows / elapsed,
+        'ingest.peakRssMiB': peak_rss_mib(),
+        'ingest.records': sum(map(len, tables)),
+    }
+
+
+def start_app():
+    started = time.perf_counter()
+    app = quietly(__import__, 'app')
+    return app, time.perf_counter() - started
+
+
+def stage_cold_start(args):
+    app, elapsed = start_app()
+    return {
+        'coldStart.seconds': elapsed,
+        'coldStart.peakRssMiB': peak_rss_mib(),
+        'coldStart.snapshotMiB': os.path.getsize(app.snapshot_file) / (1024 * 1024),
+    }
+
+
+def stage_warm_start(args):
+    app, elapsed = start_app()
+    assert app.data_source == 'snapshot', app.data_source
+    metrics = {'warmStart.seconds': elapsed, 'warmStart.peakRssMiB': peak_rss_mib()}
+    client = app.app.test_client()
+    for endpoint in ENDPOINTS:
+        path = endpoint.format(busy_ip=args.busy_ip)
+        uncached = []
+        for _ in range(args.requests):
+            app.response_cache.clear()
+            started = time.perf_counter()
+            response = client.get(path)
+            uncached.append(time.perf_counter() - started)
+            assert response.status_code == 200, (path, response.status_code)
+        cached = []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            client.get(path)
+            cached.append(time.perf_counter() - started)
+        for name, times in (('uncached', uncached), ('cached', cached)):
+            metrics[f'endpoint.{endpoint}.{name}.p50Ms'] = statistics.median(times) * 1000
+            metrics[f'endpoint.{endpoint}.{name}.p95Ms'] = percentile(times, 0.95) * 1000
+    return metrics
+
+
+STAGES = {'ingest': stage_ingest, 'coldStart': stage_cold_start, 'warmStart': stage_warm_start}
+
+
+# Run one stage in a child process and return its metrics
+def run_stage(stage, args, csv_path, data_dir):
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        result_path = f.name
+    env = dict(os.environ, CTI_CSV_PATH=csv_path, CTI_DATA_DIR=data_dir, CTI_INGEST_WORKERS=str(args.workers))
+    env.pop('CTI_FOLLOW_PATH', None)
+    try:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--stage', stage, '--result', result_path,
+                        '--csv', csv_path, '--rows', str(args.rows), '--workers', str(args.workers),
+                        '--requests', str(args.requests), '--busy-ip', args.busy_ip],
+                       cwd=ROOT, env=env, check=True)
+        with open(result_path) as f:
+            return json.load(f)
+    finally:
+        os.remove(result_path)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(args):
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'rows': args.rows,
+        'seed': args.seed,
+        'workers': args.workers,
+        'requests': args.requests,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+# (name, before, after) of every metric worse in current than in previous by
+# more than threshold
+def regressions(previous, current, threshold):
+    worse = []
+    for name, after in current.items():
+        before = previous.get(name)
+        if not before or name.endswith('.records'):
+            continue
+        if name.endswith('PerSecond'):
+            change = (before - after) / before
+        else:
+            if name.endswith('Ms') and after - before < NOISE_MS:
+                continue
+            change = (after - before) / before
+        if change > threshold:
+            worse.append((name, before, after))
+    return worse
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pipeline benchmark suite with JSON results')
+    parser.add_argument('--rows', type=int, default=100000, help='synthetic CSV rows')
+    parser.add_argument('--seed', type=int, default=42, help='synthetic data seed')
+    parser.add_argument('--workers', type=int, default=1, help='ingest worker processes')
+    parser.add_argument('--requests', type=int, default=30, help='requests timed per endpoint and cache state')
+    parser.add_argument('--output', default='bench_results.json', help='JSON file the results are written to')
+    parser.add_argument('--compare', help='earlier results to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative change counted as a regression')
+    parser.add_argument('--stage', choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    parser.add_argument('--csv', help=argparse.SUPPRESS)
+    parser.add_argument('--busy-ip', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        metrics = STAGES[args.stage](args)
+        with open(args.result, 'w') as f:
+            json.dump(metrics, f)
+        return
+
+    args.busy_ip = pool_address(0, args.seed)
+    metrics = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, 'attacks.csv')
+        started = time.perf_counter()
+        write_csv(csv_path, args.rows, args.seed)
+        elapsed = time.perf_counter() - started
+        metrics['generate.rowsPerSecond'] = args.rows / elapsed
+        print(f"{args.rows:,} rows generated in {elapsed:.1f} s "
+              f"({os.path.getsize(csv_path) / (1024 * 1024):.1f} MiB)")
+        data_dir = os.path.join(workdir, 'data')
+        os.makedirs(data_dir)
+        for stage in STAGES:
+            started = time.perf_counter()
+            metrics.update(run_stage(stage, args, csv_path, data_dir))
+            print(f"{stage} done in {time.perf_counter() - started:.1f} s")
+
+    print(f"ingest {metrics['ingest.rowsPerSecond']:,.0f} rows/s, peak {metrics['ingest.peakRssMiB']:.0f} MiB; "
+          f"cold start {metrics['coldStart.seconds']:.2f} s ({metrics['coldStart.peakRssMiB']:.0f} MiB); "
+          f"warm start {metrics['warmStart.seconds']:.2f} s ({metrics['warmStart.peakRssMiB']:.0f} MiB)")
+    print(f"{'endpoint':<52}{'p50 ms':>10}{'p95 ms':>10}{'cached p50':>12}")
+    for endpoint in ENDPOINTS:
+        prefix = f'endpoint.{endpoint}'
+        print(f"{endpoint:<52}{metrics[prefix + '.uncached.p50Ms']:>10.2f}"
+              f"{metrics[prefix + '.uncached.p95Ms']:>10.2f}{metrics[prefix + '.cached.p50Ms']:>12.2f}")
+
+    with open(args.output, 'w') as f:
+        json.dump({'environment': environment(args), 'metrics': metrics}, f, indent=2, sort_keys=True)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        if previous['environment'].get('rows') != args.rows:
+            print(f"Warning: {args.compare} was run with {previous['environment'].get('rows')} rows")
+        worse = regressions(previous['metrics'], metrics, args.threshold)
+        for name, before, after in worse:
+            print(f"REGRESSION {name}: {before:.4g} -> {after:.4g}")
+        print(f"{len(worse)} regressions against {args.compare} (threshold {args.threshold:.0%})")
+        sys.exit(1 if worse else 0)
+
+
+if __name__ == '__main__':
+    main()
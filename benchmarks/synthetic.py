@@ -0,0 +1,172 @@
+# Synthetic rows in the layout of the Kaggle cybersecurity_attacks.csv, shared
+# by the benchmarks. The same seed and row count always give the same rows.
+#
+#   python benchmarks/synthetic.py attacks.csv --rows 10000000 [--seed 42]
+#
+# Values repeat the way they do in real logs, and their cardinality grows
+# with the row count: source addresses, usernames, devices and payload words
+# are drawn from pools of about rows / 10, rows / 20, rows / 50 and 20,000
+# entries with Zipf-like frequencies, so a few attackers and users account
+# for many rows and most appear a handful of times. Timestamps advance over
+# SPAN_SECONDS with jitter (the order a log is written in), ports favour the
+# common services, and a few cities are missing from the gazetteer. Rows are
+# produced one at a time, so any count (10k to 100M) streams in constant
+# memory.
+import argparse
+import csv
+import itertools
+import random
+import sys
+import time
+
+FIELDS = ['Timestamp', 'Source IP Address', 'Destination IP Address', 'Destination Port', 'Protocol',
+          'Packet Length', 'Payload Data', 'Anomaly Scores', 'Attack Type', 'Action Taken', 'Severity Level',
+          'User Information', 'Device Information', 'Geo-location Data', 'Log Source']
+
+# "City, State" as in the Kaggle export; the last three are not in the gazetteer
+CITIES = ['Jamshedpur, Jharkhand', 'Bilaspur, Chhattisgarh', 'Eluru, Andhra Pradesh', 'Pune, Maharashtra',
+          'Bokaro, Jharkhand', 'Jaunpur, Uttar Pradesh', 'Anantapur, Andhra Pradesh', 'Aurangabad, Maharashtra',
+          'Phagwara, Punjab', 'Ambala, Haryana', 'Rampur, Uttar Pradesh', 'Gangtok, Sikkim',
+          'Silchar, Assam', 'Agartala, Tripura', 'Agra, Uttar Pradesh', 'Ahmedabad, Gujarat',
+          'Aizawl, Mizoram', 'Ajmer, Rajasthan', 'Akola, Maharashtra', 'Aligarh, Uttar Pradesh',
+          'Amritsar, Punjab', 'Asansol, West Bengal', 'Bareilly, Uttar Pradesh', 'Belgaum, Karnataka',
+          'Bangalore, Karnataka', 'Bhagalpur, Bihar', 'Bhilai, Chhattisgarh', 'Bhopal, Madhya Pradesh',
+          'Bhubaneswar, Odisha', 'Bikaner, Rajasthan', 'Chandigarh, Chandigarh', 'Chennai, Tamil Nadu',
+          'Coimbatore, Tamil Nadu', 'Cuttack, Odisha', 'Dehradun, Uttarakhand', 'Delhi, Delhi',
+          'Dhanbad, Jharkhand', 'Durgapur, West Bengal', 'Faridabad, Haryana', 'Gaya, Bihar',
+          'Ghaziabad, Uttar Pradesh', 'Gorakhpur, Uttar Pradesh', 'Gulbarga, Karnataka',
+          'Nowhereganj, Bihar', 'Kestrel Falls, Goa', 'Old Mirpur, Punjab']
+
+FIRST_NAMES = ('Aarav Aditi Akash Ananya Arjun Diya Farhan Gauri Harsh Ishaan Jiya Kabir Kavya Kiaan Lakshmi '
+               'Meera Mohit Neha Nikhil Pari Pranav Rhea Rohan Saanvi Samar Sana Shaurya Tara Uday Vanya '
+               'Veer Yash Zara Dhruv Fateh Himmat Sumer Ira Myra Reyansh').split()
+LAST_NAMES = ('Rana Karpe Kibe Dugal Sharma Verma Iyer Nair Reddy Gupta Mehta Shah Das Bose Kapoor Malhotra '
+              'Chopra Banerjee Chatterjee Mukherjee Pillai Menon Rao Naidu Joshi Kulkarni Patil Desai Jain '
+              'Agarwal Saxena Trivedi Pandey Mishra Tiwari Dubey Yadav Singh Kaur Gill').split()
+
+PLATFORMS = ['Windows NT 10.0; Win64; x64', 'Windows NT 6.1; WOW64', 'Macintosh; Intel Mac OS X 10_15_7',
+             'X11; Linux x86_64', 'X11; Ubuntu; Linux x86_64', 'iPhone; CPU iPhone OS 16_5 like Mac OS X',
+             'iPad; CPU OS 15_7 like Mac OS X', 'Linux; Android 13; SM-S911B', 'Linux; Android 12; Pixel 6',
+             'compatible; MSIE 10.0; Windows NT 6.2; Trident/6.0']
+ENGINES = [('AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{major}.0.{build}.{patch} Safari/537.36', 90),
+           ('Gecko/20100101 Firefox/{major}.0', 80),
+           ('AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{minor}.1 Safari/605.1.15', 12),
+           ('AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{major}.0.{build}.{patch} Edg/{major}.0.{patch}', 90)]
+
+# Payload words: pronounceable pseudo-words, the most frequent ones security terms
+TERMS = ('login access unusual authentication suspicious failed password admin root shell exploit injection '
+         'payload scan port brute force token session cookie request response denied granted malware beacon '
+         'command control exfiltration upload download credential phishing').split()
+SYLLABLES = ('ka ri to me su na lo pe vi da ne ro ti sa mu ke zo ba fi gu ha ja le mo ni pu ra se tu ve '
+             'wa yo').split()
+VOCABULARY = 20000
+
+PORTS = [80, 443, 22, 21, 25, 53, 110, 143, 3389, 3306, 5432, 8080, 8443, 445, 23]
+
+# Time covered by the rows, from START
+START = 1672531200  # 2023-01-01 00:00:00 UTC
+SPAN_SECONDS = 365 * 86400
+
+
+# Index into a pool of size entries, small indexes far more often (P(i) ~ 1/(i+1))
+def zipf_index(rng, size):
+    return int(size ** rng.random()) - 1
+
+
+# Address number i of a pool: a fixed scramble of (i, salt) into public-looking IPv4
+def pool_address(i, salt):
+    value = (i * 0x9E3779B1 + salt) & 0xFFFFFFFF
+    first = value % 222 + 1
+    first += first >= 127  # not loopback
+    return f'{first}.{value >> 16 & 255}.{value >> 8 & 255}.{(i * 7 + salt) % 254 + 1}'
+
+
+def username(i):
+    first = FIRST_NAMES[i % len(FIRST_NAMES)]
+    last = LAST_NAMES[i // len(FIRST_NAMES) % len(LAST_NAMES)]
+    suffix = i // (len(FIRST_NAMES) * len(LAST_NAMES))
+    return f'{first} {last}' + (f' {suffix}' if suffix else '')
+
+
+def device(i):
+    platform = PLATFORMS[i % len(PLATFORMS)]
+    template, newest = ENGINES[i // len(PLATFORMS) % len(ENGINES)]
+    version = i // (len(PLATFORMS) * len(ENGINES))
+    engine = template.format(major=newest + 30 - version % 30, minor=10 + version % 7,
+                             build=4000 + version // 30 % 2000, patch=version // 60000 % 200)
+    return f'Mozilla/5.0 ({platform}) {engine}'
+
+
+def word(i):
+    if i < len(TERMS):
+        return TERMS[i]
+    letters = []
+    i -= len(TERMS)
+    while True:
+        letters.append(SYLLABLES[i % len(SYLLABLES)])
+        i //= len(SYLLABLES)
+        if not i:
+            return ''.join(letters)
+
+
+def synthetic_rows(count, seed=42):
+    rng = random.Random(seed)
+    attackers = max(50, count // 10)
+    targets = max(20, count // 200)
+    users = max(40, count // 20)
+    devices = max(40, count // 50)
+    step = SPAN_SECONDS / max(count, 1)
+    words = [word(i) for i in range(VOCABULARY)]
+    word_weights = list(itertools.accumulate(1.0 / (i + 1) for i in range(VOCABULARY)))
+    for i in range(count):
+        moment = START + int(i * step) + rng.randint(-120, 120)
+        # One source in five is seen only once
+        source = (pool_address(zipf_index(rng, attackers), seed) if rng.random() < 0.8
+                  else pool_address(attackers + i, seed))
+        yield {
+            'Timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(moment)),
+            'Source IP Address': source,
+            'Destination IP Address': pool_address(zipf_index(rng, targets), seed + 1),
+            'Destination Port': str(PORTS[zipf_index(rng, len(PORTS))] if rng.random() < 0.7
+                                    else rng.randint(1024, 65535)),
+            'Protocol': rng.choices(('TCP', 'UDP', 'ICMP'), (70, 25, 5))[0],
+            'Packet Length': str(rng.randint(64, 1500)),
+            'Payload Data': ' '.join(rng.choices(words, cum_weights=word_weights, k=rng.randint(8, 40))),
+            'Anomaly Scores': f"{rng.betavariate(2, 3) * 100:.2f}",
+            'Attack Type': rng.choice(('Malware', 'DDoS', 'Intrusion')),
+            'Action Taken': rng.choice(('Blocked', 'Logged', 'Ignored')),
+            'Severity Level': rng.choice(('Low', 'Medium', 'High')),
+            'User Information': username(zipf_index(rng, users)),
+            'Device Information': device(zipf_index(rng, devices)),
+            'Geo-location Data': CITIES[zipf_index(rng, len(CITIES))],
+            'Log Source': rng.choice(('Server', 'Firewall')),
+        }
+
+
+# Write count synthetic rows to a CSV file at path
+def write_csv(path, count, seed=42, progress=None):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for i, row in enumerate(synthetic_rows(count, seed), 1):
+            writer.writerow(row.values())
+            if progress is not None and i % 1000000 == 0:
+                progress(i)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic attack-log CSV')
+    parser.add_argument('path', help='CSV file to write')
+    parser.add_argument('--rows', type=int, default=100000, help='rows to write')
+    parser.add_argument('--seed', type=int, default=42, help='random seed (same seed and rows, same file)')
+    args = parser.parse_args()
+    started = time.perf_counter()
+    write_csv(args.path, args.rows, args.seed,
+              lambda done: print(f"{done:,} rows, {done / (time.perf_counter() - started):,.0f} rows/s",
+                                 file=sys.stderr))
+    print(f"Wrote {args.rows:,} rows to {args.path} in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+import argparse
+import base64
+import bisect
+import csv
+import json
+import math
+import socket
+import sys
+import urllib.request
+from array import array
+
+import query
+
+# Bulk matching of address lists (firewall logs, threat-intel feeds) against
+# the threat table.
+#
+#   POST /api/threats/match                      (body: addresses, one per line)
+#   python bulkmatch.py ips.txt --url http://localhost:5000 [--bloom]
+#
+# ThreatMatcher keeps a hash table from packed addresses (the 4 or 16 bytes
+# socket.inet_pton gives) to threat rows, attached to the threat table so
+# appended threats match as soon as they arrive. An input address costs one
+# inet_pton and one dict probe, whatever the spelling ('2001:DB8::1' and
+# '2001:db8::1' pack the same). CIDR blocks, address ranges and named blocks in
+# the input are answered from the sorted ipAddress index like ?cidr= is.
+#
+# The IPv4 threats are also saved in the snapshot: their distinct 32-bit
+# values in ascending order, where each one's rows start in the ipAddress
+# index's sorted order, and that part of the order. A matcher restored from
+# that state looks them up by binary search (bisect, in C) over the
+# memory-mapped values instead of rebuilding the hash table from every row on
+# start; only the rows appended since, and the IPv6 ones, go to the dict.
+#
+# The server can also hand out a Bloom filter of the packed threat addresses
+# (GET /api/threats/match/bloom). The CLI uses it to drop the addresses that
+# cannot match before uploading, so a large list costs a few hundred kilobytes
+# of traffic instead of megabytes. On the server itself a dict probe is
+# already as cheap as one Bloom probe, so matching there does not use it.
+
+# Bytes of the request body matched at a time
+READ_CHUNK = 1 << 20
+
+# Input tokens quoted in the summary when they are not addresses
+MAX_INVALID_EXAMPLES = 10
+
+# False-positive rate of the Bloom filters handed out
+BLOOM_ERROR_RATE = 0.01
+
+MASK64 = (1 << 64) - 1
+
+
+# Whitespace-separated tokens of a binary stream (anything with read(size)),
+# as lists of strings, one list per chunk read
+def read_tokens(stream, chunk_size=READ_CHUNK):
+    tail = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        chunk = tail + chunk
+        # A token may continue in the next chunk
+        cut = max(chunk.rfind(b'\n'), chunk.rfind(b' '), chunk.rfind(b'\t'))
+        if cut < 0:
+            tail = chunk
+            continue
+        tail = chunk[cut + 1:]
+        yield chunk[:cut].decode('latin-1').split()
+    if tail.strip():
+        yield tail.decode('latin-1').split()
+
+
+# Matches of one bulk request: (query, row) pairs in input order plus counts
+class MatchResult:
+    def __init__(self, table):
+        self.table = table
+        self.matches = []
+        self.checked = 0
+        self.matched = 0
+        self.invalid = 0
+        self.invalid_examples = []
+
+    def __len__(self):
+        return len(self.matches)
+
+    def records(self):
+        columns = self.table.columns
+        ids, addresses = columns['id'], columns['ipAddress']
+        severities, types = columns['severity'], columns['type']
+        for token, row in self.matches:
+            yield {'query': token, 'id': ids.get(row), 'ipAddress': addresses.get(row),
+                   'severity': severities.get(row), 'type': types.get(row)}
+
+    def summary(self):
+        return {'checked': self.checked, 'matched': self.matched, 'matches': len(self.matches),
+                'invalid': self.invalid, 'invalidExamples': self.invalid_examples}
+
+
+# Hash table of the threat addresses; attach it to the table (table.attach)
+# with replay_from=matcher.total so it is filled with the rows it does not
+# hold yet and kept up to date. state is a previous state(), e.g. from a
+# snapshot of the same table.
+class ThreatMatcher:
+    def __init__(self, table, field='ipAddress', state=None):
+        self.table = table
+        self.field = field
+        self.column = table.columns[field]
+        # packed address -> row, or list of rows when several threats share it
+        self.rows = {}
+        # Restored distinct IPv4 values in ascending order; value i is held
+        # by value_rows[starts[i]:starts[i + 1]]
+        self.values = array('I')
+        self.starts = array('I', [0])
+        self.value_rows = array('I')
+        self.total = 0
+        if state is not None:
+            self.values = state['values']
+            self.starts = state['starts']
+            self.value_rows = state['rows']
+            for row in state['wideRows']:
+                self.add(row)
+            self.total = state['total']
+
+    def add(self, row):
+        self.total += 1
+        packed = self.column.address_bytes(row)
+        if packed is None:
+            return
+        existing = self.rows.get(packed)
+        if existing is None:
+            self.rows[packed] = row
+        elif existing.__class__ is int:
+            self.rows[packed] = [existing, row]
+        else:
+            existing.append(row)
+
+    # Snapshot state: the IPv4 rows in (value, row) order, taken from the
+    # sorted index, with their distinct values, and the rows of the other
+    # (IPv6) addresses
+    def state(self):
+        column = self.column
+        kinds, slots = column.kinds, column.slots
+        order = self.table.sorted_index(self.field, column.sort_key).order
+        rows = array('I', (row for row in order if kinds[row] == column.IPV4))
+        values, starts = array('I'), array('I')
+        previous = None
+        for position, row in enumerate(rows):
+            value = slots[row]
+            if value != previous:
+                values.append(value)
+                starts.append(position)
+                previous = value
+        starts.append(len(rows))
+        return {'total': self.total, 'values': values, 'starts': starts, 'rows': rows,
+                'wideRows': array('I', (row for row in order if kinds[row] == column.IPV6))}
+
+    # Match a list of tokens (addresses, CIDR blocks, ranges), adding to result
+    def match_tokens(self, tokens, result):
+        get = self.rows.get
+        values, starts, value_rows = self.values, self.starts, self.value_rows
+        stored = len(values)
+        bisect_left = bisect.bisect_left
+        from_bytes = int.from_bytes
+        pton = socket.inet_pton
+        af_inet = socket.AF_INET
+        matches = result.matches
+        matched = 0
+        for token in tokens:
+            try:
+                packed = pton(af_inet, token)
+            except OSError:
+                rows = self._match_other(token, result)
+            else:
+                rows = get(packed)
+                if stored:
+                    value = from_bytes(packed, 'big')
+                    i = bisect_left(values, value)
+                    if i < stored and values[i] == value:
+                        earlier = list(value_rows[starts[i]:starts[i + 1]])
+                        rows = earlier + ([] if rows is None else [rows] if rows.__class__ is int else rows)
+            if rows is None:
+                continue
+            matched += 1
+            if rows.__class__ is int:
+                matches.append((token, rows))
+            else:
+                matches.extend((token, row) for row in rows)
+        result.checked += len(tokens)
+        result.matched += matched
+
+    # Tokens that are not IPv4 addresses: IPv6 addresses, blocks and ranges.
+    # Returns the matching rows or None.
+    def _match_other(self, token, result):
+        try:
+            return self.rows.get(socket.inet_pton(socket.AF_INET6, token))
+        except OSError:
+            pass
+        try:
+            ranges = query.parse_ip_ranges(token)
+        except query.QueryError:
+            result.invalid += 1
+            if len(result.invalid_examples) < MAX_INVALID_EXAMPLES:
+                result.invalid_examples.append(token[:100])
+            return None
+        rows = query.IPRangeFilter(self.table, self.field, query.sort_key(self.table, self.field), ranges).rows()
+        return list(rows) or None
+
+    # Match every token read from a binary stream
+    def match_stream(self, stream, chunk_size=READ_CHUNK):
+        result = MatchResult(self.table)
+        for tokens in read_tokens(stream, chunk_size):
+            self.match_tokens(tokens, result)
+        return result
+
+    def bloom(self, error_rate=BLOOM_ERROR_RATE):
+        stored = {value.to_bytes(4, 'big') for value in self.values}
+        stored.update(list(self.rows))
+        bloom = BloomFilter.for_capacity(len(stored), error_rate)
+        for packed in stored:
+            bloom.add(packed)
+        return bloom
+
+
+# Bit positions of a packed address: double hashing (h1 + i * h2) over a
+# splitmix64 mix of its value. Stable across processes, unlike hash().
+def bloom_hashes(packed):
+    value = int.from_bytes(packed, 'big')
+    z = ((value >> 64) ^ value ^ (len(packed) << 56)) & MASK64
+    z = (z + 0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    z ^= z >> 31
+    return z & 0xFFFFFFFF, (z >> 32) | 1
+
+
+# Bloom filter over packed addresses
+class BloomFilter:
+    def __init__(self, bits, hashes, data=None):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray((bits + 7) // 8) if data is None else bytearray(data)
+
+    # Smallest filter holding capacity addresses at the given false-positive rate
+    @classmethod
+    def for_capacity(cls, capacity, error_rate=BLOOM_ERROR_RATE):
+        capacity = max(capacity, 1)
+        bits = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        return cls(bits, max(1, round(bits / capacity * math.log(2))))
+
+    def add(self, packed):
+        h1, h2 = bloom_hashes(packed)
+        data, bits = self.data, self.bits
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % bits
+            data[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, packed):
+        h1, h2 = bloom_hashes(packed)
+        data, bits = self.data, self.bits
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % bits
+            if not data[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def to_dict(self):
+        return {'bits': self.bits, 'hashes': self.hashes, 'filter': base64.b64encode(self.data).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['bits'], data['hashes'], base64.b64decode(data['filter']))
+
+
+# Packed form of a single address token, None for blocks, ranges and junk
+def pack_address(token):
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            return socket.inet_pton(family, token)
+        except OSError:
+            pass
+    return None
+
+
+# Tokens that may match: everything except addresses the Bloom filter rules out
+def prefilter(tokens, bloom):
+    kept = []
+    for token in tokens:
+        packed = pack_address(token)
+        if packed is None or packed in bloom:
+            kept.append(token)
+    return kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check a list of IP addresses / CIDR blocks against known threats')
+    parser.add_argument('path', help="file with whitespace-separated addresses, blocks or ranges ('-' for stdin)")
+    parser.add_argument('--url', default='http://localhost:5000', help='dashboard server')
+    parser.add_argument('--bloom', action='store_true',
+                        help="fetch the server's Bloom filter and only upload addresses that may match")
+    parser.add_argument('--json', action='store_true', help='print the response JSON instead of CSV')
+    args = parser.parse_args()
+
+    stream = sys.stdin.buffer if args.path == '-' else open(args.path, 'rb')
+    with stream:
+        tokens = [token for chunk in read_tokens(stream) for token in chunk]
+    sent = tokens
+    if args.bloom:
+        with urllib.request.urlopen(args.url.rstrip('/') + '/api/threats/match/bloom') as response:
+            bloom = BloomFilter.from_dict(json.load(response))
+        sent = prefilter(tokens, bloom)
+        print(f"Bloom filter kept {len(sent):,} of {len(tokens):,} entries", file=sys.stderr)
+
+    request = urllib.request.Request(args.url.rstrip('/') + '/api/threats/match',
+                                     data='\n'.join(sent).encode('latin-1'),
+                                     headers={'Content-Type': 'text/plain'}, method='POST')
+    with urllib.request.urlopen(request) as response:
+        result = json.load(response)
+    result['summary']['checked'] = len(tokens)
+
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    else:
+        writer = csv.writer(sys.stdout, lineterminator='\n')
+        writer.writerow(['query', 'id', 'ipAddress', 'severity', 'type'])
+        for match in result['matches']:
+            writer.writerow([match['query'], match['id'], match['ipAddress'], match['severity'], match['type']])
+    summary = result['summary']
+    print(f"{summary['checked']:,} entries checked, {summary['matched']:,} matched "
+          f"({summary['matches']:,} threat records), {summary['invalid']:,} invalid", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+import functools
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip variants are kept without it
+    brotli = None
+
+# Cache of serialized JSON API responses.
+#
+# Bodies are keyed by the request (path and query parameters) and the version
+# of the tables the response was computed from, so a cached body is never
+# served after its data changed. Each body has a strong ETag (a hash of the
+# body); a request whose If-None-Match matches gets an empty 304. Compressed
+# variants (gzip, and brotli when the module is installed) are produced the
+# first time a client accepts them and kept with the body. The cache is bounded
+# by the total size of the bodies and variants and evicts least recently used
+# entries first.
+#
+# A streamed response (a large list) is still streamed the first time; its
+# chunks are kept as they are sent and become an entry like any other once the
+# last one went out, unless the tables changed meanwhile or it does not fit.
+
+DEFAULT_MAX_BYTES = 64 << 20
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+ENCODINGS = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def compress(body, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(body, GZIP_LEVEL)
+    return brotli.compress(body, quality=BROTLI_QUALITY)
+
+
+# One cached response: status, body, ETag and the compressed variants made so far
+class Entry:
+    def __init__(self, status, body, mimetype):
+        self.status = status
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.variants = {'identity': body}
+
+    @property
+    def size(self):
+        return sum(len(body) for body in self.variants.values())
+
+    # ETag of the representation sent with the given content coding
+    def etag_for(self, encoding):
+        return self.etag if encoding == 'identity' else f'{self.etag}-{encoding}'
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.compressions = 0
+        self.served = {'identity': 0, 'gzip': 0, 'br': 0}
+
+    def _get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def _put(self, key, entry):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
+            if entry.size > self.max_bytes:
+                return
+            self.entries[key] = entry
+            self.bytes += entry.size
+            self._evict()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self.entries:
+            _, entry = self.entries.popitem(last=False)
+            self.bytes -= entry.size
+            self.evictions += 1
+
+    # Compressed body of entry, made (and accounted for) on first use
+    def _variant(self, key, entry, encoding):
+        body = entry.variants.get(encoding)
+        if body is None:
+            body = compress(entry.variants['identity'], encoding)
+            with self.lock:
+                if encoding not in entry.variants:
+                    entry.variants[encoding] = body
+                    self.compressions += 1
+                    if self.entries.get(key) is entry:
+                        self.bytes += len(body)
+                        self._evict()
+        return body
+
+    # Drop every cached response (e.g. after the datasets were reloaded)
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRatio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'notModified': self.not_modified,
+                'evictions': self.evictions,
+                'compressions': self.compressions,
+                'served': dict(self.served),
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'maxBytes': self.max_bytes,
+                'encodings': ['identity'] + ENCODINGS,
+            }
+
+    def _respond(self, key, entry):
+        encoding = 'identity'
+        if len(entry.variants['identity']) >= MIN_COMPRESS_BYTES:
+            encoding = request.accept_encodings.best_match(ENCODINGS) or 'identity'
+        headers = {'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+        # A copy the client holds in any coding of the same body is still valid
+        for candidate in [encoding, 'identity'] + ENCODINGS:
+            if request.if_none_match.contains(entry.etag_for(candidate)):
+                headers['ETag'] = f'"{entry.etag_for(candidate)}"'
+                with self.lock:
+                    self.not_modified += 1
+                return Response(status=304, headers=headers)
+        headers['ETag'] = f'"{entry.etag_for(encoding)}"'
+        body = self._variant(key, entry, encoding)
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        with self.lock:
+            self.served[encoding] += 1
+        return Response(body, status=entry.status, mimetype=entry.mimetype, headers=headers)
+
+    # The chunks of a streamed response, kept under key once the last one is
+    # sent if the tables are still at the versions in key
+    def _stream_into(self, key, tables, response, body):
+        chunks = []
+        size = 0
+        for chunk in body:
+            if chunks is not None:
+                size += len(chunk)
+                if size > self.max_bytes:
+                    chunks = None
+                else:
+                    chunks.append(chunk)
+            yield chunk
+        if chunks is not None and tuple(table.version for table in tables) == key[2]:
+            self._put(key, Entry(response.status_code, b''.join(chunks), response.mimetype))
+
+    # Decorator for a view whose response depends only on the request and the
+    # given tables. Successful (200) responses are cached, streamed ones once
+    # they have been sent (see _stream_into); errors pass through.
+    def cached(self, *tables):
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                key = (request.path, tuple(sorted(request.args.items(multi=True))),
+                       tuple(table.version for table in tables))
+                entry = self._get(key)
+                if entry is None:
+                    response = view(*args, **kwargs)
+                    if not isinstance(response, Response) or response.status_code != 200:
+                        return response
+                    if response.is_streamed:
+                        response.response = self._stream_into(key, tables, response, response.response)
+                        return response
+                    entry = Entry(response.status_code, response.get_data(), response.mimetype)
+                    self._put(key, entry)
+                return self._respond(key, entry)
+            return wrapper
+        return decorator
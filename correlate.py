@@ -0,0 +1,144 @@
+import ipaddress
+from collections import Counter
+
+from query import SEVERITY_RANK, QueryError, parse_int
+from store import NO_TIME, epoch_seconds
+
+# Correlation of the three datasets by IP address: everything known about one
+# address (the threats naming it, the traffic it sent or received, the login
+# attempts made from it) without the dashboard joining the full lists.
+#
+# IPCorrelation joins through the IP indexes the tables already keep
+# (store.IPIndex: binary search over each IP field's sorted order), so it holds
+# nothing of its own. The sorted orders are in the snapshot and kept up to date
+# on append, so there is nothing to build on start and rows appended in follow
+# mode are joined as they arrive. A profile is one binary search per IP field
+# plus work proportional to the address's own records.
+#
+#   GET /api/ip/<ip>/profile?limit=&offset=
+
+# The joined IP fields: (dataset, field, role of the address in the record)
+SOURCES = (
+    ('threats', 'ipAddress', 'threat'),
+    ('traffic', 'sourceIP', 'source'),
+    ('traffic', 'destinationIP', 'destination'),
+    ('logins', 'ipAddress', 'login'),
+)
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# Most usernames listed in a profile
+TOP_USERNAMES = 10
+
+
+# tables: {'threats': ..., 'traffic': ..., 'logins': ...}, each with an index
+# on its SOURCES fields
+class IPCorrelation:
+    def __init__(self, tables):
+        self.tables = tables
+
+    # Canonical spelling of an address given in a request, the one the IP
+    # columns pack (QueryError if it is not an address)
+    @staticmethod
+    def canonical(ip):
+        try:
+            return str(ipaddress.ip_address(ip))
+        except ValueError:
+            raise QueryError(f"'{ip[:100]}' is not an IP address")
+
+    # Rows holding the address per source (in SOURCES order), ascending
+    def rows(self, ip):
+        address = self.canonical(ip)
+        return [self.tables[dataset].positions(field, address) for dataset, field, _ in SOURCES]
+
+    # (source, row) of every record holding the address, in ingest order per source
+    def matches(self, ip):
+        return [(source, row) for source, rows in enumerate(self.rows(ip)) for row in rows]
+
+    # Combined timeline (newest first, a page of it) and per-dataset summary of
+    # the records involving ip
+    def profile(self, ip, args):
+        limit = parse_int(args, 'limit', DEFAULT_LIMIT, 1, MAX_LIMIT)
+        offset = parse_int(args, 'offset', 0, 0, 1 << 62)
+        tables = self.tables
+        threats, traffic, logins = tables['threats'], tables['traffic'], tables['logins']
+        rows = self.rows(ip)
+
+        # Newest first: (-time, source, row), ordered by plain tuple comparison
+        events = []
+        times = (map(epoch_seconds, map(threats.columns['lastSeen'].get, rows[0])),
+                 map(traffic.columns['timestampEpoch'].get, rows[1]),
+                 map(traffic.columns['timestampEpoch'].get, rows[2]),
+                 map(logins.columns['timestampEpoch'].get, rows[3]))
+        for source, (source_rows, source_times) in enumerate(zip(rows, times)):
+            events.extend((-time, source, row) for time, row in zip(source_times, source_rows))
+        events.sort()
+        known = [-time for time, _, _ in events if time != -NO_TIME]
+
+        summary = {
+            'threats': _threat_summary(threats, rows[0]),
+            'traffic': _traffic_summary(traffic, rows[1], rows[2]),
+            'logins': _login_summary(logins, rows[3]),
+        }
+        return {
+            'ip': ip,
+            'records': len(events),
+            'firstSeen': known[-1] if known else None,
+            'lastSeen': known[0] if known else None,
+            'summary': summary,
+            'timeline': [{'dataset': SOURCES[source][0], 'role': SOURCES[source][2],
+                          'time': -time if time != -NO_TIME else None,
+                          'record': tables[SOURCES[source][0]].row(row)}
+                         for time, source, row in events[offset:offset + limit]],
+            'offset': offset,
+            'limit': limit,
+        }
+
+
+def _counts(table, field, rows):
+    return dict(Counter(map(table.columns[field].get, rows)).most_common())
+
+
+def _threat_summary(table, rows):
+    severities = _counts(table, 'severity', rows)
+    return {
+        'count': len(rows),
+        'bySeverity': severities,
+        'byType': _counts(table, 'type', rows),
+        'maxSeverity': max(severities, key=lambda value: SEVERITY_RANK.get(value, -1)) if severities else None,
+    }
+
+
+def _traffic_summary(table, sent, received):
+    columns = table.columns
+    # A record from an address to itself is counted once
+    rows = set(sent).union(received)
+    return {
+        'count': len(rows),
+        'asSource': len(sent),
+        'asDestination': len(received),
+        'bytesTransferred': sum(map(columns['bytesTransferred'].get, rows)),
+        'packetsTransferred': sum(map(columns['packetsTransferred'].get, rows)),
+        'peers': len(set(map(columns['destinationIP'].key, sent)).union(map(columns['sourceIP'].key, received))),
+        'ports': len(set(map(columns['port'].get, rows))),
+        'byProtocol': _counts(table, 'protocol', rows),
+        'byStatus': _counts(table, 'status', rows),
+    }
+
+
+def _login_summary(table, rows):
+    usernames = Counter(map(table.columns['username'].get, rows))
+    scores = list(map(table.columns['anomalyScore'].get, rows))
+    return {
+        'count': len(rows),
+        'byStatus': _counts(table, 'status', rows),
+        'byBehavior': _counts(table, 'behaviorType', rows),
+        'usernames': len(usernames),
+        'topUsernames': dict(usernames.most_common(TOP_USERNAMES)),
+        'maxAnomalyScore': max(scores) if scores else None,
+    }
+
+
+# Correlation of the threat, traffic and login tables
+def correlate_tables(threats, traffic, logins):
+    return IPCorrelation({'threats': threats, 'traffic': traffic, 'logins': logins})
@@ -0,0 +1,202 @@
+import collections
+import threading
+from datetime import datetime, timezone
+
+from store import NO_TIME
+
+# Streaming detectors over the login and traffic records.
+#
+# Each detector is attached to a table (table.attach) like the chart counts,
+# so it sees every record once, as it is appended: by the CSV or JSON load and
+# by follow mode. It keeps a sliding window per key (a username, an address) of
+# the key's recent events and raises an alert in the shared Detections when the
+# window reaches its threshold:
+#
+#   RateDetector      threshold matching records per key within window seconds
+#                     (failed logins per username or address)
+#   DistinctDetector  threshold distinct values of a field per key within window
+#                     seconds (destination ports per source address: a scan)
+#
+# An event costs O(1) amortized: it is appended to its key's window and what
+# has left the window is dropped from the front. Keys are held in an LRU map of
+# at most MAX_KEYS and a window never holds more than a small multiple of its
+# threshold, so memory is bounded whatever the stream. After an alert a key is
+# quiet for one window, so a burst raises one alert, not one per record.
+#
+# Windows follow the record timestamps (the timestampEpoch column). Logs are
+# written in time order; a record older than its key's latest event still
+# counts if it is within the window, one older than that is ignored.
+
+TIME_FIELD = 'timestampEpoch'
+
+# Keys with a window per detector (least recently seen ones are dropped)
+MAX_KEYS = 100000
+
+# Alerts kept, newest last
+MAX_ALERTS = 1000
+
+# Distinct values kept per window, as a multiple of the threshold
+DISTINCT_VALUES_FACTOR = 4
+
+FAILED_LOGIN_STATUSES = ('Failed', 'Blocked')
+
+
+def format_time(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+# Alerts raised by the detectors (the last MAX_ALERTS, each numbered) and the
+# number raised per rule. state is a previous state().
+class Detections:
+    def __init__(self, state=None):
+        self.alerts = collections.deque(maxlen=MAX_ALERTS)
+        self.counts = collections.Counter()
+        self.detectors = []
+        # Records seen per rule when state was saved
+        self.rows = collections.Counter()
+        self.last_id = 0
+        self._lock = threading.Lock()
+        if state is not None:
+            self.alerts.extend(state['alerts'])
+            self.counts.update(state['counts'])
+            self.rows.update(state['rows'])
+            self.last_id = state['lastId']
+
+    def report(self, alert):
+        with self._lock:
+            self.last_id += 1
+            alert['id'] = self.last_id
+            self.alerts.append(alert)
+            self.counts[alert['rule']] += 1
+
+    # Alerts numbered after last_id, oldest first
+    def since(self, last_id):
+        with self._lock:
+            return [alert for alert in self.alerts if alert['id'] > last_id]
+
+    # Counts per rule and the newest alerts (of one rule), newest first
+    def to_dict(self, rule=None, limit=100):
+        with self._lock:
+            alerts = [alert for alert in reversed(self.alerts) if rule is None or alert['rule'] == rule]
+            return {'counts': dict(self.counts), 'alerts': alerts[:limit]}
+
+    def state(self):
+        with self._lock:
+            return {'alerts': list(self.alerts), 'counts': dict(self.counts),
+                    'rows': {detector.rule: detector.total for detector in self.detectors},
+                    'lastId': self.last_id}
+
+
+# Sliding windows of the records of one table per value of key_field. Only
+# records whose where field (field, values) is one of values are counted.
+class WindowDetector:
+    def __init__(self, rule, table, key_field, threshold, window, detections, where=None, max_keys=MAX_KEYS):
+        self.rule = rule
+        self.table = table
+        self.key = table.columns[key_field]
+        self.time = table.columns[TIME_FIELD]
+        self.threshold = threshold
+        self.window = window
+        self.detections = detections
+        self.where = (table.columns[where[0]], frozenset(where[1])) if where else None
+        self.max_keys = max_keys
+        # key -> [events, latest time, quiet until]; least recently seen first
+        self.windows = collections.OrderedDict()
+        self.total = detections.rows[rule]
+        detections.detectors.append(self)
+
+    def add(self, row):
+        self.total += 1
+        if self.where is not None:
+            column, values = self.where
+            if column.get(row) not in values:
+                return
+        now = self.time.get(row)
+        key = self.key.get(row)
+        if now == NO_TIME or not key:
+            return
+        windows = self.windows
+        state = windows.get(key)
+        if state is None:
+            state = windows[key] = [self.new_events(), now, now]
+            if len(windows) > self.max_keys:
+                windows.popitem(last=False)
+        else:
+            windows.move_to_end(key)
+            if now > state[1]:
+                state[1] = now
+            elif now < state[1] - self.window:
+                return
+        count = self.record(state[0], now, row, state[1] - self.window)
+        if count >= self.threshold and now >= state[2]:
+            state[2] = state[1] + self.window
+            self.detections.report({
+                'rule': self.rule,
+                'key': key,
+                'count': count,
+                'threshold': self.threshold,
+                'windowSeconds': self.window,
+                'time': format_time(now),
+                'recordId': self.table.value(row, 'id'),
+            })
+
+    def new_events(self):
+        raise NotImplementedError
+
+    # Add the event of row at now to events, drop those before start and
+    # return the number the threshold applies to
+    def record(self, events, now, row, start):
+        raise NotImplementedError
+
+
+# threshold matching records per key within window seconds
+class RateDetector(WindowDetector):
+    # The times of the key's last threshold events
+    def new_events(self):
+        return collections.deque(maxlen=self.threshold)
+
+    def record(self, events, now, row, start):
+        events.append(now)
+        while events[0] < start:
+            events.popleft()
+        return len(events)
+
+
+# threshold distinct values of value_field per key within window seconds
+class DistinctDetector(WindowDetector):
+    def __init__(self, rule, table, key_field, value_field, threshold, window, detections, **options):
+        super().__init__(rule, table, key_field, threshold, window, detections, **options)
+        self.value = table.columns[value_field]
+        self.max_values = threshold * DISTINCT_VALUES_FACTOR
+
+    # value -> time last seen, least recently seen first
+    def new_events(self):
+        return {}
+
+    def record(self, events, now, row, start):
+        value = self.value.get(row)
+        seen = events.pop(value, None)
+        events[value] = now if seen is None else max(seen, now)
+        while events:
+            oldest = next(iter(events))
+            if events[oldest] >= start and len(events) <= self.max_values:
+                break
+            del events[oldest]
+        return len(events)
+
+
+# Attach the default detectors to the traffic and login tables. state is a
+# saved Detections.state() covering the rows the tables start with (their
+# windows start out empty).
+def attach_detectors(traffic_analysis, login_attempts, state=None):
+    detections = Detections(state)
+    detectors = [
+        RateDetector('failed-logins-by-user', login_attempts, 'username', 5, 300, detections,
+                     where=('status', FAILED_LOGIN_STATUSES)),
+        RateDetector('failed-logins-by-ip', login_attempts, 'ipAddress', 10, 300, detections,
+                     where=('status', FAILED_LOGIN_STATUSES)),
+        DistinctDetector('port-scan', traffic_analysis, 'sourceIP', 'port', 20, 60, detections),
+    ]
+    for detector in detectors:
+        detector.table.attach(detector, replay_from=detector.total)
+    return detections
@@ -0,0 +1,173 @@
+import bisect
+import csv
+import functools
+import ipaddress
+import os
+import zlib
+from array import array
+
+from store import IPV6_KEY_BIT, IPColumn
+
+# Offline geo-location of attack-log rows.
+#
+# The gazetteer is a CSV file (data/gazetteer.csv, or CTI_GAZETTEER_PATH) with
+# the columns city,country,lat,lng,network. Rows without a network place a
+# city; rows with one (a CIDR block or a first-last address range, IPv4 or
+# IPv6) place the addresses in it, e.g. converted from a GeoIP export.
+#
+# Both are held in sorted arrays: city names (case-folded), and range
+# starts/ends as index keys (the packed values store.IPColumn uses), each with
+# the row of its location in a table of distinct (lat, lng, country) tuples. A city is found by one
+# bisection and memoized in an LRU cache, as the same few hundred cities repeat
+# on every row; addresses, which rarely repeat, are bisected directly.
+#
+# A row is placed by its city, then by its source address, and otherwise at a
+# point derived from a hash of the city name inside FALLBACK_BOX - the same
+# point for the same city on every load, unlike the random coordinates per
+# row used before.
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gazetteer.csv')
+
+# Distinct cities whose location is memoized
+CITY_CACHE_SIZE = 4096
+
+# Area (lat_min, lat_max, lng_min, lng_max) and country of the fallback points
+FALLBACK_BOX = (10.0, 40.0, 70.0, 90.0)
+FALLBACK_COUNTRY = 'India'
+
+
+def _range_keys(network):
+    if '-' in network:
+        first, last = (ipaddress.ip_address(value.strip()) for value in network.split('-', 1))
+        if first.version != last.version or first > last:
+            raise ValueError(f'bad address range {network!r}')
+    else:
+        block = ipaddress.ip_network(network.strip(), strict=False)
+        first, last = block.network_address, block.broadcast_address
+    bit = IPV6_KEY_BIT if first.version == 6 else 0
+    return int(first) | bit, int(last) | bit
+
+
+# City and address-range locations in sorted arrays. cities holds
+# (city, country, lat, lng) tuples, ranges (network, city, country, lat, lng);
+# up to cache_size city lookups are memoized (none with 0).
+class Gazetteer:
+    def __init__(self, cities=(), ranges=(), cache_size=CITY_CACHE_SIZE):
+        # Locations are shared (lat, lng, country) tuples, so repeated places
+        # and countries cost one reference per entry
+        self.locations = []
+        location_rows = {}
+
+        def location_row(lat, lng, country):
+            key = (float(lat), float(lng), country)
+            row = location_rows.get(key)
+            if row is None:
+                row = location_rows[key] = len(self.locations)
+                self.locations.append(key)
+            return row
+
+        by_name = {}
+        for city, country, lat, lng in cities:
+            by_name.setdefault(city.strip().casefold(), location_row(lat, lng, country))
+        self.names = sorted(by_name)
+        self.city_rows = array('I', (by_name[name] for name in self.names))
+
+        entries = sorted((*_range_keys(network), location_row(lat, lng, country))
+                         for network, city, country, lat, lng in ranges)
+        self.starts = [start for start, _, _ in entries]
+        self.ends = [end for _, end, _ in entries]
+        self.range_rows = array('I', (row for _, _, row in entries))
+        self._city_location = (functools.lru_cache(cache_size)(self._find_city) if cache_size
+                               else self._find_city)
+
+    @classmethod
+    def load(cls, path, cache_size=CITY_CACHE_SIZE):
+        cities = []
+        ranges = []
+        with open(path, encoding='utf-8', newline='') as f:
+            for number, row in enumerate(csv.DictReader(f), 2):
+                try:
+                    lat, lng = float(row['lat']), float(row['lng'])
+                    network = (row.get('network') or '').strip()
+                    if network:
+                        _range_keys(network)
+                        ranges.append((network, row.get('city') or '', row['country'], lat, lng))
+                    else:
+                        cities.append((row['city'], row['country'], lat, lng))
+                except (KeyError, TypeError, ValueError) as e:
+                    raise ValueError(f'{path}:{number}: {e}') from None
+        return cls(cities, ranges, cache_size)
+
+    def __len__(self):
+        return len(self.names) + len(self.starts)
+
+    def _find_city(self, name):
+        name = name.casefold()
+        i = bisect.bisect_left(self.names, name)
+        if i < len(self.names) and self.names[i] == name:
+            return self.locations[self.city_rows[i]]
+        return None
+
+    # (lat, lng, country) of a city, None if it is not in the gazetteer
+    def city(self, name):
+        return self._city_location(name) if name else None
+
+    # (lat, lng, country) of the range containing an address, None if none does
+    # (ranges are expected not to overlap, as in GeoIP exports)
+    def address(self, ip):
+        if not self.starts or not ip:
+            return None
+        key = IPColumn.key_for(ip)
+        if not isinstance(key, int):
+            return None
+        i = bisect.bisect_right(self.starts, key) - 1
+        if i >= 0 and key <= self.ends[i]:
+            return self.locations[self.range_rows[i]]
+        return None
+
+    # (lat, lng, country) of a row's city / source address, never None
+    def locate(self, city, ip=None):
+        location = self.city(city)
+        if location is None:
+            location = self.address(ip)
+            if location is None:
+                location = fallback_location(city)
+        return location
+
+    def cache_info(self):
+        return self._city_location.cache_info() if hasattr(self._city_location, 'cache_info') else None
+
+
+# Stable point inside FALLBACK_BOX for a city the gazetteer does not know
+@functools.lru_cache(CITY_CACHE_SIZE)
+def fallback_location(city):
+    digest = zlib.crc32((city or '').casefold().encode('utf-8'))
+    lat_min, lat_max, lng_min, lng_max = FALLBACK_BOX
+    lat = lat_min + (lat_max - lat_min) * (digest & 0xFFFF) / 0xFFFF
+    lng = lng_min + (lng_max - lng_min) * (digest >> 16) / 0xFFFF
+    return round(lat, 4), round(lng, 4), FALLBACK_COUNTRY
+
+
+# Gazetteer file in use: CTI_GAZETTEER_PATH or data/gazetteer.csv (which may
+# not exist; rows are then placed by fallback_location only)
+def gazetteer_path():
+    return os.environ.get('CTI_GAZETTEER_PATH') or DEFAULT_PATH
+
+
+_default = None
+
+
+# The gazetteer at gazetteer_path(), loaded on first use. A file that cannot
+# be read or has a bad row is reported once and replaced by an empty
+# gazetteer (every row then gets its fallback point), so it neither fails
+# every row of an ingest nor is read again for each.
+def default_gazetteer():
+    global _default
+    if _default is None:
+        path = gazetteer_path()
+        try:
+            _default = Gazetteer.load(path) if os.path.exists(path) else Gazetteer()
+        except (OSError, ValueError) as e:
+            print(f"Ignoring gazetteer {path}: {e}; rows are placed at fallback points")
+            _default = Gazetteer()
+    return _default
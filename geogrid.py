@@ -0,0 +1,224 @@
+import itertools
+import math
+import threading
+from array import array
+
+from query import QueryError
+
+# Server-side clustering of the threat map.
+#
+# GeoGrid is a quadtree of Web Mercator tiles (the ones Leaflet draws), kept as
+# one dict of non-empty cells per level (those some map zoom shows, up to
+# MAX_LEVEL). Each distinct location is registered once, in one cell per level.
+# A threat appended there only bumps one counter in each of those cells. So the grid is kept up to date row by row, and
+# its size depends on the number of distinct locations (one per gazetteer city
+# or address range), not on the number of threats.
+#
+# clusters(bbox, zoom) answers from the level whose cells are CELL_ZOOM_OFFSET
+# zoom levels finer than the map (64 px on 256 px tiles). It returns the
+# non-empty cells in the box, each with its threat count, per-severity counts
+# and the mean of its locations. The payload depends on the viewport and never
+# holds more than one entry per visible cell.
+
+# Deepest level: tiles of zoom 16, about 600 m across at the equator
+MAX_LEVEL = 16
+
+# Cells are tiles this many zoom levels below the map's
+CELL_ZOOM_OFFSET = 2
+
+MAX_ZOOM = 30
+
+# Latitude limit of the Web Mercator projection
+MAX_LATITUDE = 85.0511287798
+
+# Cell fields: summed latitude and longitude of its distinct locations, their
+# number and its first row, followed by its threat count per severity code (a
+# flat list: appending a threat costs one increment per level)
+LAT_SUM, LNG_SUM, LOCATIONS, FIRST_ROW, SEVERITY = range(5)
+
+
+# Tile coordinates (fractional) of a point at zoom MAX_LEVEL
+def project(lat, lng, level=MAX_LEVEL):
+    scale = 1 << level
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    sin = math.sin(math.radians(lat))
+    x = (lng + 180.0) / 360.0 * scale
+    y = (0.5 - math.log((1 + sin) / (1 - sin)) / (4 * math.pi)) * scale
+    return x, y
+
+
+# bbox=west,south,east,north (as Leaflet's LatLngBounds.toBBoxString gives it)
+def parse_bbox(raw):
+    try:
+        west, south, east, north = (float(value) for value in raw.split(','))
+    except (AttributeError, ValueError):
+        raise QueryError("'bbox' must be west,south,east,north in degrees")
+    if not all(math.isfinite(value) for value in (west, south, east, north)) or south > north or west > east:
+        raise QueryError("'bbox' must be west,south,east,north in degrees")
+    return west, south, east, north
+
+
+def parse_zoom(raw):
+    try:
+        zoom = int(raw)
+    except (TypeError, ValueError):
+        raise QueryError(f"'zoom' must be an integer between 0 and {MAX_ZOOM}")
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise QueryError(f"'zoom' must be an integer between 0 and {MAX_ZOOM}")
+    return zoom
+
+
+# Threat counts per map cell and level; attach it to the threat table
+# (table.attach) so it is filled with the existing rows and kept up to date.
+# state is a previous state(), e.g. from a snapshot of the same table.
+class GeoGrid:
+    def __init__(self, table, state=None):
+        self.table = table
+        self.lat = table.columns['location.lat']
+        self.lng = table.columns['location.lng']
+        self.severity = table.columns['severity']
+        # Cells per level (only the levels some zoom uses are filled)
+        self.levels = [{} for _ in range(MAX_LEVEL + 1)]
+        # Severity codes the cells have a count for
+        self.width = len(self.severity.values)
+        # (lat, lng) -> the cells of that location, one per level, followed by
+        # a cell counting that location alone
+        self.locations = {}
+        self.total = 0
+        # New locations change the level dicts while requests may read them
+        self._lock = threading.Lock()
+        if state is not None:
+            locations = state['locations']
+            width = locations['width']
+            counts = locations['counts']
+            for i, (lat, lng, first_row) in enumerate(zip(locations['lat'], locations['lng'], locations['firstRow'])):
+                cells = self._location_cells(lat, lng, first_row)
+                for code, count in enumerate(counts[i * width:(i + 1) * width]):
+                    if count:
+                        self._count(cells, code, count)
+            self.total = state['total']
+
+    def _location_cells(self, lat, lng, row):
+        cells = self.locations.get((lat, lng))
+        if cells is not None:
+            return cells
+        x, y = project(lat, lng)
+        x = min(int(x), (1 << MAX_LEVEL) - 1)
+        y = min(int(y), (1 << MAX_LEVEL) - 1)
+        cells = []
+        with self._lock:
+            for level in range(self.level_for(0), MAX_LEVEL + 1):
+                level_cells = self.levels[level]
+                shift = MAX_LEVEL - level
+                key = (x >> shift) << 32 | (y >> shift)
+                cell = level_cells.get(key)
+                if cell is None:
+                    cell = level_cells[key] = [0.0, 0.0, 0, row] + [0] * self.width
+                cell[LAT_SUM] += lat
+                cell[LNG_SUM] += lng
+                cell[LOCATIONS] += 1
+                cell[FIRST_ROW] = min(cell[FIRST_ROW], row)
+                cells.append(cell)
+            cells.append([lat, lng, 1, row] + [0] * self.width)
+            self.locations[(lat, lng)] = cells
+        return cells
+
+    # Give every cell a count for severity codes up to code
+    def _widen(self, code):
+        with self._lock:
+            extra = [0] * (code + 1 - self.width)
+            for level_cells in self.levels:
+                for cell in level_cells.values():
+                    cell.extend(extra)
+            for cells in self.locations.values():
+                cells[-1].extend(extra)
+            self.width = code + 1
+
+    def _count(self, cells, code, count=1):
+        if code >= self.width:
+            self._widen(code)
+        index = SEVERITY + code
+        for cell in cells:
+            cell[index] += count
+
+    def add(self, row):
+        self.total += 1
+        lat, lng = self.lat.get(row), self.lng.get(row)
+        if not (math.isfinite(lat) and math.isfinite(lng)):
+            return
+        self._count(self._location_cells(lat, lng, row), self.severity.key(row))
+
+    # Level of the cells shown at a map zoom
+    @staticmethod
+    def level_for(zoom):
+        return min(zoom + CELL_ZOOM_OFFSET, MAX_LEVEL)
+
+    # Non-empty cells of level within bbox (west, south, east, north), as
+    # (x, y, cell) triples
+    def cells(self, level, bbox):
+        west, south, east, north = bbox
+        scale = 1 << level
+        level_cells = self.levels[level]
+        x0, y0 = project(north, west, level)
+        x1, y1 = project(south, east, level)
+        y0, y1 = max(0, int(y0)), min(scale - 1, int(y1))
+        # Longitudes past +-180 (a map panned around the world) wrap around
+        if x1 - x0 >= scale:
+            columns = range(scale)
+        else:
+            columns = sorted({column % scale for column in range(math.floor(x0), math.floor(x1) + 1)})
+        found = []
+        with self._lock:
+            if len(columns) * (y1 - y0 + 1) <= len(level_cells):
+                for x in columns:
+                    for y in range(y0, y1 + 1):
+                        cell = level_cells.get(x << 32 | y)
+                        if cell is not None:
+                            found.append((x, y, cell))
+            else:
+                wanted = set(columns)
+                for key, cell in level_cells.items():
+                    x, y = key >> 32, key & 0xFFFFFFFF
+                    if x in wanted and y0 <= y <= y1:
+                        found.append((x, y, cell))
+        return found
+
+    # Map clusters in bbox at zoom: each non-empty cell with its threat count,
+    # counts per severity and mean location; a cell holding a single threat
+    # carries the threat itself
+    def clusters(self, bbox, zoom):
+        level = self.level_for(zoom)
+        severities = self.severity.values
+        clusters = []
+        total = 0
+        for x, y, cell in self.cells(level, bbox):
+            counts = cell[SEVERITY:]
+            count = sum(counts)
+            if not count:
+                continue
+            total += count
+            cluster = {
+                'lat': round(cell[LAT_SUM] / cell[LOCATIONS], 6),
+                'lng': round(cell[LNG_SUM] / cell[LOCATIONS], 6),
+                'count': count,
+                'severity': {severities[code]: n for code, n in enumerate(counts) if n},
+                'cell': [level, x, y],
+            }
+            if count == 1:
+                cluster['threat'] = self.table[cell[FIRST_ROW]]
+            clusters.append(cluster)
+        return {'zoom': zoom, 'level': level, 'total': total, 'clusters': clusters}
+
+    # Snapshot state: every location (one array per field) with its counts per
+    # severity code, width of them per location
+    def state(self):
+        with self._lock:
+            locations = [cells[-1] for cells in self.locations.values()]
+            width = self.width
+        return {'total': self.total, 'locations': {
+            'lat': array('d', (cell[LAT_SUM] for cell in locations)),
+            'lng': array('d', (cell[LNG_SUM] for cell in locations)),
+            'firstRow': array('q', (cell[FIRST_ROW] for cell in locations)),
+            'width': width,
+            'counts': array('q', itertools.chain.from_iterable(cell[SEVERITY:SEVERITY + width] for cell in locations)),
+        }}
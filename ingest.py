@@ -0,0 +1,500 @@
+import csv
+import itertools
+import math
+import multiprocessing
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from classify import classify_login
+import geo
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Number of CSV rows handed to the mapping stage at a time
+DEFAULT_CHUNK_ROWS = 10000
+
+# Read buffer used for the CSV file itself
+READ_BUFFER_BYTES = 1 << 20
+
+# Parallel ingest: shards per worker (for load balancing), smallest shard worth
+# a process round-trip, and block size used when scanning for shard boundaries
+SHARDS_PER_WORKER = 4
+MIN_SHARD_BYTES = 1 << 20
+SCAN_BLOCK_BYTES = 8 << 20
+
+# Smaller CSV files are read by one process even when workers are asked for:
+# starting the pool and sending every record back to the parent costs more
+# than the parsing it spreads (20k rows took 1.4 s on 4 workers, 0.5 s on one)
+MIN_PARALLEL_BYTES = 64 << 20
+
+# Range of the integer columns (64-bit) and of destination ports
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+MAX_PORT = 65535
+
+# Ingest stages timed by IngestStats: reading and parsing the CSV, mapping rows
+# to records (without the classification), classifying login attempts, and
+# appending the records to the tables
+STAGES = ('parse', 'map', 'classify', 'write')
+
+# Mapping for severity levels
+severity_mapping = {
+    'Low': 'Low',
+    'Medium': 'Medium',
+    'High': 'High'
+}
+
+# Mapping for attack types
+attack_type_mapping = {
+    'Malware': 'Malicious',
+    'DDoS': 'Scanning',
+    'Intrusion': 'Data Exfiltration',
+    'Phishing': 'Suspicious'
+}
+
+# Mapping for status
+status_mapping = {
+    'Blocked': 'Blocked',
+    'Logged': 'Allowed',
+    'Ignored': 'Flagged'
+}
+
+
+# Peak resident set size of this process (or of its largest finished child
+# process) in bytes, None if unknown
+def peak_rss_bytes(children=False):
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# Running counters for a single ingest run
+class IngestStats:
+    def __init__(self):
+        self.rows = 0
+        self.skipped = 0
+        self.threats = 0
+        self.traffic = 0
+        self.logins = 0
+        self.workers = 1
+        # Seconds spent per stage (summed over the workers of a parallel ingest)
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'skipped': self.skipped,
+            'threats': self.threats,
+            'traffic': self.traffic,
+            'logins': self.logins,
+            'workers': self.workers,
+            'seconds': round(self.elapsed, 3),
+            'rowsPerSec': round(self.rows_per_sec, 1),
+            'stageSeconds': {stage: round(seconds, 3) for stage, seconds in self.stages.items()},
+            'peakRssBytes': peak_rss_bytes()
+        }
+
+    def report(self):
+        peak = peak_rss_bytes()
+        peak_text = f"{peak / (1024 * 1024):.1f} MiB" if peak is not None else "n/a"
+        text = (f"Ingested {self.rows} rows ({self.skipped} skipped) in {self.elapsed:.2f}s "
+                f"- {self.rows_per_sec:,.0f} rows/sec, peak RSS {peak_text}")
+        if self.workers > 1:
+            child_peak = peak_rss_bytes(children=True)
+            if child_peak is not None:
+                text += f", worker peak RSS {child_peak / (1024 * 1024):.1f} MiB"
+            text += f" ({self.workers} workers)"
+        text += ' [' + ', '.join(f'{stage} {seconds:.2f}s' for stage, seconds in self.stages.items()) + ']'
+        return text
+
+
+# Seed for the filler values of a row, derived from the row itself so that
+# re-ingesting the same file (serially or in parallel) gives the same records
+def row_seed(*fields):
+    return zlib.crc32('\x1f'.join(field or '' for field in fields).encode('utf-8'))
+
+
+# Small deterministic stand-in for the random module, used for the fields
+# the CSV does not provide (packet counts, durations)
+class RowFiller:
+    __slots__ = ('state',)
+
+    def __init__(self, seed):
+        self.state = seed
+
+    def _next(self):
+        # 64-bit LCG step, top 53 bits used as the output
+        self.state = (self.state * 6364136223846793005 + 1442695040888963407) & 0xFFFFFFFFFFFFFFFF
+        return self.state >> 11
+
+    def randint(self, a, b):
+        return a + self._next() % (b - a + 1)
+
+    def uniform(self, a, b):
+        return a + (b - a) * (self._next() / 9007199254740992.0)
+
+
+# int of a CSV field ('' is 0); ValueError unless it lies in low..high
+def bounded_int(text, low=INT64_MIN, high=INT64_MAX):
+    value = int(text or 0)
+    if not low <= value <= high:
+        raise ValueError(f'{value} is out of range')
+    return value
+
+
+# Generator yielding CSV rows in lists of at most chunk_rows rows.
+# Only one chunk is held in memory at a time, so file size does not matter.
+def iter_row_chunks(csv_path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    with open(csv_path, 'r', encoding='utf-8', newline='', buffering=READ_BUFFER_BYTES) as file:
+        reader = csv.DictReader(file)
+        chunk = []
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+# The chunks of chunks, adding the time taken to read and parse each to
+# stages['parse']
+def timed_chunks(chunks, stages):
+    chunks = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        chunk = next(chunks, None)
+        stages['parse'] += time.perf_counter() - started
+        if chunk is None:
+            return
+        yield chunk
+
+
+# Turn one CSV row into (ip_threat, traffic_entry, login_entry); any of them may be None.
+# The 'id' fields are assigned by the caller. With stages (IngestStats.stages) the
+# time spent classifying is added to stages['classify'].
+def map_row(row, stages=None):
+    get = row.get
+    source_ip = get('Source IP Address')
+    timestamp = get('Timestamp', '')
+    payload = get('Payload Data')
+    payload_lower = payload.lower() if payload else ''
+    anomaly_text = get('Anomaly Scores', '0')
+    anomaly_score = float(anomaly_text or 0)
+    # inf and nan would fail later, in int() or in the tables
+    if not math.isfinite(anomaly_score):
+        raise ValueError(f'anomaly score {anomaly_text!r} is not finite')
+    filler = RowFiller(row_seed(timestamp, source_ip, get('Destination IP Address'), payload))
+
+    # Extract location data
+    city = (get('Geo-location Data') or '').split(',', 1)[0].strip()
+
+    # Get geo coordinates (from the gazetteer, the same for every row of a city)
+    lat, lng, country = geo.default_gazetteer().locate(city, source_ip)
+
+    ip_threat = None
+    traffic_entry = None
+    login_entry = None
+
+    # Process IP threat data
+    attack_type = get('Attack Type')
+    if source_ip and attack_type:
+        ip_threat = {
+            'id': None,
+            'ipAddress': source_ip,
+            'type': attack_type_mapping.get(attack_type, 'Suspicious'),
+            'severity': severity_mapping.get(get('Severity Level', 'Low'), 'Low'),
+            'lastSeen': timestamp,
+            'count': bounded_int(anomaly_score * 2) or filler.randint(5, 50),
+            'description': payload if payload is not None else 'No description available',
+            'source': get('Log Source', 'Unknown'),
+            'location': {
+                'lat': lat,
+                'lng': lng,
+                'country': country,
+                'city': city
+            }
+        }
+
+    # Process traffic analysis data
+    action = get('Action Taken')
+    destination_ip = get('Destination IP Address')
+    if source_ip and destination_ip:
+        traffic_entry = {
+            'id': None,
+            'timestamp': timestamp,
+            'sourceIP': source_ip,
+            'destinationIP': destination_ip,
+            'protocol': get('Protocol', 'TCP'),
+            'port': bounded_int(get('Destination Port'), 0, MAX_PORT) or filler.randint(1, MAX_PORT),
+            'bytesTransferred': (bounded_int(get('Packet Length'), INT64_MIN // 10, INT64_MAX // 10) * 10
+                                 or filler.randint(256, 10240)),
+            'packetsTransferred': filler.randint(1, 32),
+            'duration': round(filler.uniform(0.5, 10.0), 1),
+            'status': status_mapping.get(action or 'Logged', 'Allowed')
+        }
+
+    # Process login attempts and suspicious behavior
+    username = get('User Information')
+    login_labels = None
+    if username:
+        started = time.perf_counter()
+        login_labels = classify_login(payload_lower, action, anomaly_score)
+        if stages is not None:
+            stages['classify'] += time.perf_counter() - started
+    if login_labels is not None:
+        status, behavior_type = login_labels
+
+        if payload is None:
+            description = 'No description available'
+        elif len(payload) > 100:
+            description = payload[:100] + '...'
+        else:
+            description = payload
+
+        login_entry = {
+            'id': None,
+            'timestamp': timestamp,
+            'username': username,
+            'ipAddress': source_ip or '',
+            'deviceInfo': get('Device Information', 'Unknown Device'),
+            'location': city + ', ' + country,
+            'status': status,
+            'behaviorType': behavior_type,
+            'anomalyScore': anomaly_score,
+            'description': description
+        }
+
+    return ip_threat, traffic_entry, login_entry
+
+
+# Map an iterable of CSV rows, counting rows and skipping malformed ones.
+# Yields (ip_threat, traffic_entry, login_entry) triples without ids.
+def map_rows(rows, stats):
+    stages = stats.stages
+    for row in rows:
+        stats.rows += 1
+        try:
+            yield map_row(row, stages)
+        except (ValueError, TypeError, OverflowError):
+            # A malformed or out-of-range number should cost one row, not the whole file
+            stats.skipped += 1
+
+
+# The mapped triples of a chunk of rows, adding the time taken to
+# stats.stages['map'] (less the classification, counted on its own)
+def map_chunk(chunk, stats):
+    stages = stats.stages
+    classified = stages['classify']
+    started = time.perf_counter()
+    mapped = list(map_rows(chunk, stats))
+    stages['map'] += time.perf_counter() - started - (stages['classify'] - classified)
+    return mapped
+
+
+# Generator that streams mapped records out of a CSV file in a single pass.
+# Yields ('threat' | 'traffic' | 'login', record) pairs with ids already assigned.
+# The time the consumer takes between records counts as the 'write' stage.
+def stream_records(csv_path, stats=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    stats = stats if stats is not None else IngestStats()
+    for chunk in timed_chunks(iter_row_chunks(csv_path, chunk_rows), stats.stages):
+        mapped = map_chunk(chunk, stats)
+        started = time.perf_counter()
+        for ip_threat, traffic_entry, login_entry in mapped:
+            if ip_threat is not None:
+                stats.threats += 1
+                ip_threat['id'] = str(stats.threats)
+                yield 'threat', ip_threat
+            if traffic_entry is not None:
+                stats.traffic += 1
+                traffic_entry['id'] = str(stats.traffic)
+                yield 'traffic', traffic_entry
+            if login_entry is not None:
+                stats.logins += 1
+                login_entry['id'] = str(stats.logins)
+                yield 'login', login_entry
+        stats.stages['write'] += time.perf_counter() - started
+
+
+# Parsed header of a CSV file and the byte offset where its first data row starts
+def read_csv_header(csv_path):
+    with open(csv_path, 'rb') as file:
+        raw = file.readline()
+        # A quoted header field may itself contain a newline
+        while raw.count(b'"') % 2:
+            line = file.readline()
+            if not line:
+                break
+            raw += line
+        header = next(csv.reader([raw.decode('utf-8')]), [])
+        return header, file.tell()
+
+
+# Split the data part of a CSV file into roughly equal byte ranges that start
+# and end on record boundaries. A newline only ends a record when the number of
+# quote characters before it is even, so quoted multi-line payloads stay whole.
+def find_shard_boundaries(csv_path, shards, data_start):
+    size = os.path.getsize(csv_path)
+    if shards <= 1 or size - data_start < MIN_SHARD_BYTES * 2:
+        return [(data_start, size)] if size > data_start else []
+
+    shards = min(shards, (size - data_start) // MIN_SHARD_BYTES)
+    step = (size - data_start) // shards
+    targets = iter([data_start + step * k for k in range(1, shards)])
+    target = next(targets, None)
+    cuts = [data_start]
+
+    with open(csv_path, 'rb') as file:
+        file.seek(data_start)
+        position = data_start
+        quotes = 0
+        while target is not None:
+            block = file.read(SCAN_BLOCK_BYTES)
+            if not block:
+                break
+            counted = 0
+            search = 0
+            while target is not None:
+                newline = block.find(b'\n', max(target - position, search))
+                if newline < 0:
+                    break
+                quotes += block.count(b'"', counted, newline)
+                counted = newline
+                search = newline + 1
+                if quotes % 2 == 0:
+                    cut = position + newline + 1
+                    if cuts[-1] < cut < size:
+                        cuts.append(cut)
+                    while target is not None and target < cut:
+                        target = next(targets, None)
+            quotes += block.count(b'"', counted)
+            position += len(block)
+
+    cuts.append(size)
+    return list(zip(cuts, cuts[1:]))
+
+
+# Decoded lines of a binary file from its current position up to byte offset end
+def _iter_range_lines(file, end):
+    position = file.tell()
+    while position < end:
+        line = file.readline()
+        if not line:
+            break
+        position += len(line)
+        yield line.decode('utf-8')
+
+
+# Worker entry point: map one byte range of the CSV. Ids are assigned by the
+# parent while merging so they stay global and in file order.
+def _ingest_shard(task):
+    csv_path, start, end, fieldnames = task
+    stats = IngestStats()
+    ip_threats = []
+    traffic_analysis = []
+    login_attempts = []
+    with open(csv_path, 'rb', buffering=READ_BUFFER_BYTES) as file:
+        file.seek(start)
+        reader = csv.DictReader(_iter_range_lines(file, end), fieldnames=fieldnames)
+        chunks = iter(lambda: list(itertools.islice(reader, DEFAULT_CHUNK_ROWS)), [])
+        for chunk in timed_chunks(chunks, stats.stages):
+            for ip_threat, traffic_entry, login_entry in map_chunk(chunk, stats):
+                if ip_threat is not None:
+                    ip_threats.append(ip_threat)
+                if traffic_entry is not None:
+                    traffic_analysis.append(traffic_entry)
+                if login_entry is not None:
+                    login_attempts.append(login_entry)
+    return ip_threats, traffic_analysis, login_attempts, stats.rows, stats.skipped, stats.stages
+
+
+# Append shard records to target, numbering them after the records already there
+def extend_with_ids(target, records):
+    next_id = len(target) + 1
+    for offset, record in enumerate(records):
+        record['id'] = str(next_id + offset)
+    target.extend(records)
+
+
+# Parallel variant of process_cybersecurity_data: the CSV is cut into
+# record-aligned byte ranges that are parsed in a process pool and merged in
+# file order, so the output is identical to the serial path.
+def process_cybersecurity_data_parallel(csv_path, workers=None, stats=None, targets=None):
+    workers = workers if workers and workers > 0 else (os.cpu_count() or 1)
+    stats = stats if stats is not None else IngestStats()
+    stats.workers = workers
+    ip_threats, traffic_analysis, login_attempts = targets if targets is not None else ([], [], [])
+
+    header, data_start = read_csv_header(csv_path)
+    ranges = find_shard_boundaries(csv_path, workers * SHARDS_PER_WORKER, data_start)
+    tasks = [(csv_path, start, end, header) for start, end in ranges]
+
+    # fork avoids re-importing the caller's main module in every worker
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context('spawn')
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        for threats, traffic, logins, rows, skipped, stages in pool.map(_ingest_shard, tasks):
+            started = time.perf_counter()
+            extend_with_ids(ip_threats, threats)
+            extend_with_ids(traffic_analysis, traffic)
+            extend_with_ids(login_attempts, logins)
+            stats.stages['write'] += time.perf_counter() - started
+            stats.rows += rows
+            stats.skipped += skipped
+            for stage, seconds in stages.items():
+                stats.stages[stage] += seconds
+
+    stats.threats = len(ip_threats)
+    stats.traffic = len(traffic_analysis)
+    stats.logins = len(login_attempts)
+    return ip_threats, traffic_analysis, login_attempts
+
+
+# Function to read and process CSV data.
+# workers > 1 (or <= 0 for one per CPU) switches to the parallel ingest path
+# for files of MIN_PARALLEL_BYTES or more.
+# targets is an optional (threats, traffic, logins) triple of containers with
+# append/extend/len (lists or store.Table) to load into; new lists by default.
+def process_cybersecurity_data(csv_path, chunk_rows=DEFAULT_CHUNK_ROWS, stats=None, workers=1, targets=None):
+    stats = stats if stats is not None else IngestStats()
+    # Load the gazetteer before any row (forked workers inherit it)
+    geo.default_gazetteer()
+
+    try:
+        if workers != 1 and os.path.getsize(csv_path) >= MIN_PARALLEL_BYTES:
+            ip_threats, traffic_analysis, login_attempts = process_cybersecurity_data_parallel(
+                csv_path, workers, stats, targets)
+        else:
+            ip_threats, traffic_analysis, login_attempts = targets if targets is not None else ([], [], [])
+            sinks = {'threat': ip_threats.append, 'traffic': traffic_analysis.append, 'login': login_attempts.append}
+            for kind, record in stream_records(csv_path, stats, chunk_rows):
+                sinks[kind](record)
+        stats.finish()
+        print(stats.report())
+        return ip_threats, traffic_analysis, login_attempts
+
+    except Exception as e:
+        print(f"Error processing CSV file: {e}")
+        return [], [], []
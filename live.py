@@ -0,0 +1,441 @@
+import asyncio
+import contextlib
+import csv
+import io
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import serialize
+from ingest import READ_BUFFER_BYTES, IngestStats, map_chunk, read_csv_header
+
+# Live updates: tail an append-only attack log and push the new records to
+# connected dashboards as Server-Sent Events.
+#
+# A LogFollower thread polls the log (CSV with the usual header, or JSONL with
+# one CSV-style row object per line) for complete new records, maps them with
+# ingest.map_rows, appends them to the dataset tables and publishes one 'delta'
+# event per batch to a Broker. Every event is encoded once and shared by all
+# subscribers. Each subscriber has a bounded queue: a client that falls behind
+# (its connection is not draining) has its backlog dropped and gets a single
+# 'resync' event telling it to reload, so a slow client can neither hold up
+# ingestion nor make the server buffer without limit.
+#
+# A subscriber can be waited on from a thread (the threaded server iterates
+# the EventStream) or from an event loop: asgi.WSGIBridge awaits the stream,
+# so an idle connection holds no thread between events.
+
+# Longest a follower sleeps when the log has no new data
+POLL_INTERVAL = 0.2
+
+# Most rows mapped and published as one batch
+BATCH_ROWS = 2000
+
+# Most records per dataset carried in one delta event; clients reload the
+# dataset when more arrived than were sent
+MAX_EVENT_RECORDS = 500
+
+# Events queued per subscriber before it is considered too slow
+SUBSCRIBER_QUEUE = 256
+
+# Recent events kept for clients that reconnect with Last-Event-ID
+HISTORY_EVENTS = 256
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = 15
+
+DATASETS = ('threats', 'traffic', 'logins')
+
+
+def sse_message(event, data, event_id=None):
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return (f'{head}event: {event}\ndata: ').encode('utf-8') + data + b'\n\n'
+
+
+# One connected client: a bounded queue of encoded events
+class Subscriber:
+    def __init__(self, max_events=SUBSCRIBER_QUEUE):
+        self.max_events = max_events
+        self.events = deque()
+        self.ready = threading.Condition()
+        self.overflows = 0
+        self.closed = False
+        # Future of a coroutine in take_async, resolved on its loop by _wake
+        self.waiter = None
+
+    # Wake whoever waits in take or take_async (called with ready held)
+    def _wake(self):
+        self.ready.notify()
+        if self.waiter is not None:
+            waiter, self.waiter = self.waiter, None
+            waiter.get_loop().call_soon_threadsafe(resolve, waiter)
+
+    def push(self, message):
+        with self.ready:
+            if len(self.events) >= self.max_events:
+                # Too far behind: replace the backlog with one resync request
+                self.events.clear()
+                self.overflows += 1
+                message = sse_message('resync', b'{}')
+            self.events.append(message)
+            self._wake()
+
+    # Everything queued (joined into one chunk), waiting up to timeout seconds
+    # for something to arrive; b'' on timeout
+    def take(self, timeout):
+        with self.ready:
+            if not self.events and not self.closed:
+                self.ready.wait(timeout)
+            chunk = b''.join(self.events)
+            self.events.clear()
+            return chunk
+
+    # take for a coroutine: waits on the running loop, not in a thread
+    async def take_async(self, timeout):
+        waiter = None
+        with self.ready:
+            if not self.events and not self.closed:
+                waiter = self.waiter = asyncio.get_running_loop().create_future()
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(waiter, timeout)
+            except asyncio.TimeoutError:
+                pass
+        with self.ready:
+            self.waiter = None
+            chunk = b''.join(self.events)
+            self.events.clear()
+            return chunk
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            self._wake()
+
+
+def resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+# SSE byte stream of one subscriber, with keep-alive comments while idle.
+# Iterating it blocks between events; async iteration awaits them instead.
+# Closing it unsubscribes.
+class EventStream:
+    def __init__(self, broker, subscriber, heartbeat=HEARTBEAT_SECONDS):
+        self.broker = broker
+        self.subscriber = subscriber
+        self.heartbeat = heartbeat
+        self.started = False
+
+    def _first(self):
+        self.started = True
+        return b'retry: 3000\n\n'
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.started:
+            return self._first()
+        if self.subscriber.closed:
+            raise StopIteration
+        return self.subscriber.take(self.heartbeat) or b': keep-alive\n\n'
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.started:
+            return self._first()
+        if self.subscriber.closed:
+            raise StopAsyncIteration
+        return await self.subscriber.take_async(self.heartbeat) or b': keep-alive\n\n'
+
+    def close(self):
+        self.broker.unsubscribe(self.subscriber)
+
+
+class Broker:
+    def __init__(self, history=HISTORY_EVENTS):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.history = deque(maxlen=history)
+        self.last_id = 0
+        self.published = 0
+        self.overflows = 0
+
+    # New subscriber; with last_event_id the events it missed are queued first
+    # (or a resync when they are no longer in the history)
+    def subscribe(self, last_event_id=None, max_events=SUBSCRIBER_QUEUE):
+        subscriber = Subscriber(max_events)
+        with self.lock:
+            if last_event_id is not None:
+                try:
+                    after = int(last_event_id)
+                except ValueError:
+                    after = -1
+                missed = [message for event_id, message in self.history if event_id > after]
+                if after < self.last_id - len(self.history) or after > self.last_id:
+                    subscriber.push(sse_message('resync', b'{}'))
+                else:
+                    for message in missed:
+                        subscriber.push(message)
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber not in self.subscribers:
+                return
+            self.subscribers.discard(subscriber)
+            self.overflows += subscriber.overflows
+        subscriber.close()
+
+    def publish(self, event, payload):
+        with self.lock:
+            self.last_id += 1
+            message = sse_message(event, serialize.dumps(payload), self.last_id)
+            self.history.append((self.last_id, message))
+            self.published += 1
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.push(message)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'subscribers': len(self.subscribers),
+                'published': self.published,
+                'lastEventId': self.last_id,
+                'overflows': self.overflows + sum(s.overflows for s in self.subscribers),
+            }
+
+    # SSE byte stream for one subscriber (an EventStream)
+    def stream(self, subscriber, heartbeat=HEARTBEAT_SECONDS):
+        return EventStream(self, subscriber, heartbeat)
+
+
+# Complete records at the start of data and the rest (an unfinished record).
+# For CSV a newline only ends a record outside quotes.
+def split_records(data, quoted):
+    end = 0
+    position = 0
+    quotes = 0
+    while True:
+        newline = data.find(b'\n', position)
+        if newline < 0:
+            break
+        if quoted:
+            quotes += data.count(b'"', position, newline)
+        position = newline + 1
+        if quotes % 2 == 0:
+            end = position
+    return data[:end], data[end:]
+
+
+# Raised by LogFollower.apply when a batch failed after some of it was
+# appended: the tables and their observers can no longer be trusted to agree
+class PartialBatchError(RuntimeError):
+    pass
+
+
+# Thread that tails path and feeds new rows into tables (threats, traffic,
+# logins). stats is the dict of GroupStats attached to the tables, whose
+# counts are included in every event, detections the detect.Detections whose
+# new alerts are. With a segments.SegmentLog every batch is also appended to
+# it, with the position in path it was read up to.
+class LogFollower(threading.Thread):
+    def __init__(self, path, tables, broker, stats=None, detections=None, offset=0,
+                 poll_interval=POLL_INTERVAL, batch_rows=BATCH_ROWS, log=None):
+        super().__init__(name='log-follower', daemon=True)
+        self.path = path
+        self.tables = tables
+        self.broker = broker
+        self.group_stats = stats or {}
+        self.detections = detections
+        self.offset = offset
+        self.log = log
+        # [path, offset] of the end of the last batch applied
+        self.position = [os.path.abspath(path), offset]
+        self.poll_interval = poll_interval
+        self.batch_rows = batch_rows
+        self.jsonl = os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson')
+        self.fieldnames = None
+        self.ingest_stats = IngestStats()
+        self.batches = 0
+        # Batches that failed to apply (skipped) and reads that failed (retried)
+        self.errors = 0
+        # Why the follower stopped on a partly applied batch, None while it runs
+        self.failure = None
+        self.stopping = threading.Event()
+
+    def stop(self):
+        self.stopping.set()
+
+    # The log opened at the current offset, None while a CSV has no header yet
+    def _open(self):
+        if not self.jsonl:
+            self.fieldnames, data_start = read_csv_header(self.path)
+            if not self.fieldnames:
+                return None
+            self.offset = max(self.offset, data_start)
+        file = open(self.path, 'rb')
+        file.seek(self.offset)
+        return file
+
+    # Rows of a batch. A JSONL line that is not UTF-8 or not a JSON object is
+    # skipped (and counted); invalid bytes in a CSV row are replaced with U+FFFD.
+    def _rows(self, data):
+        if self.jsonl:
+            for line in data.splitlines():
+                try:
+                    row = json.loads(line.decode('utf-8')) if line.strip() else None
+                except ValueError:  # including UnicodeDecodeError
+                    row = None
+                if isinstance(row, dict):
+                    yield {key: '' if value is None else str(value) for key, value in row.items()}
+                elif line.strip():
+                    self.ingest_stats.skipped += 1
+        else:
+            yield from csv.DictReader(io.StringIO(data.decode('utf-8', 'replace'), newline=''),
+                                      fieldnames=self.fieldnames)
+
+    # Map and append one batch of raw records (ending at byte end of the log);
+    # publish what was added. The batch is all-or-nothing: every record is
+    # numbered and prepared (Table.prepare) before the first is appended, so
+    # one that does not fit fails the batch with the tables untouched.
+    # PartialBatchError if appending fails anyway.
+    def apply(self, data, end=None):
+        batch = ([], [], [])
+        stages = self.ingest_stats.stages
+        started = time.perf_counter()
+        rows = list(self._rows(data))
+        stages['parse'] += time.perf_counter() - started
+        for triple in map_chunk(rows, self.ingest_stats):
+            for records, record in zip(batch, triple):
+                if record is not None:
+                    records.append(record)
+        if not any(batch):
+            return 0
+        last_alert = self.detections.last_id if self.detections is not None else 0
+        started = time.perf_counter()
+        prepared = []
+        for table, records in zip(self.tables, batch):
+            next_id = len(table) + 1
+            for offset, record in enumerate(records):
+                record['id'] = str(next_id + offset)
+            prepared.append([table.prepare(record) for record in records])
+        with self.log.lock if self.log is not None else contextlib.nullcontext():
+            try:
+                for table, rows in zip(self.tables, prepared):
+                    for values in rows:
+                        table.commit(values)
+            except Exception as e:
+                raise PartialBatchError(f'batch ending at byte {end} was partly applied: {e!r}') from e
+            if end is not None:
+                self.position = [self.position[0], end]
+            if self.log is not None:
+                try:
+                    self.log.append({'records': batch, 'follow': self.position})
+                except OSError as e:
+                    # Later batches are not logged either, so a restart reads
+                    # the log again from the last batch that was
+                    print(f"Could not append to the segment log, no longer logging: {e}")
+                    self.log = None
+        stages['write'] += time.perf_counter() - started
+        self.batches += 1
+
+        payload = {'totals': {}, 'dropped': {}}
+        for name, table, records in zip(DATASETS, self.tables, batch):
+            payload[name] = records[-MAX_EVENT_RECORDS:]
+            payload['dropped'][name] = max(0, len(records) - MAX_EVENT_RECORDS)
+            payload['totals'][name] = len(table)
+        if self.group_stats:
+            payload['stats'] = {name: group.to_dict() for name, group in self.group_stats.items()}
+        if self.detections is not None:
+            payload['alerts'] = self.detections.since(last_alert)
+        self.broker.publish('delta', payload)
+        return sum(len(records) for records in batch)
+
+    def run(self):
+        file = None
+        pending = b''
+        try:
+            while not self.stopping.is_set():
+                try:
+                    if file is None:
+                        if not os.path.exists(self.path):
+                            self.stopping.wait(self.poll_interval)
+                            continue
+                        file = self._open()
+                        if file is None:
+                            self.stopping.wait(self.poll_interval)
+                            continue
+                    data = file.read(READ_BUFFER_BYTES)
+                    if not data:
+                        # Truncated or replaced: start over from the beginning
+                        if os.path.getsize(self.path) < self.offset:
+                            file.close()
+                            file = None
+                            self.offset = 0
+                            pending = b''
+                            continue
+                        self.stopping.wait(self.poll_interval)
+                        continue
+                except OSError as e:
+                    # Removed or unreadable for now: reopen after the last complete record
+                    self.errors += 1
+                    print(f"Could not read {self.path}: {e}")
+                    if file is not None:
+                        file.close()
+                        file = None
+                    self.offset -= len(pending)
+                    pending = b''
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                self.offset += len(data)
+                complete, pending = split_records(pending + data, not self.jsonl)
+                end = self.offset - len(pending) - len(complete)
+                # Apply in batches of about batch_rows lines
+                while complete:
+                    cut = len(complete)
+                    newline = -1
+                    for _ in range(self.batch_rows):
+                        newline = complete.find(b'\n', newline + 1)
+                        if newline < 0:
+                            break
+                    if newline >= 0 and newline + 1 < len(complete):
+                        head, _ = split_records(complete[:newline + 1], not self.jsonl)
+                        cut = len(head) or cut
+                    end += cut
+                    try:
+                        self.apply(complete[:cut], end)
+                    except PartialBatchError as e:
+                        # Following on top of half a batch would only spread the damage
+                        self.errors += 1
+                        self.failure = str(e)
+                        print(f"Stopped following {self.path}: {e}")
+                        return
+                    except Exception as e:
+                        # One bad batch (left out whole) must not stop the follower
+                        self.errors += 1
+                        print(f"Skipping a batch of {self.path} ending at byte {end}: {e!r}")
+                    complete = complete[cut:]
+        finally:
+            if file is not None:
+                file.close()
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'offset': self.offset,
+            'rows': self.ingest_stats.rows,
+            'skipped': self.ingest_stats.skipped,
+            'batches': self.batches,
+            'errors': self.errors,
+            'failure': self.failure,
+        }
+
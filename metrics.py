@@ -0,0 +1,307 @@
+import bisect
+import collections
+import contextvars
+import os
+import sys
+import threading
+import time
+
+from flask import Response
+
+# Instrumentation of the hot paths, exported in the Prometheus text format.
+#
+# A Registry holds histograms that are updated as things happen (request
+# latencies) and collectors: functions called at scrape time that read the
+# counters the app keeps anyway (dataset sizes, cache hits, ingest stage
+# times), so those cost nothing between scrapes.
+#
+# RequestMetrics wraps the WSGI application of the Flask app and times every
+# request per route (the URL rule, so the number of series stays fixed),
+# splitting the time into serialization (JSON encoding in serialize.jsonify,
+# reported through note_serialize) and the rest, called lookup. Streamed
+# bodies are encoded after the application returned and only count their
+# setup. The route and status are read in start_response rather than in
+# request hooks (every access to the request or g proxies costs as much as the
+# rest of the timing together) and the histograms are updated in batches.
+#
+# SamplingProfiler is a thread that, while started, samples the stacks of all
+# other threads every interval seconds and counts them in the collapsed format
+# flame graph tools read ("outer;inner;leaf count" per line).
+
+# Timed requests held before they are added to the histograms
+FOLD_BATCH = 1024
+
+# Histogram bucket bounds in seconds, from 100 us to 10 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Timings of the request being timed (see RequestMetrics._timed)
+_request_timing = contextvars.ContextVar('request_timing')
+
+# Default seconds between profiler samples
+PROFILE_INTERVAL = 0.005
+
+# Deepest stack recorded per sample, and most distinct stacks kept (further
+# ones are counted under OTHER_STACK)
+PROFILE_MAX_DEPTH = 64
+PROFILE_MAX_STACKS = 10000
+OTHER_STACK = '[other]'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Distribution of observed values per combination of label values. lock may
+# be shared with other histograms updated together (see add).
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS, lock=None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket (the last one past every bound), sum, count]
+        self.series = {}
+        self._lock = lock or threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            self.add(value, labels)
+
+    # observe for callers holding the lock
+    def add(self, value, labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = [(labels, list(counts), total, count)
+                      for labels, (counts, total, count) in sorted(self.series.items())]
+        for labels, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+# Histograms and scrape-time collectors. A collector returns a list of
+# (name, type, help, samples) with samples a list of ({label: value}, number).
+class Registry:
+    def __init__(self):
+        self.histograms = []
+        self.collectors = []
+        self._before_render = []
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS, lock=None):
+        histogram = Histogram(name, help_text, labelnames, buckets, lock)
+        self.histograms.append(histogram)
+        return histogram
+
+    def collector(self, collect):
+        self.collectors.append(collect)
+        return collect
+
+    # Call prepare before every render (to bring histograms up to date)
+    def before_render(self, prepare):
+        self._before_render.append(prepare)
+
+    def render(self):
+        for prepare in self._before_render:
+            prepare()
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        for collect in self.collectors:
+            for name, kind, help_text, samples in collect():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_labels(labels.keys(), labels.values())} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def response(self):
+        return Response(self.render(), content_type=CONTENT_TYPE)
+
+
+# Add the JSON encoding time of the current request (no-op outside requests
+# timed by a RequestMetrics)
+def note_serialize(seconds):
+    timing = _request_timing.get(None)
+    if timing is not None:
+        timing[0] += seconds
+
+
+# Per-route request counts and latency histograms of a Flask app
+class RequestMetrics:
+    def __init__(self, registry):
+        self.requests = collections.Counter()
+        self._lock = threading.Lock()
+        self._wrapped = None
+        # (method, seconds, serialize seconds, status line, URL rule) of the
+        # requests not yet added to the histograms: a request only appends here
+        # and they are added FOLD_BATCH at a time and before every scrape
+        self._pending = collections.deque()
+        self.latency = registry.histogram(
+            'cti_http_request_duration_seconds', 'Time from the start of a request to its response',
+            ('route', 'method'), lock=self._lock)
+        self.lookup = registry.histogram(
+            'cti_http_lookup_duration_seconds', 'Request time spent outside JSON encoding', ('route',),
+            lock=self._lock)
+        self.serialize = registry.histogram(
+            'cti_http_serialize_duration_seconds', 'Request time spent encoding JSON', ('route',),
+            lock=self._lock)
+        registry.collector(self.collect)
+        registry.before_render(self.fold)
+
+    def attach(self, app):
+        self._wrapped = app.wsgi_app
+        app.wsgi_app = self._timed
+
+    def detach(self, app):
+        app.wsgi_app, self._wrapped = self._wrapped, None
+
+    def _timed(self, environ, start_response):
+        # [JSON encoding seconds, status line, URL rule]
+        timing = [0.0, None, None]
+
+        def timed_start_response(status, headers, exc_info=None):
+            timing[1] = status
+            # Flask calls start_response while the request is still current
+            # (werkzeug keeps it in the environ until the context is popped)
+            current = environ.get('werkzeug.request')
+            if current is not None:
+                timing[2] = current.url_rule
+            return start_response(status, headers, exc_info)
+
+        token = _request_timing.set(timing)
+        started = time.perf_counter()
+        try:
+            return self._wrapped(environ, timed_start_response)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_timing.reset(token)
+            pending = self._pending
+            pending.append((environ.get('REQUEST_METHOD', ''), elapsed, *timing))
+            if len(pending) >= FOLD_BATCH:
+                self.fold()
+
+    # Add the pending requests to the histograms and counts
+    def fold(self):
+        pending = self._pending
+        with self._lock:
+            while pending:
+                method, elapsed, serialize, status, rule = pending.popleft()
+                route = rule.rule if rule is not None else 'unmatched'
+                self.latency.add(elapsed, (route, method))
+                self.lookup.add(max(0.0, elapsed - serialize), (route,))
+                if serialize:
+                    self.serialize.add(serialize, (route,))
+                self.requests[(route, method, status)] += 1
+
+    def collect(self):
+        # Counted per status line, summed per status code
+        counts = collections.Counter()
+        with self._lock:
+            for (route, method, status), count in self.requests.items():
+                code = int(status.split(None, 1)[0]) if status else 500
+                counts[(route, method, code)] += count
+        return [('cti_http_requests_total', 'counter', 'Requests answered per route, method and status',
+                 [({'route': route, 'method': method, 'status': status}, count)
+                  for (route, method, status), count in sorted(counts.items())])]
+
+
+# Sampling profiler of the running process, off until started
+class SamplingProfiler:
+    def __init__(self):
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.interval = PROFILE_INTERVAL
+        self.started = None
+        self.elapsed = 0.0
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    # Start sampling (again) every interval seconds; reset drops what was counted
+    def start(self, interval=PROFILE_INTERVAL, reset=True):
+        with self._lock:
+            if self._thread is not None:
+                return False
+            if reset:
+                self.stacks.clear()
+                self.samples = 0
+                self.elapsed = 0.0
+            self.interval = interval
+            self.started = time.perf_counter()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return False
+            self._stop.set()
+            self.elapsed += time.perf_counter() - self.started
+        thread.join()
+        return True
+
+    def _run(self):
+        own = threading.get_ident()
+        stacks = self.stacks
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                names = []
+                while frame is not None and len(names) < PROFILE_MAX_DEPTH:
+                    code = frame.f_code
+                    names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                    frame = frame.f_back
+                stack = ';'.join(reversed(names))
+                with self._lock:
+                    if stack not in stacks and len(stacks) >= PROFILE_MAX_STACKS:
+                        stack = OTHER_STACK
+                    stacks[stack] += 1
+                    self.samples += 1
+
+    def stats(self):
+        with self._lock:
+            elapsed = self.elapsed + (time.perf_counter() - self.started if self._thread is not None else 0.0)
+            return {'running': self._thread is not None, 'interval': self.interval, 'samples': self.samples,
+                    'stacks': len(self.stacks), 'seconds': round(elapsed, 3)}
+
+    # Collapsed stacks, most sampled first
+    def collapsed(self):
+        with self._lock:
+            return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
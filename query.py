@@ -0,0 +1,433 @@
+import base64
+import bisect
+import heapq
+import ipaddress
+import json
+
+from store import IPV6_KEY_BIT
+
+# Server-side pagination, filtering and sorting for the list endpoints.
+#
+# Filters are answered from the table indexes: equality filters from the value
+# indexes (posting lists), time ranges and CIDR blocks from sorted indexes. The
+# most selective filter produces the candidate rows and the others are checked
+# per candidate, so a request costs O(page) for unfiltered or single-filter
+# requests and O(smallest candidate set) otherwise - never a full scan.
+#
+# A page sorted on another field than the filters are ordered by is read by
+# walking the sort field's index and keeping the rows that pass the filters,
+# up to offset + limit of them; the candidates are only sorted when the filters
+# are so selective that the walk would pass too many rows to find them.
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# Walk the sort index while the rows it is expected to pass, (offset + limit)
+# * rows / matches, are at most this many times the matches
+WALK_RATIO = 1
+
+# Ranking used when sorting by severity
+SEVERITY_RANK = {'Low': 0, 'Medium': 1, 'High': 2}
+
+# Per dataset: query parameter -> field for equality filters, the time field
+# (since/until), query parameter -> IP field for CIDR filters and the fields
+# that can be sorted on
+DATASETS = {
+    'threats': {
+        'equals': {
+            'severity': 'severity',
+            'type': 'type',
+            'source': 'source',
+            'country': 'location.country',
+            'city': 'location.city',
+            'ipAddress': 'ipAddress',
+        },
+        'time': 'lastSeen',
+        'cidr': {'cidr': 'ipAddress'},
+        'sort': ['lastSeen', 'count', 'severity', 'type', 'ipAddress'],
+    },
+    'traffic': {
+        'equals': {
+            'protocol': 'protocol',
+            'status': 'status',
+            'sourceIP': 'sourceIP',
+            'destinationIP': 'destinationIP',
+        },
+        'time': 'timestamp',
+        'cidr': {'cidr': 'sourceIP', 'sourceCidr': 'sourceIP', 'destinationCidr': 'destinationIP'},
+        'sort': ['timestamp', 'port', 'bytesTransferred', 'packetsTransferred', 'duration',
+                 'protocol', 'status', 'sourceIP', 'destinationIP'],
+    },
+    'logins': {
+        'equals': {
+            'status': 'status',
+            'behaviorType': 'behaviorType',
+            'username': 'username',
+            'ipAddress': 'ipAddress',
+        },
+        'time': 'timestamp',
+        'cidr': {'cidr': 'ipAddress'},
+        'sort': ['timestamp', 'anomalyScore', 'status', 'behaviorType', 'username', 'ipAddress'],
+    },
+}
+
+
+# Well-known address blocks that can be named in CIDR parameters
+NAMED_NETWORKS = {
+    'rfc1918': ['10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16'],
+    'private': ['10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16', 'fc00::/7'],
+    'loopback': ['127.0.0.0/8', '::1/128'],
+    'link-local': ['169.254.0.0/16', 'fe80::/10'],
+    'multicast': ['224.0.0.0/4', 'ff00::/8'],
+}
+
+# Most distinct addresses listed per field by ip_ranges
+MAX_ADDRESSES = 1000
+
+
+# Raised for malformed query parameters (reported as HTTP 400)
+class QueryError(ValueError):
+    pass
+
+
+# Timestamps come as "2023-05-30 06:33:58" or "2025-04-26T10:15:00"; with the
+# separator unified they compare correctly as strings
+def normalize_time(value):
+    return value.replace('T', ' ') if value else ''
+
+
+# Sort key function for field of table (maps row position -> comparable key)
+def sort_key(table, field, time_field=None):
+    column = table.columns[field]
+    if field == time_field:
+        return lambda row: normalize_time(column.get(row))
+    if field == 'severity':
+        return lambda row: SEVERITY_RANK.get(column.get(row), -1)
+    if hasattr(column, 'sort_key'):
+        # IP column: packed value, non-addresses sort first
+        return column.sort_key
+    if hasattr(column, 'data'):
+        return column.key
+    return lambda row: column.get(row) or ''
+
+
+# Rows whose field has one of the given values
+class EqualsFilter:
+    def __init__(self, table, field, values):
+        column = table.columns[field]
+        self.column = column
+        self.postings = [table.positions(field, value) for value in dict.fromkeys(values)]
+        self.keys = {column.key_for(value) for value in values}
+        self.keys.discard(None)
+        self.ordered_by = None
+
+    def size(self):
+        return sum(len(rows) for rows in self.postings)
+
+    # Candidate rows in row order
+    def rows(self):
+        if len(self.postings) == 1:
+            return self.postings[0]
+        return list(heapq.merge(*self.postings))
+
+    def match(self, row):
+        return self.column.key(row) in self.keys
+
+
+# Rows whose IP key lies in any of ranges (sorted, disjoint (lo, hi) pairs),
+# answered from a sorted index with one pair of bisections per range
+class IPRangeFilter:
+    def __init__(self, table, name, key, ranges):
+        self.index = table.sorted_index(name, key)
+        self.key = key
+        self.ranges = ranges
+        self.starts = [lo for lo, _ in ranges]
+        self.ordered_by = name
+
+    def size(self):
+        return sum(self.index.count_between(lo, hi) for lo, hi in self.ranges)
+
+    # Candidate rows in key order
+    def rows(self):
+        if len(self.ranges) == 1:
+            return self.index.between(*self.ranges[0])
+        rows = []
+        for lo, hi in self.ranges:
+            rows.extend(self.index.between(lo, hi))
+        return rows
+
+    def match(self, row):
+        key = self.key(row)
+        if not isinstance(key, int):
+            return False
+        i = bisect.bisect_right(self.starts, key) - 1
+        return i >= 0 and key <= self.ranges[i][1]
+
+
+# Rows whose sort key lies in [lo, hi], answered from a sorted index
+class RangeFilter:
+    def __init__(self, table, name, key, lo, hi):
+        self.index = table.sorted_index(name, key)
+        self.key = key
+        self.lo = lo
+        self.hi = hi
+        self.ordered_by = name
+
+    def size(self):
+        return self.index.count_between(self.lo, self.hi)
+
+    # Candidate rows in key order
+    def rows(self):
+        return self.index.between(self.lo, self.hi)
+
+    def match(self, row):
+        return self.lo <= self.key(row) <= self.hi
+
+
+def parse_int(args, name, default, minimum, maximum):
+    value = args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise QueryError(f"'{name}' must be an integer")
+    return max(minimum, min(maximum, number))
+
+
+def encode_cursor(row, key=None):
+    payload = {'r': row}
+    if key is not None:
+        payload['k'] = key
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(payload['r']), payload.get('k')
+    except (ValueError, KeyError, TypeError):
+        raise QueryError("invalid 'cursor'")
+
+
+# Build the sorted indexes that time filters and sorting use on table, so
+# they are part of a snapshot instead of being built by the first request
+def prepare(table, dataset):
+    spec = DATASETS[dataset]
+    for field in spec['sort']:
+        table.sorted_index(field, sort_key(table, field, spec['time']))
+    return table
+
+
+# Filters requested in args for a table of the given dataset
+def build_filters(table, spec, args):
+    filters = []
+    for param, field in spec['equals'].items():
+        raw = args.get(param)
+        if raw:
+            filters.append(EqualsFilter(table, field, [value for value in raw.split(',') if value]))
+
+    since = args.get('since')
+    until = args.get('until')
+    if since or until:
+        time_field = spec['time']
+        key = sort_key(table, time_field, time_field)
+        # '\uffff' sorts after every timestamp with the same prefix, so a bare
+        # date in 'until' includes the whole day
+        filters.append(RangeFilter(table, time_field, key, normalize_time(since or ''),
+                                   normalize_time(until) + '\uffff' if until else '\uffff'))
+
+    for param, field in spec['cidr'].items():
+        raw = args.get(param)
+        if raw:
+            filters.append(IPRangeFilter(table, field, sort_key(table, field), parse_ip_ranges(raw, param)))
+    return filters
+
+
+def _ip_key(address):
+    return int(address) | IPV6_KEY_BIT if address.version == 6 else int(address)
+
+
+# Index key ranges of a comma-separated list of CIDR blocks (10.0.0.0/8),
+# address ranges (10.0.0.5-10.0.0.99) and names from NAMED_NETWORKS, as sorted
+# and merged (lo, hi) pairs. A CIDR block is the key range of its addresses.
+def parse_ip_ranges(raw, param='cidr'):
+    ranges = []
+    for part in raw.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if part.lower() in NAMED_NETWORKS:
+            ranges.extend(parse_ip_ranges(','.join(NAMED_NETWORKS[part.lower()]), param))
+            continue
+        try:
+            if '-' in part:
+                first, last = (ipaddress.ip_address(value.strip()) for value in part.split('-', 1))
+                if first.version != last.version or first > last:
+                    raise ValueError(part)
+            else:
+                network = ipaddress.ip_network(part, strict=False)
+                first, last = network.network_address, network.broadcast_address
+        except ValueError:
+            raise QueryError(f"'{param}' must list CIDR blocks (10.0.0.0/8), address ranges "
+                             f"(10.0.0.5-10.0.0.99) or {', '.join(NAMED_NETWORKS)}")
+        ranges.append((_ip_key(first), _ip_key(last)))
+    if not ranges:
+        raise QueryError(f"'{param}' is empty")
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for lo, hi in ranges[1:]:
+        if lo <= merged[-1][1] + 1:
+            if hi > merged[-1][1]:
+                merged[-1] = (merged[-1][0], hi)
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def _key_address(key):
+    if key & IPV6_KEY_BIT:
+        return str(ipaddress.IPv6Address(key & (IPV6_KEY_BIT - 1)))
+    return str(ipaddress.IPv4Address(key))
+
+
+# For each IP field of tables (dataset name -> table): the number of rows with
+# an address in the ranges of args['cidr'] and the first args['limit'] distinct
+# addresses among them with their row counts. Costs two bisections per range
+# for the counts and two per listed address, independent of the table sizes.
+def ip_ranges(tables, args):
+    raw = args.get('cidr')
+    if not raw:
+        raise QueryError("'cidr' is required")
+    ranges = parse_ip_ranges(raw)
+    limit = parse_int(args, 'limit', DEFAULT_LIMIT, 0, MAX_ADDRESSES)
+
+    result = {'ranges': [[_key_address(lo), _key_address(hi)] for lo, hi in ranges]}
+    for dataset, table in tables.items():
+        fields = result[dataset] = {}
+        for field in dict.fromkeys(DATASETS[dataset]['cidr'].values()):
+            index = table.sorted_index(field, sort_key(table, field))
+            column = table.columns[field]
+            order = index.order
+            addresses = []
+            rows = 0
+            more = False
+            for lo, hi in ranges:
+                start, end = index.bisect_left(lo), index.bisect_right(hi)
+                rows += end - start
+                # Step from one distinct address to the next
+                while start < end:
+                    if len(addresses) == limit:
+                        more = True
+                        break
+                    row = order[start]
+                    following = index.bisect_right(index.key(row))
+                    addresses.append({'address': column.get(row), 'rows': following - start})
+                    start = following
+            fields[field] = {'rows': rows, 'addresses': addresses, 'more': more}
+    return result
+
+
+# First index in seq (ordered by (key(row), row)) after the cursor position
+def _seek(seq, key, target, descending):
+    lo, hi = 0, len(seq)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        row = seq[mid]
+        probe = (key(row), row) if key is not None else row
+        if probe < target or (not descending and probe == target):
+            lo = mid + 1
+        else:
+            hi = mid
+    return len(seq) - lo if descending else lo
+
+
+# The first count rows of order (the last, from the end, if descending) that
+# match every one of filters
+def _walk(order, filters, count, descending):
+    found = []
+    for row in reversed(order) if descending else order:
+        if all(f.match(row) for f in filters):
+            found.append(row)
+            if len(found) == count:
+                break
+    return found
+
+
+# Run a list query against table. args is a mapping of query parameters;
+# returns the response envelope with the page of records.
+def run(table, dataset, args):
+    spec = DATASETS[dataset]
+    limit = parse_int(args, 'limit', DEFAULT_LIMIT, 1, MAX_LIMIT)
+    offset = parse_int(args, 'offset', 0, 0, 1 << 62)
+
+    sort = args.get('sort') or None
+    descending = False
+    if sort:
+        descending = sort.startswith('-')
+        sort = sort.lstrip('-+')
+        if args.get('order') == 'desc':
+            descending = True
+        if sort not in spec['sort']:
+            raise QueryError(f"cannot sort by '{sort}'; use one of {', '.join(spec['sort'])}")
+    key = sort_key(table, sort, spec['time']) if sort else None
+    cursor = args.get('cursor')
+
+    # Candidate rows from the most selective filter, checked against the others
+    filters = build_filters(table, spec, args)
+    walked = None
+    if not filters:
+        if key is None:
+            seq = range(len(table))
+        else:
+            seq = table.sorted_index(sort, key).order
+    else:
+        filters.sort(key=lambda f: f.size())
+        driver, others = filters[0], filters[1:]
+        rows = driver.rows()
+        if others:
+            rows = [row for row in rows if all(f.match(row) for f in others)]
+        if key is None:
+            if driver.ordered_by is not None:
+                rows = sorted(rows)
+            seq = rows
+        elif driver.ordered_by == sort and not others:
+            seq = rows
+        elif not cursor and (offset + limit) * len(table) <= WALK_RATIO * len(rows) ** 2:
+            # (a cursor page needs its position among the matches: those are sorted)
+            seq = rows
+            walked = _walk(table.sorted_index(sort, key).order, filters, offset + limit, descending)
+        else:
+            seq = sorted(rows, key=lambda row: (key(row), row))
+
+    start = offset
+    if cursor:
+        after_row, after_key = decode_cursor(cursor)
+        target = (after_key, after_row) if key is not None else after_row
+        try:
+            start = _seek(seq, key, target, descending)
+        except TypeError:
+            raise QueryError("invalid 'cursor'")
+
+    total = len(seq)
+    end = min(start + limit, total)
+    if walked is not None:
+        positions = walked[start:end]
+    elif descending:
+        positions = [seq[total - 1 - i] for i in range(start, end)]
+    else:
+        positions = list(seq[start:end])
+
+    next_cursor = None
+    if end < total and positions:
+        last = positions[-1]
+        next_cursor = encode_cursor(last, key(last) if key is not None else None)
+
+    return {
+        'items': table.rows(positions),
+        'total': total,
+        'offset': start,
+        'limit': limit,
+        'nextCursor': next_cursor,
+    }
@@ -0,0 +1,148 @@
+import heapq
+import itertools
+import math
+import operator
+import re
+
+from query import QueryError, parse_int
+from store import BM25_K1, tokenize
+
+# Full-text search over the description fields (the CSV's Payload Data) of the
+# threats and login attempts, answered from the tables' text indexes (see
+# store.TextIndex).
+#
+# A query is a list of words and "quoted phrases", all of which a record must
+# contain; OR between two groups of them accepts records matching either
+# group: 'sql injection OR "port scan"'. A word that tokenizes into several
+# tokens (an address, a hyphenated name) is matched as a phrase: its words in
+# that order, separated only by spaces or punctuation. Each group is answered
+# from the postings of its rarest term, the other terms only decoding the
+# blocks of their postings that can hold those rows; phrases are then checked
+# against the text of the remaining records. Matches are ranked by BM25 over
+# all the query's terms (a single word straight from its impacts, without
+# scoring every row that contains it) and returned a page at a time.
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Most words and phrases in a query
+MAX_TERMS = 32
+
+QUERY_PATTERN = re.compile(r'"([^"]*)"?|(\S+)')
+
+
+# Groups of phrases (tuples of tokens) from the query text: a record matches a
+# group if it contains every phrase of it
+def parse_query(text):
+    groups = [[]]
+    count = 0
+    for phrase, word in QUERY_PATTERN.findall(text or ''):
+        if word == 'OR':
+            groups.append([])
+            continue
+        if word == 'AND':
+            continue
+        tokens = tuple(tokenize(phrase or word))
+        if tokens:
+            groups[-1].append(tokens)
+            count += 1
+    groups = [group for group in groups if group]
+    if not groups:
+        raise QueryError("'q' must contain a word to search for")
+    if count > MAX_TERMS:
+        raise QueryError(f"'q' can hold at most {MAX_TERMS} words and phrases")
+    return groups
+
+
+# Pattern finding the tokens of phrase in a lower-cased text. It starts with
+# the first token, so the regex engine can skip ahead to its occurrences;
+# contains() checks what precedes them.
+def phrase_pattern(phrase):
+    return re.compile(r'[\W_]+'.join(map(re.escape, phrase)) + r'(?![^\W_])')
+
+
+# Whether text holds the phrase of pattern
+def contains(pattern, text):
+    for found in pattern.finditer(text):
+        start = found.start()
+        if start == 0 or not text[start - 1].isalnum():
+            return True
+    return False
+
+
+# Ascending rows of an indexed text column matching any of groups
+def match(index, groups):
+    matched = set()
+    for group in groups:
+        rows = index.match_all([token for phrase in group for token in phrase])
+        patterns = [phrase_pattern(phrase) for phrase in group if len(phrase) > 1]
+        if patterns:
+            column = index.column
+            rows = [row for row in rows
+                    if all(contains(pattern, (column.get(row) or '').lower()) for pattern in patterns)]
+        if len(groups) == 1:
+            return rows
+        matched.update(rows)
+    return sorted(matched)
+
+
+def _idf(index, term):
+    documents = len(index.column)
+    frequency = index.count(term)
+    return math.log(1.0 + (documents - frequency + 0.5) / (frequency + 0.5)) * (BM25_K1 + 1.0)
+
+
+# BM25 score of each row of rows (ascending) for the query terms, in order
+def score(index, rows, terms):
+    scores = [0.0] * len(rows)
+    for term in terms:
+        found = index.lookup(term, rows)
+        if found:
+            weights = map(found.get, rows, itertools.repeat(0.0))
+            scores = list(map(operator.add, scores,
+                              map(operator.mul, weights, itertools.repeat(_idf(index, term)))))
+    return scores
+
+
+# Run a search. tables maps dataset names to (table, text field); args holds
+# q, dataset (a comma-separated subset of the names), limit and offset.
+# Returns the page of records, best first, each with its dataset and score.
+def run(tables, args):
+    groups = parse_query(args.get('q'))
+    limit = parse_int(args, 'limit', DEFAULT_LIMIT, 1, MAX_LIMIT)
+    offset = parse_int(args, 'offset', 0, 0, 1 << 62)
+    names = list(tables)
+    if args.get('dataset'):
+        names = [name for name in args['dataset'].split(',') if name]
+        unknown = [name for name in names if name not in tables]
+        if unknown:
+            raise QueryError(f"'dataset' must list {', '.join(tables)}")
+    terms = list(dict.fromkeys(token for group in groups for phrase in group for token in phrase))
+
+    single = groups[0][0][0] if len(groups) == 1 and len(groups[0]) == 1 and len(groups[0][0]) == 1 else None
+
+    ranked = []
+    counts = {}
+    for order, name in enumerate(names):
+        table, field = tables[name]
+        index = table.indexes[field]
+        if single is not None:
+            counts[name] = index.count(single)
+            idf = _idf(index, single)
+            ranked.extend((-idf * weight, order, row) for weight, row in index.best(single, offset + limit))
+            continue
+        rows = match(index, groups)
+        counts[name] = len(rows)
+        scores = score(index, rows, terms)
+        best = heapq.nlargest(offset + limit, range(len(rows)), key=scores.__getitem__)
+        ranked.extend((-scores[i], order, rows[i]) for i in best)
+
+    page = heapq.nsmallest(offset + limit, ranked)[offset:]
+    return {
+        'items': [{'dataset': names[order], 'score': round(-value, 4), 'record': tables[names[order]][0].row(row)}
+                  for value, order, row in page],
+        'total': sum(counts.values()),
+        'counts': counts,
+        'offset': offset,
+        'limit': limit,
+    }
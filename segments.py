@@ -0,0 +1,238 @@
+import json
+import os
+import struct
+import threading
+import zlib
+
+import serialize
+
+# Append-only log of the records ingested after the snapshot was written.
+#
+# In follow mode every batch the LogFollower appends to the tables is also
+# appended to the log as one frame, so persisting new records costs one write
+# and one fsync of the batch itself, whatever the size of the datasets. The
+# snapshot stays the base: a compaction writes a new snapshot holding the
+# current tables and the number of the first segment not in it, and then
+# deletes the older segments. A start loads the snapshot and replays only the
+# segments written since.
+#
+# The log is a directory of numbered segment files. Each holds frames:
+#   u32       payload length
+#   u32       CRC-32 of the payload
+#   payload   UTF-8 JSON: {"records": [threats, traffic, logins], "follow": [path, offset]}
+# Appends go to the newest segment, which is closed and a new one started at
+# SEGMENT_BYTES. A crash while appending leaves at most one torn frame at the
+# end of the newest segment; recovery cuts it off and appends after the last
+# complete frame. A damaged frame anywhere else stops the replay there: a
+# copy of its segment and the later segments are set aside (DAMAGED_SUFFIX)
+# rather than replayed out of order or deleted.
+
+FRAME = struct.Struct('<II')
+SEGMENT_SUFFIX = '.seg'
+DAMAGED_SUFFIX = '.damaged'
+
+# Size at which a segment is closed and the next one started
+SEGMENT_BYTES = 64 << 20
+
+# Bytes logged since the last compaction that make the compactor write a new
+# snapshot, and seconds between its checks
+COMPACT_BYTES = 128 << 20
+COMPACT_INTERVAL = 30.0
+
+
+def segment_name(number):
+    return f'{number:012d}{SEGMENT_SUFFIX}'
+
+
+# Make the creation, rename or removal of files in path durable
+def fsync_directory(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:  # Directories cannot be opened on Windows
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+# (end offset, payload) of each frame of a segment, up to the first one that
+# is incomplete or fails its checksum
+def read_frames(data):
+    position = 0
+    while position + FRAME.size <= len(data):
+        length, checksum = FRAME.unpack_from(data, position)
+        end = position + FRAME.size + length
+        if end > len(data):
+            return
+        payload = data[position + FRAME.size:end]
+        if zlib.crc32(payload) != checksum:
+            return
+        yield end, payload
+        position = end
+
+
+class SegmentLog:
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        # Held while records are appended to the tables and the log, and while a
+        # compaction snapshots them
+        self.lock = threading.RLock()
+        self.file = None
+        self.number = 0
+        self.size = 0
+        # Bytes in the segments a compaction would fold into the snapshot
+        self.pending_bytes = 0
+        self.frames = 0
+        self.replayed = 0
+        self.compactions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, number):
+        return os.path.join(self.directory, segment_name(number))
+
+    # Numbers of the segment files, ascending
+    def segments(self):
+        numbers = []
+        for name in os.listdir(self.directory):
+            stem = name[:-len(SEGMENT_SUFFIX)]
+            if name.endswith(SEGMENT_SUFFIX) and stem.isascii() and stem.isdigit():
+                numbers.append(int(stem))
+        return sorted(numbers)
+
+    # Call apply(frame) for every frame of the segments from start on, oldest
+    # first, then open the log for appending after the last intact frame.
+    # Segments before start are already in the snapshot and are removed.
+    def recover(self, start, apply):
+        self.discard(start)
+        numbers = [number for number in self.segments() if number >= start]
+        for i, number in enumerate(numbers):
+            path = self.path(number)
+            with open(path, 'rb') as f:
+                data = f.read()
+            end = 0
+            for end, payload in read_frames(data):
+                apply(json.loads(payload))
+                self.replayed += 1
+            self.pending_bytes += end
+            if end == len(data):
+                continue
+            if i == len(numbers) - 1:
+                print(f"Cutting {len(data) - end} bytes of an incomplete write off {path}")
+            else:
+                print(f"Damaged frame at byte {end} of {path}: setting it and the later segments aside")
+                with open(path + DAMAGED_SUFFIX, 'wb') as f:
+                    f.write(data)
+                for later in numbers[i + 1:]:
+                    os.replace(self.path(later), self.path(later) + DAMAGED_SUFFIX)
+                numbers = numbers[:i + 1]
+            with open(path, 'r+b') as f:
+                f.truncate(end)
+                os.fsync(f.fileno())
+            fsync_directory(self.directory)
+            break
+        self._open(numbers[-1] if numbers else start)
+
+    def _open(self, number):
+        path = self.path(number)
+        created = not os.path.exists(path)
+        self.file = open(path, 'ab')
+        self.number = number
+        self.size = self.file.tell()
+        if created:
+            fsync_directory(self.directory)
+
+    # Append one frame and make it durable
+    def append(self, frame):
+        payload = serialize.dumps(frame)
+        data = FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+        with self.lock:
+            if self.size and self.size + len(data) > self.segment_bytes:
+                self.roll()
+            try:
+                self.file.write(data)
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            except OSError:
+                # Do not leave a partial frame for later appends to follow
+                self.file.truncate(self.size)
+                raise
+            self.size += len(data)
+            self.pending_bytes += len(data)
+            self.frames += 1
+
+    # Close the current segment and start the next; returns its number
+    def roll(self):
+        with self.lock:
+            self.file.close()
+            self._open(self.number + 1)
+            return self.number
+
+    # Remove the segments before number (folded into a snapshot)
+    def discard(self, number):
+        old = [segment for segment in self.segments() if segment < number]
+        for segment in old:
+            self.pending_bytes = max(0, self.pending_bytes - os.path.getsize(self.path(segment)))
+            os.remove(self.path(segment))
+        if old:
+            fsync_directory(self.directory)
+
+    # Remove every segment (the snapshot was rebuilt from the source files)
+    def clear(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.discard(float('inf'))
+        self.pending_bytes = 0
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def stats(self):
+        return {
+            'segment': self.number,
+            'segments': len(self.segments()),
+            'pendingBytes': self.pending_bytes,
+            'frames': self.frames,
+            'replayed': self.replayed,
+            'compactions': self.compactions,
+        }
+
+
+# Thread folding the log into a new snapshot once COMPACT_BYTES have been
+# logged. checkpoint(segment) must write a snapshot of the tables that holds
+# every frame logged before that segment; it is called with the log's lock
+# held, so no records are appended meanwhile (requests are still served).
+class Compactor(threading.Thread):
+    def __init__(self, log, checkpoint, threshold=COMPACT_BYTES, interval=COMPACT_INTERVAL):
+        super().__init__(name='log-compactor', daemon=True)
+        self.log = log
+        self.checkpoint = checkpoint
+        self.threshold = threshold
+        self.interval = interval
+        self.stopping = threading.Event()
+
+    def stop(self):
+        self.stopping.set()
+
+    def compact(self):
+        with self.log.lock:
+            segment = self.log.roll()
+            self.checkpoint(segment)
+        self.log.discard(segment)
+        self.log.compactions += 1
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            if self.log.pending_bytes < self.threshold:
+                continue
+            try:
+                self.compact()
+            except OSError as e:
+                print(f"Log compaction failed: {e}")
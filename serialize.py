@@ -0,0 +1,123 @@
+import json
+import os
+import time
+
+from flask import Response, current_app
+
+import metrics
+
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib encoder is used without it
+    orjson = None
+
+# JSON encoding for the API responses.
+#
+# Encoders are registered by name; the active one is orjson when it is
+# installed and the stdlib json module otherwise, and can be forced with
+# CTI_JSON_ENCODER=orjson|stdlib. Both produce the same documents as Flask's
+# jsonify (sorted keys, compact unless the app is in debug mode), orjson just
+# writes non-ASCII characters as UTF-8 instead of \u escapes.
+#
+# Long arrays can be encoded as a stream of chunks (stream_array), so a large
+# list response is sent without ever holding its whole encoding in memory.
+
+# Number of array items encoded per streamed chunk
+STREAM_BATCH = 1000
+
+# Lists with more items than this are streamed by list_response
+STREAM_MIN_ITEMS = 20000
+
+
+class StdlibEncoder:
+    name = 'stdlib'
+
+    def dumps(self, obj, pretty=False):
+        if pretty:
+            text = json.dumps(obj, sort_keys=True, indent=2, separators=(', ', ': '))
+        else:
+            text = json.dumps(obj, sort_keys=True, separators=(',', ':'))
+        return text.encode('utf-8')
+
+    # Items encoded one by one, joined by ','
+    def dumps_items(self, items):
+        encode = json.JSONEncoder(sort_keys=True, separators=(',', ':')).encode
+        return ','.join([encode(item) for item in items]).encode('utf-8')
+
+
+class OrjsonEncoder:
+    name = 'orjson'
+
+    def dumps(self, obj, pretty=False):
+        if pretty:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_INDENT_2)
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+
+    def dumps_items(self, items):
+        dumps = orjson.dumps
+        option = orjson.OPT_SORT_KEYS
+        return b','.join([dumps(item, option=option) for item in items])
+
+
+ENCODERS = {'stdlib': StdlibEncoder}
+if orjson is not None:
+    ENCODERS['orjson'] = OrjsonEncoder
+
+
+def get_encoder(name=None):
+    name = name or os.environ.get('CTI_JSON_ENCODER') or ('orjson' if orjson is not None else 'stdlib')
+    if name not in ENCODERS:
+        raise ValueError(f"unknown JSON encoder '{name}'; available: {', '.join(ENCODERS)}")
+    return ENCODERS[name]()
+
+
+encoder = get_encoder()
+
+
+def dumps(obj, pretty=False):
+    return encoder.dumps(obj, pretty)
+
+
+# Chunks of the compact encoding of the array of items (an iterable)
+def stream_array(items, batch=STREAM_BATCH):
+    yield b'['
+    chunk = []
+    first = True
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == batch:
+            yield (b'' if first else b',') + encoder.dumps_items(chunk)
+            first = False
+            chunk = []
+    if chunk:
+        yield (b'' if first else b',') + encoder.dumps_items(chunk)
+    yield b']\n'
+
+
+def _pretty():
+    return current_app.config['JSONIFY_PRETTYPRINT_REGULAR'] or current_app.debug
+
+
+# Drop-in for flask.jsonify(obj) using the active encoder
+def jsonify(obj):
+    started = time.perf_counter()
+    body = dumps(obj, _pretty()) + b'\n'
+    metrics.note_serialize(time.perf_counter() - started)
+    return Response(body, mimetype='application/json')
+
+
+# Streamed response with the JSON array of items
+def stream_response(items):
+    return Response(stream_array(items), mimetype='application/json')
+
+
+# Streamed response with the JSON object {name: [items...], **fields}: the array
+# is streamed as in stream_response and the (small) fields follow it
+def stream_document(name, items, fields):
+    def chunks():
+        yield b'{' + dumps(name) + b':'
+        yield from stream_array(items)
+        for field, value in sorted(fields.items()):
+            yield b',' + dumps(field) + b':' + dumps(value)
+        yield b'}\n'
+    return Response(chunks(), mimetype='application/json')
@@ -0,0 +1,309 @@
+import contextlib
+import hashlib
+import json
+import mmap
+import os
+import struct
+from array import array
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+import aggregate
+import bulkmatch
+import detect
+import geogrid
+import query
+import stats
+import store
+import timeseries
+from ingest import READ_BUFFER_BYTES
+
+# Versioned binary snapshot of the ingested datasets.
+#
+# Parsing the CSV (or the JSON datasets in data/) is by far the slowest part of
+# starting the server, so after a load the three tables (columns, indexes and
+# sorted orders) are written to one file together with fingerprints of the
+# source files. On the next start the file is memory-mapped and the tables are
+# rebuilt on top of read-only views of the mapping - nothing is parsed or
+# copied until a table is appended to.
+#
+# Because the mapping is a shared, read-only file mapping, every server worker
+# process that loads the same snapshot (forked or started separately) uses the
+# same physical pages from the page cache: a worker's private memory does not
+# grow with the size of the datasets. build_lock() makes sure only one of the
+# workers starting together rebuilds a stale snapshot.
+#
+# Layout (little-endian):
+#   8 bytes   magic b'CTISNAP1'
+#   u32       format version
+#   u32       reserved (0)
+#   u64       header length
+#   header    UTF-8 JSON: source file fingerprints, per table metadata and the
+#             (offset, size, typecode) of each of its buffers, extras
+#   buffers   raw array contents, each starting on an 8-byte boundary
+#
+# Everything that grows with the data (strings included) is in the buffers,
+# so the header stays small and loading does not parse it. In the extras, an
+# array.array or bytes value at any depth is written as a buffer too, and
+# stands in the header as {BUFFER_KEY: [offset, size, typecode]}.
+#
+# The file is written next to its final name and renamed into place, so a
+# crash while writing never leaves a truncated snapshot behind.
+
+MAGIC = b'CTISNAP1'
+BUFFER_KEY = '$buffer'
+FORMAT_VERSION = 6
+PREAMBLE = struct.Struct('<8sIIQ')
+ALIGNMENT = 8
+
+# Dataset name -> (schema, indexed fields) of its table
+DATASET_TABLES = {
+    'threats': (store.THREAT_SCHEMA, store.THREAT_INDEXES),
+    'traffic': (store.TRAFFIC_SCHEMA, store.TRAFFIC_INDEXES),
+    'logins': (store.LOGIN_SCHEMA, store.LOGIN_INDEXES),
+}
+DATASETS = tuple(DATASET_TABLES)
+
+
+# Raised for unreadable or incompatible snapshot files
+class SnapshotError(ValueError):
+    pass
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BUFFER_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Identity of the source file a snapshot was built from
+def fingerprint(path, with_hash=True):
+    info = os.stat(path)
+    source = {'path': os.path.abspath(path), 'size': info.st_size, 'mtime_ns': info.st_mtime_ns}
+    if with_hash:
+        source['sha1'] = file_sha1(path)
+    return source
+
+
+# Whether a snapshot built from source still matches the file at path. Size
+# and modification time are checked first; if only the time changed (a copy
+# or a touch) the content hash decides.
+def source_is_fresh(source, path):
+    try:
+        current = fingerprint(path, with_hash=False)
+    except OSError:
+        return False
+    if current['size'] != source.get('size'):
+        return False
+    if current['mtime_ns'] == source.get('mtime_ns'):
+        return True
+    return file_sha1(path) == source.get('sha1')
+
+
+# Whether sources (fingerprints saved in a snapshot) match the files at paths
+def is_fresh(sources, paths):
+    paths = [os.path.abspath(path) for path in paths]
+    if [source.get('path') for source in sources] != paths:
+        return False
+    return all(source_is_fresh(source, path) for source, path in zip(sources, paths))
+
+
+def _typecode(data):
+    return data.typecode if hasattr(data, 'typecode') else memoryview(data).format
+
+
+def _padding(offset):
+    return -offset % ALIGNMENT
+
+
+# value with its array.array/bytes values replaced by {BUFFER_KEY: place(value)}
+def _extract_buffers(value, place):
+    if isinstance(value, dict):
+        return {key: _extract_buffers(item, place) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_extract_buffers(item, place) for item in value]
+    if isinstance(value, (array, bytes, bytearray, memoryview)):
+        return {BUFFER_KEY: place(value)}
+    return value
+
+
+# The reverse of _extract_buffers, with view(ref) giving the buffer of a ref
+def _resolve_buffers(value, view):
+    if isinstance(value, dict):
+        if BUFFER_KEY in value:
+            return view(value[BUFFER_KEY])
+        return {key: _resolve_buffers(item, view) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_resolve_buffers(item, view) for item in value]
+    return value
+
+
+# Write tables (dataset name -> store.Table) to path. sources are the
+# fingerprint()s of the files they were built from, extras any JSON-able data
+# to keep alongside (e.g. pre-aggregated statistics).
+def write(path, tables, sources, extras=None):
+    header = {'sources': sources, 'tables': {}}
+    buffers = []
+    offset = 0
+
+    # Lay data out after the previous buffer; returns its ref
+    def place(data):
+        nonlocal offset
+        view = memoryview(data).cast('B')
+        offset += _padding(offset)
+        ref = [offset, view.nbytes, _typecode(data)]
+        buffers.append((offset, view))
+        offset += view.nbytes
+        return ref
+
+    for name, table in tables.items():
+        meta, parts = table.export()
+        refs = {part: place(data) for part, data in parts.items()}
+        meta['fields'] = [field for field, _ in table.schema]
+        meta['buffers'] = refs
+        header['tables'][name] = meta
+    header['extras'] = _extract_buffers(extras or {}, place)
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    data_start = PREAMBLE.size + len(header_bytes)
+    data_start += _padding(data_start)
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b'\0' * (data_start - f.tell()))
+        for buffer_offset, view in buffers:
+            f.write(b'\0' * (data_start + buffer_offset - f.tell()))
+            f.write(view)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_header(f):
+    preamble = f.read(PREAMBLE.size)
+    if len(preamble) != PREAMBLE.size:
+        raise SnapshotError('truncated snapshot')
+    magic, version, _, header_length = PREAMBLE.unpack(preamble)
+    if magic != MAGIC:
+        raise SnapshotError('not a snapshot file')
+    if version != FORMAT_VERSION:
+        raise SnapshotError(f'unsupported snapshot version {version}')
+    header_bytes = f.read(header_length)
+    if len(header_bytes) != header_length:
+        raise SnapshotError('truncated snapshot')
+    data_start = PREAMBLE.size + header_length
+    return json.loads(header_bytes), data_start + _padding(data_start)
+
+
+# A loaded snapshot: tables (dataset name -> store.Table) backed by the
+# memory-mapped file, plus the extras saved with them. The mapping stays open
+# for as long as this object (or any table built from it) is alive.
+class Snapshot:
+    def __init__(self, path, source_paths=None):
+        with open(path, 'rb') as f:
+            header, data_start = read_header(f)
+            if source_paths is not None and not is_fresh(header['sources'], source_paths):
+                raise SnapshotError('snapshot is out of date')
+            self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = path
+        self.sources = header['sources']
+        view = memoryview(self.mapping)
+        if view.nbytes < data_start:
+            raise SnapshotError('truncated snapshot')
+
+        def buffer(ref):
+            offset, nbytes, typecode = ref
+            start = data_start + offset
+            if start + nbytes > view.nbytes:
+                raise SnapshotError('truncated snapshot')
+            return view[start:start + nbytes].cast(typecode)
+
+        self.extras = _resolve_buffers(header['extras'], buffer)
+        self.tables = {}
+        for name, meta in header['tables'].items():
+            schema, indexes = DATASET_TABLES[name]
+            if meta['fields'] != [field for field, _ in schema]:
+                raise SnapshotError(f"snapshot table '{name}' has a different schema")
+            buffers = {part: buffer(ref) for part, ref in meta['buffers'].items()}
+            self.tables[name] = store.Table(schema, indexes, (meta, buffers))
+
+    # The tables in dataset order (threats, traffic, logins)
+    def datasets(self):
+        return tuple(self.tables[name] for name in DATASETS)
+
+
+# The snapshot at path if it exists and was built from the current contents of
+# the files at source_paths, otherwise None
+def load(path, source_paths):
+    if not os.path.exists(path):
+        return None
+    try:
+        return Snapshot(path, source_paths)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Ignoring snapshot {path}: {e}")
+        return None
+
+
+# Extras holding the state of the observers attached to the tables: the
+# dashboard statistics, threat map grid, traffic rollups and detector alerts.
+# log is the position in the segment log (see segments.py) the tables are at:
+# the first segment not in them and the followed file and offset.
+def state_extras(group_stats, grid, rollups, detections, aggregates, matcher, log=None):
+    return {'stats': {name: group.state() for name, group in group_stats.items()},
+            'geo_grid': grid.state(), 'traffic_rollups': rollups.state(),
+            'detections': detections.state(), 'threat_aggregates': aggregates.state(),
+            'threat_matcher': matcher.state(),
+            'log': log or {'segment': 0, 'follow': None}}
+
+
+# Snapshot the dataset tables (threats, traffic, logins) built from the files
+# at source_paths, together with the sorted indexes the list endpoints use and
+# the state of the observers, and return it loaded from the new file
+def build(path, datasets, source_paths):
+    tables = dict(zip(DATASETS, datasets))
+    group_stats = stats.attach_dataset_stats(*datasets)
+    grid = tables['threats'].attach(geogrid.GeoGrid(tables['threats']))
+    rollups = tables['traffic'].attach(timeseries.TrafficRollups(tables['traffic']))
+    detections = detect.attach_detectors(tables['traffic'], tables['logins'])
+    aggregates = tables['threats'].attach(
+        aggregate.ThreatAggregates(tables['threats'], aggregate.capacity_from_env()))
+    matcher = tables['threats'].attach(bulkmatch.ThreatMatcher(tables['threats']))
+    for name, table in tables.items():
+        query.prepare(table, name)
+    write(path, tables, [fingerprint(source) for source in source_paths],
+          state_extras(group_stats, grid, rollups, detections, aggregates, matcher))
+    return Snapshot(path)
+
+
+# Hold an exclusive lock on path while rebuilding it, so server workers that
+# start together wait for the first one's snapshot instead of all building
+# their own (a no-op where fcntl is unavailable)
+@contextlib.contextmanager
+def build_lock(path):
+    if fcntl is None:
+        yield
+        return
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+# Dataset tables (threats, traffic, logins) read from the JSON exports in data/
+def read_json_datasets(paths):
+    factories = (store.threat_table, store.traffic_table, store.login_table)
+    datasets = []
+    for factory, path in zip(factories, paths):
+        with open(path, encoding='utf-8') as f:
+            datasets.append(factory(json.load(f)))
+    return tuple(datasets)
@@ -14,45 +14,73 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Set up tab switching
     setupTabs();
+
+    // Apply records pushed by the server as they arrive
+    startLiveUpdates();
 });
 
-// Function to load IP threats
-function loadIPThreats() {
-    fetch('/api/threats')
-        .then(response => response.json())
-        .then(threats => {
-            const tableBody = document.querySelector('#ip-threats-table tbody');
-            tableBody.innerHTML = '';
+// Number of rows requested per page from the list endpoints
+const PAGE_SIZE = 100;
 
-            threats.forEach(threat => {
-                const row = document.createElement('tr');
+// Function to fetch one page of a list endpoint
+function fetchPage(url, cursor) {
+    let pageUrl = `${url}?limit=${PAGE_SIZE}`;
+    if (cursor) {
+        pageUrl += `&cursor=${encodeURIComponent(cursor)}`;
+    }
+    return fetch(pageUrl).then(response => response.json());
+}
 
-                // Format date
-                const lastSeen = new Date(threat.lastSeen);
-                const formattedDate = lastSeen.toLocaleDateString() + ' ' + lastSeen.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
+// Tables that still have pages to load (live records are only appended to complete tables)
+const moreRowsAvailable = {};
 
-                row.innerHTML = `
-                    <td>${threat.ipAddress}</td>
-                    <td>${threat.type}</td>
-                    <td><span class="severity-badge ${threat.severity.toLowerCase()}">${threat.severity}</span></td>
-                    <td>${formattedDate}</td>
-                    <td>${threat.count}</td>
-                    <td><button class="button" data-threat-id="${threat.id}">Details</button></td>
-                `;
+// Highest record id shown in each table
+const lastShownId = {};
 
-                tableBody.appendChild(row);
-            });
+function noteShownRows(tableId, records) {
+    records.forEach(record => {
+        lastShownId[tableId] = Math.max(lastShownId[tableId] || 0, Number(record.id) || 0);
+    });
+}
 
-            // Add event listeners to detail buttons
-            document.querySelectorAll('#ip-threats-table button').forEach(button => {
-                button.addEventListener('click', function() {
-                    const threatId = this.getAttribute('data-threat-id');
-                    loadThreatDetails(threatId);
-                });
-            });
+// Function to show a "Load more" button under a table while more pages exist
+function updateLoadMore(tableId, nextCursor, loadNextPage) {
+    moreRowsAvailable[tableId] = Boolean(nextCursor);
+    const table = document.getElementById(tableId);
+    let button = table.parentNode.querySelector('.load-more');
+    if (!nextCursor) {
+        if (button) {
+            button.remove();
+        }
+        return;
+    }
+    if (!button) {
+        button = document.createElement('button');
+        button.className = 'button load-more';
+        button.textContent = 'Load more';
+        table.parentNode.appendChild(button);
+    }
+    button.onclick = () => loadNextPage(nextCursor);
+}
+
+// Function to load IP threats
+function loadIPThreats(cursor) {
+    fetchPage('/api/threats', cursor)
+        .then(page => {
+            const threats = page.items;
+            const tableBody = document.querySelector('#ip-threats-table tbody');
+            if (!cursor) {
+                tableBody.innerHTML = '';
+                lastShownId['ip-threats-table'] = 0;
+            }
+
+            threats.forEach(threat => tableBody.appendChild(threatRow(threat)));
+            noteShownRows('ip-threats-table', threats);
+
+            updateLoadMore('ip-threats-table', page.nextCursor, loadIPThreats);
 
             // Select the first threat by default if available
-            if (threats.length > 0) {
+            if (!cursor && threats.length > 0) {
                 loadThreatDetails(threats[0].id);
             }
         })
@@ -61,40 +89,73 @@ function loadIPThreats() {
         });
 }
 
+// Function to build the table row of a threat
+function threatRow(threat) {
+    const row = document.createElement('tr');
+
+    // Format date
+    const lastSeen = new Date(threat.lastSeen);
+    const formattedDate = lastSeen.toLocaleDateString() + ' ' + lastSeen.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
+
+    row.innerHTML = `
+        <td>${threat.ipAddress}</td>
+        <td>${threat.type}</td>
+        <td><span class="severity-badge ${threat.severity.toLowerCase()}">${threat.severity}</span></td>
+        <td>${formattedDate}</td>
+        <td>${threat.count}</td>
+        <td><button class="button" data-threat-id="${threat.id}">Details</button></td>
+    `;
+
+    // Add event listener to the detail button
+    row.querySelector('button').addEventListener('click', function() {
+        const threatId = this.getAttribute('data-threat-id');
+        loadThreatDetails(threatId);
+    });
+    return row;
+}
+
 // Function to load traffic analysis data
-function loadTrafficAnalysis() {
-    fetch('/api/traffic')
-        .then(response => response.json())
-        .then(trafficData => {
+function loadTrafficAnalysis(cursor) {
+    fetchPage('/api/traffic', cursor)
+        .then(page => {
+            const trafficData = page.items;
             const tableBody = document.querySelector('#traffic-table tbody');
-            tableBody.innerHTML = '';
-
-            trafficData.forEach(traffic => {
-                const row = document.createElement('tr');
-
-                // Format date
-                const timestamp = new Date(traffic.timestamp);
-                const formattedTime = timestamp.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
-
-                row.innerHTML = `
-                    <td>${formattedTime}</td>
-                    <td>${traffic.sourceIP}</td>
-                    <td>${traffic.destinationIP}</td>
-                    <td>${traffic.protocol}</td>
-                    <td>${traffic.port}</td>
-                    <td>${traffic.bytesTransferred.toLocaleString()}</td>
-                    <td>${traffic.packetsTransferred}</td>
-                    <td><span class="status-badge ${traffic.status.toLowerCase()}">${traffic.status}</span></td>
-                `;
-
-                tableBody.appendChild(row);
-            });
+            if (!cursor) {
+                tableBody.innerHTML = '';
+                lastShownId['traffic-table'] = 0;
+            }
+
+            trafficData.forEach(traffic => tableBody.appendChild(trafficRow(traffic)));
+            noteShownRows('traffic-table', trafficData);
+
+            updateLoadMore('traffic-table', page.nextCursor, loadTrafficAnalysis);
         })
         .catch(error => {
             console.error('Error loading traffic analysis:', error);
         });
 }
 
+// Function to build the table row of a traffic entry
+function trafficRow(traffic) {
+    const row = document.createElement('tr');
+
+    // Format date
+    const timestamp = new Date(traffic.timestamp);
+    const formattedTime = timestamp.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
+
+    row.innerHTML = `
+        <td>${formattedTime}</td>
+        <td>${traffic.sourceIP}</td>
+        <td>${traffic.destinationIP}</td>
+        <td>${traffic.protocol}</td>
+        <td>${traffic.port}</td>
+        <td>${traffic.bytesTransferred.toLocaleString()}</td>
+        <td>${traffic.packetsTransferred}</td>
+        <td><span class="status-badge ${traffic.status.toLowerCase()}">${traffic.status}</span></td>
+    `;
+    return row;
+}
+
 // Function to load threat details
 function loadThreatDetails(threatId) {
     fetch(`/api/threat/${threatId}`)
@@ -172,6 +233,7 @@ function setupTabs() {
 
 // Global variable to store the map
 let threatMap;
+let threatMarkers;
 
 // Function to initialize the map
 function initMap() {
@@ -186,63 +248,36 @@ function initMap() {
         maxZoom: 19
     }).addTo(threatMap);
 
-    // Load threat markers
+    // Threat markers live in their own layer so they can be reloaded
+    threatMarkers = L.layerGroup().addTo(threatMap);
+
+    // Load threat markers, and again for every new viewport
     loadThreatMarkers();
+    threatMap.on('moveend', loadThreatMarkers);
 }
 
-// Function to load threat markers on the map
+// Colors of the severity levels on the map
+const SEVERITY_COLORS = {high: '#d32f2f', medium: '#f9a825', low: '#43a047'};
+
+// Latest cluster request, so a slow response for an old viewport is ignored
+let markerRequest = 0;
+
+// Function to load the threat clusters of the visible part of the map
 function loadThreatMarkers() {
-    fetch('/api/threats')
+    const request = ++markerRequest;
+    const bbox = threatMap.getBounds().toBBoxString();
+    fetch(`/api/threats/clusters?bbox=${bbox}&zoom=${threatMap.getZoom()}`)
         .then(response => response.json())
-        .then(threats => {
-            threats.forEach(threat => {
-                if (threat.location) {
-                    // Determine marker color based on severity
-                    let markerColor;
-                    switch (threat.severity.toLowerCase()) {
-                        case 'high':
-                            markerColor = '#d32f2f';
-                            break;
-                        case 'medium':
-                            markerColor = '#f9a825';
-                            break;
-                        case 'low':
-                            markerColor = '#43a047';
-                            break;
-                        default:
-                            markerColor = '#2196f3';
-                    }
-
-                    // Create custom marker
-                    const marker = L.circleMarker([threat.location.lat, threat.location.lng], {
-                        radius: 8,
-                        fillColor: markerColor,
-                        color: '#fff',
-                        weight: 1,
-                        opacity: 1,
-                        fillOpacity: 0.8
-                    }).addTo(threatMap);
-
-                    // Add popup with threat information
-                    const popupContent = `
-                        <div class="marker-popup">
-                            <h3>${threat.ipAddress}</h3>
-                            <p><strong>Type:</strong> ${threat.type}</p>
-                            <p><strong>Severity:</strong> ${threat.severity}</p>
-                            <p><strong>Location:</strong> ${threat.location.city}, ${threat.location.country}</p>
-                            <p><strong>Count:</strong> ${threat.count}</p>
-                        </div>
-                    `;
-
-                    // Create and style the popup
-                    const popup = L.popup({
-                        className: 'dark-popup',
-                        closeButton: true,
-                        autoClose: true,
-                        closeOnEscapeKey: true
-                    }).setContent(popupContent);
-
-                    marker.bindPopup(popup);
+        .then(result => {
+            if (request !== markerRequest) {
+                return;
+            }
+            threatMarkers.clearLayers();
+            result.clusters.forEach(cluster => {
+                if (cluster.threat) {
+                    addThreatMarker(cluster.threat);
+                } else {
+                    addClusterMarker(cluster);
                 }
             });
         })
@@ -251,60 +286,102 @@ function loadThreatMarkers() {
         });
 }
 
-// Function to load login attempts
-function loadLoginAttempts() {
-    fetch('/api/login-attempts')
-        .then(response => response.json())
-        .then(loginAttempts => {
-            const tableBody = document.querySelector('#login-attempts-table tbody');
-            tableBody.innerHTML = '';
+// Reload the clusters shortly after live records arrive (once per burst)
+let markerReloadTimer = null;
 
-            loginAttempts.forEach(login => {
-                const row = document.createElement('tr');
+function scheduleThreatMarkerReload() {
+    if (markerReloadTimer === null) {
+        markerReloadTimer = setTimeout(() => {
+            markerReloadTimer = null;
+            loadThreatMarkers();
+        }, 1000);
+    }
+}
 
-                // Format date
-                const timestamp = new Date(login.timestamp);
-                const formattedDate = timestamp.toLocaleDateString() + ' ' + timestamp.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
+// Function to add the map marker of a cluster of threats: sized by the number
+// of threats, colored by the most common severity; clicking zooms in
+function addClusterMarker(cluster) {
+    const severities = Object.entries(cluster.severity).sort((a, b) => b[1] - a[1]);
+    const dominant = severities.length ? severities[0][0].toLowerCase() : '';
+    const marker = L.circleMarker([cluster.lat, cluster.lng], {
+        radius: Math.min(30, 8 + 3 * Math.log2(cluster.count)),
+        fillColor: SEVERITY_COLORS[dominant] || '#2196f3',
+        color: '#fff',
+        weight: 1,
+        opacity: 1,
+        fillOpacity: 0.7
+    }).addTo(threatMarkers);
+
+    const counts = severities.map(([severity, count]) => `${severity}: ${count}`).join(', ');
+    marker.bindTooltip(`${cluster.count} threats (${counts})`, {className: 'dark-popup'});
+    marker.on('click', () => {
+        threatMap.setView([cluster.lat, cluster.lng], Math.min(threatMap.getZoom() + 2, threatMap.getMaxZoom()));
+    });
+}
 
-                // Determine anomaly score class
-                let anomalyScoreClass = 'low';
-                if (login.anomalyScore > 70) {
-                    anomalyScoreClass = 'high';
-                } else if (login.anomalyScore > 30) {
-                    anomalyScoreClass = 'medium';
-                }
+// Function to add the map marker of a threat
+function addThreatMarker(threat) {
+    if (threat.location) {
+        // Determine marker color based on severity
+        const markerColor = SEVERITY_COLORS[threat.severity.toLowerCase()] || '#2196f3';
+
+        // Create custom marker
+        const marker = L.circleMarker([threat.location.lat, threat.location.lng], {
+            radius: 8,
+            fillColor: markerColor,
+            color: '#fff',
+            weight: 1,
+            opacity: 1,
+            fillOpacity: 0.8
+        }).addTo(threatMarkers);
+
+        // Add popup with threat information
+        const popupContent = `
+            <div class="marker-popup">
+                <h3>${threat.ipAddress}</h3>
+                <p><strong>Type:</strong> ${threat.type}</p>
+                <p><strong>Severity:</strong> ${threat.severity}</p>
+                <p><strong>Location:</strong> ${threat.location.city}, ${threat.location.country}</p>
+                <p><strong>Count:</strong> ${threat.count}</p>
+            </div>
+        `;
+
+        // Create and style the popup
+        const popup = L.popup({
+            className: 'dark-popup',
+            closeButton: true,
+            autoClose: true,
+            closeOnEscapeKey: true
+        }).setContent(popupContent);
+
+        marker.bindPopup(popup);
+    }
+}
 
-                // Create anomaly score indicator
-                const anomalyScoreHTML = `
-                    <div class="anomaly-score">
-                        <div class="anomaly-score-fill ${anomalyScoreClass}" style="width: ${login.anomalyScore}%;"></div>
-                        <div class="anomaly-score-text">${Math.round(login.anomalyScore)}</div>
-                    </div>
-                `;
-
-                row.innerHTML = `
-                    <td>${formattedDate}</td>
-                    <td>${login.username}</td>
-                    <td>${login.ipAddress}</td>
-                    <td>${login.behaviorType}</td>
-                    <td><span class="status-badge ${login.status.toLowerCase()}">${login.status}</span></td>
-                    <td>${anomalyScoreHTML}</td>
-                    <td><button class="button" data-login-id="${login.id}">Details</button></td>
-                `;
-
-                tableBody.appendChild(row);
-            });
+// Function to load login attempts
+// Login attempts loaded so far (the details panel reads from here)
+let loadedLoginAttempts = [];
 
-            // Add event listeners to detail buttons
-            document.querySelectorAll('#login-attempts-table button').forEach(button => {
-                button.addEventListener('click', function() {
-                    const loginId = this.getAttribute('data-login-id');
-                    loadLoginDetails(loginId, loginAttempts);
-                });
-            });
+function loadLoginAttempts(cursor) {
+    fetchPage('/api/login-attempts', cursor)
+        .then(page => {
+            const pageAttempts = page.items;
+            const tableBody = document.querySelector('#login-attempts-table tbody');
+            if (!cursor) {
+                tableBody.innerHTML = '';
+                loadedLoginAttempts = [];
+                lastShownId['login-attempts-table'] = 0;
+            }
+            loadedLoginAttempts = loadedLoginAttempts.concat(pageAttempts);
+            const loginAttempts = loadedLoginAttempts;
+
+            pageAttempts.forEach(login => tableBody.appendChild(loginRow(login)));
+            noteShownRows('login-attempts-table', pageAttempts);
+
+            updateLoadMore('login-attempts-table', page.nextCursor, loadLoginAttempts);
 
             // Select the first login attempt by default if available
-            if (loginAttempts.length > 0) {
+            if (!cursor && loginAttempts.length > 0) {
                 loadLoginDetails(loginAttempts[0].id, loginAttempts);
             }
         })
@@ -313,6 +390,48 @@ function loadLoginAttempts() {
         });
 }
 
+// Function to build the table row of a login attempt
+function loginRow(login) {
+    const row = document.createElement('tr');
+
+    // Format date
+    const timestamp = new Date(login.timestamp);
+    const formattedDate = timestamp.toLocaleDateString() + ' ' + timestamp.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
+
+    // Determine anomaly score class
+    let anomalyScoreClass = 'low';
+    if (login.anomalyScore > 70) {
+        anomalyScoreClass = 'high';
+    } else if (login.anomalyScore > 30) {
+        anomalyScoreClass = 'medium';
+    }
+
+    // Create anomaly score indicator
+    const anomalyScoreHTML = `
+        <div class="anomaly-score">
+            <div class="anomaly-score-fill ${anomalyScoreClass}" style="width: ${login.anomalyScore}%;"></div>
+            <div class="anomaly-score-text">${Math.round(login.anomalyScore)}</div>
+        </div>
+    `;
+
+    row.innerHTML = `
+        <td>${formattedDate}</td>
+        <td>${login.username}</td>
+        <td>${login.ipAddress}</td>
+        <td>${login.behaviorType}</td>
+        <td><span class="status-badge ${login.status.toLowerCase()}">${login.status}</span></td>
+        <td>${anomalyScoreHTML}</td>
+        <td><button class="button" data-login-id="${login.id}">Details</button></td>
+    `;
+
+    // Add event listener to the detail button
+    row.querySelector('button').addEventListener('click', function() {
+        const loginId = this.getAttribute('data-login-id');
+        loadLoginDetails(loginId, loadedLoginAttempts);
+    });
+    return row;
+}
+
 // Function to load login details
 function loadLoginDetails(loginId, loginAttempts) {
     const login = loginAttempts.find(l => l.id === loginId);
@@ -356,35 +475,63 @@ function loadLoginDetails(loginId, loginAttempts) {
     `;
 }
 
+// Chart objects, kept so live updates can refresh their data
+const charts = {};
+
 // Function to initialize all charts
 function initCharts() {
-    // Fetch data for charts
-    Promise.all([
-        fetch('/api/threats').then(response => response.json()),
-        fetch('/api/traffic').then(response => response.json())
-    ])
-    .then(([threats, traffic]) => {
-        createThreatTypesChart(threats);
-        createSeverityChart(threats);
-        createProtocolChart(traffic);
-        createActionChart(traffic);
+    // Fetch pre-aggregated counts for the charts
+    fetch('/api/stats')
+    .then(response => response.json())
+    .then(stats => {
+        charts.threatTypes = createThreatTypesChart(stats.threats.byType);
+        charts.severity = createSeverityChart(stats.threats.bySeverity);
+        charts.protocol = createProtocolChart(stats.traffic.byProtocol);
+        charts.action = createActionChart(stats.traffic.byStatus);
     })
     .catch(error => {
         console.error('Error loading chart data:', error);
     });
 }
 
-// Function to create Threat Types Distribution chart
-function createThreatTypesChart(threats) {
-    // Count threats by type
-    const threatTypes = {};
-    threats.forEach(threat => {
-        if (!threatTypes[threat.type]) {
-            threatTypes[threat.type] = 0;
-        }
-        threatTypes[threat.type]++;
+// Function to replace the data of the charts with new counts
+function updateCharts(stats) {
+    if (!charts.threatTypes) {
+        return;
+    }
+    const counts = [
+        [charts.threatTypes, stats.threats.byType],
+        [charts.severity, severityCounts(stats.threats.bySeverity)],
+        [charts.protocol, stats.traffic.byProtocol],
+        [charts.action, actionCounts(stats.traffic.byStatus)]
+    ];
+    counts.forEach(([chart, values]) => {
+        chart.data.labels = Object.keys(values);
+        chart.data.datasets[0].data = Object.values(values);
+        chart.update();
     });
+}
 
+// Threat counts by severity, in a fixed order
+function severityCounts(counts) {
+    return {
+        'High': counts['High'] || 0,
+        'Medium': counts['Medium'] || 0,
+        'Low': counts['Low'] || 0
+    };
+}
+
+// Traffic counts by action taken (status), in a fixed order
+function actionCounts(counts) {
+    return {
+        'Blocked': counts['Blocked'] || 0,
+        'Allowed': counts['Allowed'] || 0,
+        'Flagged': counts['Flagged'] || 0
+    };
+}
+
+// Function to create Threat Types Distribution chart
+function createThreatTypesChart(threatTypes) {
     // Prepare data for chart
     const labels = Object.keys(threatTypes);
     const data = Object.values(threatTypes);
@@ -399,7 +546,7 @@ function createThreatTypesChart(threats) {
 
     // Create chart
     const ctx = document.getElementById('threatTypesChart').getContext('2d');
-    new Chart(ctx, {
+    return new Chart(ctx, {
         type: 'pie',
         data: {
             labels: labels,
@@ -444,23 +591,11 @@ function createThreatTypesChart(threats) {
 }
 
 // Function to create Severity Distribution chart
-function createSeverityChart(threats) {
-    // Count threats by severity
-    const severityCounts = {
-        'High': 0,
-        'Medium': 0,
-        'Low': 0
-    };
-
-    threats.forEach(threat => {
-        if (severityCounts.hasOwnProperty(threat.severity)) {
-            severityCounts[threat.severity]++;
-        }
-    });
-
+function createSeverityChart(counts) {
     // Prepare data for chart
-    const labels = Object.keys(severityCounts);
-    const data = Object.values(severityCounts);
+    const ordered = severityCounts(counts);
+    const labels = Object.keys(ordered);
+    const data = Object.values(ordered);
     const backgroundColors = [
         'rgba(255, 82, 82, 0.7)',  // High - Red
         'rgba(255, 171, 64, 0.7)', // Medium - Orange
@@ -469,7 +604,7 @@ function createSeverityChart(threats) {
 
     // Create chart
     const ctx = document.getElementById('severityChart').getContext('2d');
-    new Chart(ctx, {
+    return new Chart(ctx, {
         type: 'doughnut',
         data: {
             labels: labels,
@@ -514,16 +649,7 @@ function createSeverityChart(threats) {
 }
 
 // Function to create Protocol Distribution chart
-function createProtocolChart(traffic) {
-    // Count traffic by protocol
-    const protocolCounts = {};
-    traffic.forEach(entry => {
-        if (!protocolCounts[entry.protocol]) {
-            protocolCounts[entry.protocol] = 0;
-        }
-        protocolCounts[entry.protocol]++;
-    });
-
+function createProtocolChart(protocolCounts) {
     // Prepare data for chart
     const labels = Object.keys(protocolCounts);
     const data = Object.values(protocolCounts);
@@ -535,7 +661,7 @@ function createProtocolChart(traffic) {
 
     // Create chart
     const ctx = document.getElementById('protocolChart').getContext('2d');
-    new Chart(ctx, {
+    return new Chart(ctx, {
         type: 'bar',
         data: {
             labels: labels,
@@ -594,23 +720,11 @@ function createProtocolChart(traffic) {
 }
 
 // Function to create Action Taken Distribution chart
-function createActionChart(traffic) {
-    // Count traffic by action taken (status)
-    const actionCounts = {
-        'Blocked': 0,
-        'Allowed': 0,
-        'Flagged': 0
-    };
-
-    traffic.forEach(entry => {
-        if (actionCounts.hasOwnProperty(entry.status)) {
-            actionCounts[entry.status]++;
-        }
-    });
-
+function createActionChart(counts) {
     // Prepare data for chart
-    const labels = Object.keys(actionCounts);
-    const data = Object.values(actionCounts);
+    const ordered = actionCounts(counts);
+    const labels = Object.keys(ordered);
+    const data = Object.values(ordered);
     const backgroundColors = [
         'rgba(255, 82, 82, 0.7)',   // Blocked - Red
         'rgba(105, 240, 174, 0.7)', // Allowed - Green
@@ -619,7 +733,7 @@ function createActionChart(traffic) {
 
     // Create chart
     const ctx = document.getElementById('actionChart').getContext('2d');
-    new Chart(ctx, {
+    return new Chart(ctx, {
         type: 'polarArea',
         data: {
             labels: labels,
@@ -672,4 +786,59 @@ function createActionChart(traffic) {
             }
         }
     });
-}
\ No newline at end of file
+}
+// Tables updated by live events: dataset name in the event -> table, row builder and loader
+const liveTables = {
+    threats: {tableId: 'ip-threats-table', row: threatRow, reload: loadIPThreats},
+    traffic: {tableId: 'traffic-table', row: trafficRow, reload: loadTrafficAnalysis},
+    logins: {tableId: 'login-attempts-table', row: loginRow, reload: loadLoginAttempts}
+};
+
+// Function to apply the records the server pushes over /api/stream
+function startLiveUpdates() {
+    if (!window.EventSource) {
+        return;
+    }
+    const source = new EventSource('/api/stream');
+
+    source.addEventListener('delta', event => {
+        const payload = JSON.parse(event.data);
+        Object.entries(liveTables).forEach(([name, live]) => {
+            const records = payload[name] || [];
+            if (records.length === 0 || moreRowsAvailable[live.tableId]) {
+                return;
+            }
+            const lastId = lastShownId[live.tableId] || 0;
+            if (payload.dropped[name] > 0 || Number(records[0].id) > lastId + 1) {
+                // Some records were not sent (or an event was missed): reload the table
+                live.reload();
+                return;
+            }
+            const newRecords = records.filter(record => Number(record.id) > lastId);
+            const tableBody = document.querySelector(`#${live.tableId} tbody`);
+            newRecords.forEach(record => tableBody.appendChild(live.row(record)));
+            noteShownRows(live.tableId, newRecords);
+            if (name === 'logins') {
+                loadedLoginAttempts = loadedLoginAttempts.concat(newRecords);
+            }
+        });
+        if ((payload.threats || []).length > 0) {
+            scheduleThreatMarkerReload();
+        }
+        if (payload.stats) {
+            updateCharts(payload.stats);
+        }
+    });
+
+    // The server dropped events for this client: reload everything
+    source.addEventListener('resync', () => {
+        Object.values(liveTables).forEach(live => live.reload());
+        loadThreatMarkers();
+        fetch('/api/stats')
+            .then(response => response.json())
+            .then(updateCharts)
+            .catch(error => {
+                console.error('Error loading chart data:', error);
+            });
+    });
+}
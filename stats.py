@@ -0,0 +1,85 @@
+from array import array
+from collections import Counter
+
+from query import normalize_time
+from store import pack_strings, unpack_strings
+
+# Pre-aggregated group-by counts and time histograms for the dashboard charts.
+#
+# A GroupStats is attached to a table and updated on every append, so serving
+# /api/stats never touches the records themselves.
+
+# Histogram bucket sizes: number of leading characters of a normalized
+# "YYYY-MM-DD HH:MM:SS" timestamp that identify the bucket
+BUCKETS = {'hour': 13, 'day': 10, 'month': 7}
+
+# Per dataset: response name -> category field to count by, and the time field
+DATASET_GROUPS = {
+    'threats': ({'byType': 'type', 'bySeverity': 'severity', 'byCountry': 'location.country'}, 'lastSeen'),
+    'traffic': ({'byProtocol': 'protocol', 'byStatus': 'status'}, 'timestamp'),
+    'logins': ({'byStatus': 'status', 'byBehaviorType': 'behaviorType'}, 'timestamp'),
+}
+
+
+# Counts of one table grouped by some category fields, plus hourly counts
+# (state is a previous state(), e.g. from a snapshot of the same table)
+class GroupStats:
+    def __init__(self, table, groups, time_field=None, state=None):
+        self.groups = [(name, table.columns[field]) for name, field in groups.items()]
+        self.counters = {name: Counter() for name in groups}
+        self.time_column = table.columns[time_field] if time_field else None
+        self.hours = Counter()
+        self.total = 0
+        if state is not None:
+            self.total = state['total']
+            for name, pairs in state['counters'].items():
+                self.counters[name].update(dict(pairs))
+            hours = state['hours']
+            self.hours.update(zip(unpack_strings(hours['buffer'], hours['offsets']), hours['counts']))
+
+    def add(self, row):
+        self.total += 1
+        counters = self.counters
+        for name, column in self.groups:
+            counters[name][column.key(row)] += 1
+        if self.time_column is not None:
+            self.hours[normalize_time(self.time_column.get(row))[:BUCKETS['hour']]] += 1
+
+    # Record counts per time bucket ('hour', 'day' or 'month'), oldest first
+    def histogram(self, bucket):
+        width = BUCKETS[bucket]
+        counts = Counter()
+        for hour, count in self.hours.items():
+            counts[hour[:width]] += count
+        return dict(sorted(counts.items()))
+
+    def to_dict(self, bucket=None):
+        result = {'total': self.total}
+        for name, column in self.groups:
+            result[name] = {column.values[code]: count for code, count in self.counters[name].items()}
+        if bucket is not None and self.time_column is not None:
+            result['histogram'] = self.histogram(bucket)
+        return result
+
+    # Snapshot state: counters as [code, count] pairs of the category codes,
+    # hourly counts as arrays (hour strings in a UTF-8 buffer, see pack_strings)
+    def state(self):
+        hours = list(self.hours.items())
+        buffer, offsets = pack_strings(hour for hour, _ in hours)
+        return {
+            'total': self.total,
+            'counters': {name: sorted(counter.items()) for name, counter in self.counters.items()},
+            'hours': {'buffer': buffer, 'offsets': offsets, 'counts': array('q', (count for _, count in hours))},
+        }
+
+
+# Attach the dashboard statistics to the three dataset tables. states maps
+# dataset names to saved GroupStats.state() values covering their first rows.
+def attach_dataset_stats(ip_threats, traffic_analysis, login_attempts, states=None):
+    tables = {'threats': ip_threats, 'traffic': traffic_analysis, 'logins': login_attempts}
+    states = states or {}
+    result = {}
+    for name, (groups, time_field) in DATASET_GROUPS.items():
+        group_stats = GroupStats(tables[name], groups, time_field, states.get(name))
+        result[name] = tables[name].attach(group_stats, replay_from=group_stats.total)
+    return result
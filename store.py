@@ -0,0 +1,1264 @@
+import bisect
+import collections
+import ipaddress
+import itertools
+import operator
+import re
+import socket
+import sys
+import threading
+from array import array
+from datetime import date, datetime
+
+# Columnar in-memory storage for the three datasets.
+#
+# Every field lives in its own column: numbers in typed arrays, low-cardinality
+# strings dictionary-encoded, names and free text in one UTF-8 buffer with
+# offsets and IP addresses packed to 32 bits (IPv4) or 128 bits (IPv6).
+# Records are only turned back into dicts when a row is read, which keeps
+# per-record overhead to a few dozen bytes instead of several hundred for a
+# nested dict.
+#
+# Columns and indexes can also be exported as flat buffers and restored on top
+# of memoryviews (see snapshot.py); such read-only buffers are copied into
+# mutable ones the first time a row is appended.
+#
+# Appending is split in two: every column first prepares its value (checks it
+# and converts it to what it stores), which raises ValueError, TypeError or
+# OverflowError for one it cannot hold, and only then are the prepared values
+# committed. A record that does not fit leaves the table as it was.
+
+
+# Mutable copy of a (possibly memory-mapped) typed buffer
+def mutable_array(data):
+    if isinstance(data, array):
+        return data
+    copy = array(data.format)
+    copy.frombytes(data.cast('B'))
+    return copy
+
+
+def mutable_bytes(data):
+    return data if isinstance(data, bytearray) else bytearray(data)
+
+
+# Fixed-width numbers (ints or floats) in an array.array
+class NumberColumn:
+    # Integer typecodes to widen to when a value does not fit
+    WIDER = {'b': 'h', 'h': 'i', 'i': 'q', 'B': 'H', 'H': 'I', 'I': 'Q'}
+
+    def __init__(self, typecode, data=None):
+        self.data = array(typecode) if data is None else data
+        # One-item array of the widest typecode this column can reach
+        widest = self.data.format if not isinstance(self.data, array) else self.data.typecode
+        while widest in self.WIDER:
+            widest = self.WIDER[widest]
+        self.probe = array(widest, [0])
+
+    # The value itself, once the widest array has accepted it
+    def prepare(self, value):
+        self.probe[0] = value
+        return value
+
+    def commit(self, value):
+        data = self.data
+        if not isinstance(data, array):
+            data = self.data = mutable_array(data)
+        try:
+            data.append(value)
+        except OverflowError:
+            self.data = array(self.WIDER[data.typecode], data)
+            self.commit(value)
+
+    def append(self, value):
+        self.commit(self.prepare(value))
+
+    def get(self, i):
+        return self.data[i]
+
+    # Index keys: the value itself
+    def key(self, i):
+        return self.data[i]
+
+    def key_for(self, value):
+        return value
+
+    def __len__(self):
+        return len(self.data)
+
+    def memory_bytes(self):
+        return self.data.itemsize * len(self.data)
+
+    def export(self):
+        return {'kind': 'number'}, {'data': self.data}
+
+    @classmethod
+    def restore(cls, meta, buffers):
+        return cls(buffers['data'].format, buffers['data'])
+
+
+# Dictionary-encoded strings: each row stores a small integer code into a
+# shared list of distinct values
+class CategoryColumn:
+    def __init__(self, values=None, codes=None):
+        self.values = list(values or ())
+        self.lookup = {value: code for code, value in enumerate(self.values)}
+        self.codes = array('H') if codes is None else codes
+
+    def code_for(self, value):
+        code = self.lookup.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.lookup[value] = code
+            if code > 0xFFFF and self.codes.itemsize < 4:
+                self.codes = array('I', self.codes)
+        return code
+
+    # The value itself, once it is known to be hashable (its code is only
+    # assigned by commit)
+    def prepare(self, value):
+        hash(value)
+        return value
+
+    def commit(self, value):
+        code = self.code_for(value)
+        if not isinstance(self.codes, array):
+            self.codes = mutable_array(self.codes)
+        self.codes.append(code)
+
+    def append(self, value):
+        self.commit(self.prepare(value))
+
+    def get(self, i):
+        return self.values[self.codes[i]]
+
+    # Index keys: the dictionary code (None for values never seen)
+    def key(self, i):
+        return self.codes[i]
+
+    def key_for(self, value):
+        return self.lookup.get(value)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def memory_bytes(self):
+        return (self.codes.itemsize * len(self.codes) +
+                sum(sys.getsizeof(value) for value in self.values))
+
+    def export(self):
+        values, offsets = pack_strings(self.values)
+        return {'kind': 'category'}, {'codes': self.codes, 'values': values, 'valueOffsets': offsets}
+
+    @classmethod
+    def restore(cls, meta, buffers):
+        return cls(unpack_strings(buffers['values'], buffers['valueOffsets']), buffers['codes'])
+
+
+# Free text: all values concatenated in one UTF-8 buffer, row i spans
+# offsets[i]:offsets[i + 1]
+class StringColumn:
+    def __init__(self, buffer=None, offsets=None):
+        self.buffer = bytearray() if buffer is None else buffer
+        self.offsets = array('Q', [0]) if offsets is None else offsets
+
+    # The UTF-8 bytes of value (TypeError for anything but a string, a
+    # UnicodeEncodeError for a lone surrogate); b'' for None or ''
+    def prepare(self, value):
+        return str.encode(value, 'utf-8') if value else b''
+
+    def commit(self, data):
+        if not isinstance(self.offsets, array):
+            self.buffer = mutable_bytes(self.buffer)
+            self.offsets = mutable_array(self.offsets)
+        self.buffer += data
+        self.offsets.append(len(self.buffer))
+
+    def append(self, value):
+        self.commit(self.prepare(value))
+
+    def get(self, i):
+        if i < 0:
+            i += len(self)
+        return str(self.buffer[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    def key(self, i):
+        return self.get(i)
+
+    def key_for(self, value):
+        return value
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def memory_bytes(self):
+        return len(self.buffer) + self.offsets.itemsize * len(self.offsets)
+
+    def export(self):
+        return {'kind': 'string'}, {'buffer': self.buffer, 'offsets': self.offsets}
+
+    @classmethod
+    def restore(cls, meta, buffers):
+        return cls(buffers['buffer'], buffers['offsets'])
+
+
+# A list of strings as (UTF-8 buffer, offsets) buffers, as StringColumn keeps
+# them, and back; for exporting lists of strings without putting them in the
+# snapshot header
+def pack_strings(values):
+    column = StringColumn()
+    for value in values:
+        column.append(value)
+    return column.buffer, column.offsets
+
+
+def unpack_strings(buffer, offsets):
+    column = StringColumn(buffer, offsets)
+    return [column.get(i) for i in range(len(column))]
+
+
+# Short strings with too many distinct values to dictionary-encode (usernames,
+# devices, cities): stored like free text, but looked up by whole value
+# through a NameIndex instead of being tokenized
+class NameColumn(StringColumn):
+    def export(self):
+        return {'kind': 'name'}, {'buffer': self.buffer, 'offsets': self.offsets}
+
+
+IPV6_KEY_BIT = 1 << 128
+
+
+# 32-bit value of a canonically written IPv4 address (what str(IPv4Address)
+# gives), None for anything else. Several times faster than ipaddress.
+def ipv4_value(value):
+    try:
+        packed = socket.inet_pton(socket.AF_INET, value)
+    except (OSError, ValueError, TypeError):
+        return None
+    if socket.inet_ntoa(packed) != value:
+        return None
+    return int.from_bytes(packed, 'big')
+
+
+# Epoch seconds of timestamps that are missing or do not parse
+NO_TIME = -(1 << 63)
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+# Seconds since the Unix epoch of a "2023-05-30 06:33:58" or ISO 8601
+# timestamp (UTC unless it carries an offset), NO_TIME if there is none
+def epoch_seconds(value):
+    try:
+        moment = datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        return NO_TIME
+    seconds = ((moment.toordinal() - _EPOCH_ORDINAL) * 86400
+               + moment.hour * 3600 + moment.minute * 60 + moment.second)
+    offset = moment.utcoffset()
+    if offset:
+        seconds -= int(offset.total_seconds())
+    return seconds
+
+
+# IP addresses packed into integers. kinds[i] says how row i is stored:
+# IPv4 keeps its 32-bit value in slots[i]; IPv6 keeps an index into the
+# 16-byte-per-address wide buffer; anything that does not parse keeps an index
+# into the (normally empty) list of raw strings.
+class IPColumn:
+    IPV4 = 0
+    IPV6 = 1
+    EMPTY = 2
+    OTHER = 3
+
+    def __init__(self, kinds=None, slots=None, wide=None, other=None):
+        self.kinds = bytearray() if kinds is None else kinds
+        self.slots = array('I') if slots is None else slots
+        self.wide = bytearray() if wide is None else wide
+        self.other = list(other or ())
+
+    def prepare(self, value):
+        if value and not isinstance(value, str):
+            raise TypeError(f'IP address must be a string, not {type(value).__name__}')
+        return value
+
+    def commit(self, value):
+        if not isinstance(self.slots, array):
+            self.kinds = mutable_bytes(self.kinds)
+            self.slots = mutable_array(self.slots)
+            self.wide = mutable_bytes(self.wide)
+        if not value:
+            self.kinds.append(self.EMPTY)
+            self.slots.append(0)
+            return
+        packed = ipv4_value(value)
+        if packed is not None:
+            self.kinds.append(self.IPV4)
+            self.slots.append(packed)
+            return
+        try:
+            address = ipaddress.ip_address(value)
+        except ValueError:
+            address = None
+        # Only canonical spellings are packed, so reading back gives the same string
+        if address is not None and str(address) == value:
+            if address.version == 4:
+                self.kinds.append(self.IPV4)
+                self.slots.append(int(address))
+            else:
+                self.kinds.append(self.IPV6)
+                self.slots.append(len(self.wide) // 16)
+                self.wide += address.packed
+            return
+        self.kinds.append(self.OTHER)
+        self.slots.append(len(self.other))
+        self.other.append(value)
+
+    def append(self, value):
+        self.commit(self.prepare(value))
+
+    # Packed form of row i: (4, int), (6, int) or (None, raw string)
+    def packed(self, i):
+        kind = self.kinds[i]
+        slot = self.slots[i]
+        if kind == self.IPV4:
+            return 4, slot
+        if kind == self.IPV6:
+            return 6, int.from_bytes(self.wide[slot * 16:slot * 16 + 16], 'big')
+        if kind == self.EMPTY:
+            return None, ''
+        return None, self.other[slot]
+
+    # Network-order bytes of row i as socket.inet_pton gives them (4 for IPv4,
+    # 16 for IPv6), None if it is not an address
+    def address_bytes(self, i):
+        kind = self.kinds[i]
+        slot = self.slots[i]
+        if kind == self.IPV4:
+            return slot.to_bytes(4, 'big')
+        if kind == self.IPV6:
+            return bytes(self.wide[slot * 16:slot * 16 + 16])
+        return None
+
+    # Index keys: IPv4 as its 32-bit value, IPv6 as its 128-bit value with bit
+    # 128 set (so ::1.2.3.4 and 1.2.3.4 differ), anything else as the raw string
+    def key(self, i):
+        kind = self.kinds[i]
+        slot = self.slots[i]
+        if kind == self.IPV4:
+            return slot
+        if kind == self.IPV6:
+            return int.from_bytes(self.wide[slot * 16:slot * 16 + 16], 'big') | IPV6_KEY_BIT
+        if kind == self.EMPTY:
+            return ''
+        return self.other[slot]
+
+    # Sort key: the index key for addresses, -1 (sorting first) for the rest
+    def sort_key(self, i):
+        return self.key(i) if self.kinds[i] <= self.IPV6 else -1
+
+    @staticmethod
+    def key_for(value):
+        if not value:
+            return ''
+        packed = ipv4_value(value)
+        if packed is not None:
+            return packed
+        try:
+            address = ipaddress.ip_address(value)
+        except ValueError:
+            return value
+        return int(address) if address.version == 4 else int(address) | IPV6_KEY_BIT
+
+    def get(self, i):
+        kind = self.kinds[i]
+        slot = self.slots[i]
+        if kind == self.IPV4:
+            # Same dotted-quad text as str(IPv4Address(slot)), several times faster
+            return socket.inet_ntoa(slot.to_bytes(4, 'big'))
+        if kind == self.IPV6:
+            return str(ipaddress.IPv6Address(bytes(self.wide[slot * 16:slot * 16 + 16])))
+        if kind == self.EMPTY:
+            return ''
+        return self.other[slot]
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def memory_bytes(self):
+        return (len(self.kinds) + self.slots.itemsize * len(self.slots) + len(self.wide) +
+                sum(sys.getsizeof(value) for value in self.other))
+
+    def export(self):
+        other, offsets = pack_strings(self.other)
+        return ({'kind': 'ip'},
+                {'kinds': self.kinds, 'slots': self.slots, 'wide': self.wide, 'other': other,
+                 'otherOffsets': offsets})
+
+    @classmethod
+    def restore(cls, meta, buffers):
+        return cls(buffers['kinds'], buffers['slots'], buffers['wide'],
+                   unpack_strings(buffers['other'], buffers['otherOffsets']))
+
+
+COLUMN_KINDS = {
+    'number': NumberColumn,
+    'category': CategoryColumn,
+    'string': StringColumn,
+    'name': NameColumn,
+    'ip': IPColumn,
+}
+
+
+# Row position by record id. Ids written by ingest are "1".."n" in row order,
+# which is answered arithmetically without storing anything; any other id is
+# kept in a dict. Like the old linear scan, the first row with an id wins.
+class IdIndex:
+    def __init__(self, column, sparse=None):
+        self.column = column
+        self.sparse = dict(sparse or ())
+
+    def add(self, row):
+        value = self.column.get(row)
+        if value != str(row + 1):
+            self.sparse.setdefault(value, row)
+
+    def get(self, value):
+        row = self.sparse.get(value)
+        # Only ASCII digits short enough to be a row position can be a dense id
+        # ('²'.isdigit() is true, and int() refuses over 4300 digits)
+        if value.isascii() and value.isdigit() and len(value) <= len(str(len(self.column))):
+            dense = int(value) - 1
+            if 0 <= dense < len(self.column) and self.column.get(dense) == value:
+                row = dense if row is None else min(row, dense)
+        return row
+
+    def __len__(self):
+        return len(self.column)
+
+    def export(self):
+        ids, offsets = pack_strings(self.sparse)
+        return {}, {'ids': ids, 'idOffsets': offsets, 'rows': array('I', self.sparse.values())}
+
+    @classmethod
+    def restore(cls, column, meta, buffers):
+        return cls(column, zip(unpack_strings(buffers['ids'], buffers['idOffsets']), buffers['rows']))
+
+
+EMPTY_POSITIONS = array('I')
+
+
+# Secondary index over a category column: dictionary code -> array of row
+# positions in ascending order. A restored index keeps its postings in one
+# flat rows buffer (code c spans rows[offsets[c]:offsets[c + 1]]); a code's
+# postings are copied out of it the first time a row with that code is added.
+class ValueIndex:
+    def __init__(self, column, offsets=None, rows=None):
+        self.column = column
+        self.postings = {}
+        self.base_offsets = offsets
+        self.base_rows = rows
+
+    def _base(self, key):
+        offsets = self.base_offsets
+        if offsets is None or key + 1 >= len(offsets):
+            return None
+        return self.base_rows[offsets[key]:offsets[key + 1]]
+
+    def add(self, row):
+        key = self.column.key(row)
+        postings = self.postings.get(key)
+        if postings is None:
+            base = self._base(key)
+            postings = self.postings[key] = array('I') if base is None else mutable_array(base)
+        postings.append(row)
+
+    def _postings(self, key):
+        postings = self.postings.get(key)
+        if postings is None:
+            postings = self._base(key)
+        return postings if postings is not None else EMPTY_POSITIONS
+
+    def get(self, value):
+        key = self.column.key_for(value)
+        if key is None:
+            return EMPTY_POSITIONS
+        return self._postings(key)
+
+    # Distinct values with their row counts
+    def counts(self):
+        counts = {}
+        for code, value in enumerate(self.column.values):
+            size = len(self._postings(code))
+            if size:
+                counts[value] = size
+        return counts
+
+    def memory_bytes(self):
+        return sum(rows.itemsize * len(rows) for rows in self.postings.values())
+
+    def export(self):
+        offsets = array('Q', [0])
+        rows = array('I')
+        for code in range(len(self.column.values)):
+            rows.extend(self._postings(code))
+            offsets.append(len(rows))
+        return {}, {'offsets': offsets, 'rows': rows}
+
+    @classmethod
+    def restore(cls, column, meta, buffers):
+        return cls(column, buffers['offsets'], buffers['rows'])
+
+
+# Equality lookups on an IP column, answered by binary search over the
+# column's sorted index (so nothing per address has to be kept in a dict)
+class IPIndex:
+    def __init__(self, column, sorted_index):
+        self.column = column
+        self.sorted_index = sorted_index
+
+    def add(self, row):
+        pass
+
+    def get(self, value):
+        key = self.column.key_for(value)
+        if isinstance(key, int):
+            return self.sorted_index.between(key, key)
+        candidates = self.sorted_index.between(-1, -1)
+        return array('I', (row for row in candidates if self.column.key(row) == key))
+
+
+# Equality lookups on a name column, answered by binary search over the
+# column's sorted index like IPIndex (no postings kept per distinct value)
+class NameIndex:
+    def __init__(self, column, sorted_index):
+        self.column = column
+        self.sorted_index = sorted_index
+
+    def add(self, row):
+        pass
+
+    def get(self, value):
+        if value is None:
+            return EMPTY_POSITIONS
+        return self.sorted_index.between(value, value)
+
+
+# Tokens of free text for the text indexes: lower-cased runs of letters and
+# digits. Runs longer than MAX_TOKEN_LENGTH (hashes, encoded blobs) are left out.
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+MAX_TOKEN_LENGTH = 32
+
+# Postings per block of a text index term (a lookup decodes whole blocks)
+SKIP_INTERVAL = 128
+
+# Array typecode of the row gaps of a term by their width in bytes
+GAP_TYPECODES = {1: 'B', 2: 'H', 4: 'I'}
+
+# BM25 ranking: term frequency saturation and document length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_IMPACT_BYTES = [bytes((impact,)) for impact in range(256)]
+_IMPACT_WEIGHTS = [impact / 255 for impact in range(256)]
+
+
+def tokenize(text):
+    if not text:
+        return []
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    if max(map(len, tokens), default=0) > MAX_TOKEN_LENGTH:
+        tokens = [token for token in tokens if len(token) <= MAX_TOKEN_LENGTH]
+    return tokens
+
+
+def _gap_width(gaps):
+    largest = max(gaps, default=0)
+    return 1 if largest < 0x100 else 2 if largest < 0x10000 else 4
+
+
+# The BM25 weight of a term occurring occurrences times in a row of length
+# tokens, divided by k1 + 1 so that it lies in [0, 1)
+def bm25_weight(occurrences, length, average_length):
+    norm = BM25_K1 * (1.0 - BM25_B + BM25_B * length / average_length) if average_length else BM25_K1
+    return occurrences / (occurrences + norm)
+
+
+# bm25_weight quantized to a byte (at least 1), per (occurrences << 16 | length)
+class _Impacts(dict):
+    def __init__(self, average_length):
+        super().__init__()
+        self.average_length = average_length
+
+    def __missing__(self, key):
+        impact = self[key] = max(1, round(255 * bm25_weight(key >> 16, key & 0xFFFF, self.average_length)))
+        return impact
+
+
+# Inverted index over a free-text column: term -> the rows containing it in
+# ascending order with the number of times it occurs in each (capped at 255),
+# plus the number of tokens per row; search.py ranks matches from these.
+#
+# The rows of a term are stored as gaps to the previous one (the first to -1)
+# in the narrowest integer array that holds its largest gap, so frequent terms
+# take about a byte per row. An exported index keeps every term in flat
+# buffers: the sorted vocabulary (searched by bisection), per term the offset
+# and width of its gaps and the position of its first posting, the row before
+# every SKIP_INTERVAL-th posting, so that checking a few rows against a long
+# list decodes only the blocks that can hold them, and per posting its BM25
+# weight quantized to a byte (its impact), so the best rows for a term are
+# found by scanning bytes. Rows appended after a restore go to per-term tails
+# whose gaps continue the stored ones; their weights are computed when asked.
+#
+# Appending only notes the row: the rows not indexed yet are tokenized in one
+# pass by the first read (a search, or the export of a snapshot), so loading a
+# table never pays for full-text indexing it may not need.
+class TextIndex:
+    def __init__(self, column, meta=None, buffers=None):
+        self.column = column
+        # term -> [gaps, occurrences, last row, row the tail starts after]
+        self.tails = {}
+        self.terms = None
+        # Rows may be added by a loader thread while requests read the index
+        self._lock = threading.Lock()
+        if buffers:
+            self.terms = StringColumn(buffers['terms'], buffers['termOffsets'])
+            self.starts = buffers['starts']
+            self.widths = buffers['widths']
+            self.first = buffers['first']
+            self.skip_first = buffers['skipFirst']
+            self.skips = buffers['skips']
+            self.gaps = memoryview(buffers['gaps'])
+            self.occurrences = buffers['occurrences']
+            self.impacts = buffers['impacts']
+            self.lengths = NumberColumn(buffers['lengths'].format, buffers['lengths'])
+            self.tokens = meta['tokens']
+        else:
+            self.lengths = NumberColumn('H')
+            self.tokens = 0
+        # Rows below _indexed are in the index, rows up to _end wait for _catch_up
+        self._indexed = self._end = len(self.lengths)
+
+    def add(self, row):
+        self._end = row + 1
+
+    # Index the rows added since the last read
+    def _catch_up(self):
+        if self._indexed < self._end:
+            with self._lock:
+                if self._indexed < self._end:
+                    self._index(self._indexed, self._end)
+
+    def _index(self, start, end):
+        get = self.column.get
+        lengths = self.lengths
+        tails = self.tails
+        total = 0
+        for row in range(start, end):
+            tokens = tokenize(get(row))
+            lengths.append(len(tokens) if len(tokens) < 0xFFFF else 0xFFFF)
+            total += len(tokens)
+            for term, count in collections.Counter(tokens).items():
+                tail = tails.get(term)
+                if tail is None:
+                    last = self._stored_last(term)
+                    tail = tails[term] = [array('I'), array('B'), last, last]
+                tail[0].append(row - tail[2])
+                tail[1].append(count if count < 0xFF else 0xFF)
+                tail[2] = row
+        self.tokens += total
+        self._indexed = end
+
+    @property
+    def average_length(self):
+        return self.tokens / len(self.lengths) if len(self.lengths) else 0.0
+
+    # Position of term in the stored vocabulary, None if it is not there
+    def _term_id(self, term):
+        terms = self.terms
+        if terms is None:
+            return None
+        lo, hi = 0, len(terms)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if terms.get(mid) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(terms) and terms.get(lo) == term else None
+
+    def _stored_gaps(self, t):
+        width = self.widths[t]
+        start = self.starts[t]
+        return self.gaps[start:start + (self.first[t + 1] - self.first[t]) * width].cast(GAP_TYPECODES[width])
+
+    # Row of the i-th stored posting of term t
+    def _stored_row(self, t, i):
+        block = i // SKIP_INTERVAL
+        return self.skips[self.skip_first[t] + block] + sum(self._stored_gaps(t)[block * SKIP_INTERVAL:i + 1])
+
+    def _stored_last(self, term):
+        t = self._term_id(term)
+        return -1 if t is None else self._stored_row(t, self.first[t + 1] - self.first[t] - 1)
+
+    # Number of rows containing term
+    def count(self, term):
+        self._catch_up()
+        tail = self.tails.get(term)
+        t = self._term_id(term)
+        return ((self.first[t + 1] - self.first[t] if t is not None else 0) +
+                (len(tail[1]) if tail is not None else 0))
+
+    # The tail of term as (rows, weights), weights as bm25_weight
+    def _tail(self, term):
+        tail = self.tails.get(term)
+        if tail is None:
+            return [], []
+        # (another reader may be catching up: the occurrences are appended last)
+        size = len(tail[1])
+        rows = list(itertools.islice(itertools.accumulate(tail[0][:size], initial=tail[3]), 1, None))
+        average_length = self.average_length
+        lengths = self.lengths
+        return rows, [bm25_weight(count, lengths.get(row), average_length)
+                      for row, count in zip(rows, tail[1][:size])]
+
+    # Ascending rows containing term
+    def rows(self, term):
+        self._catch_up()
+        rows = []
+        t = self._term_id(term)
+        if t is not None:
+            rows.extend(itertools.islice(itertools.accumulate(self._stored_gaps(t), initial=-1), 1, None))
+        tail = self.tails.get(term)
+        if tail is not None:
+            size = len(tail[1])
+            rows.extend(itertools.islice(itertools.accumulate(tail[0][:size], initial=tail[3]), 1, None))
+        return rows
+
+    # {row: bm25_weight of term} for the rows of the ascending list rows that
+    # contain term. Long postings are decoded only around the rows asked for.
+    def lookup(self, term, rows):
+        self._catch_up()
+        found = {}
+        if not rows:
+            return found
+        wanted = None
+        t = self._term_id(term)
+        if t is not None:
+            first, end = self.first[t], self.first[t + 1]
+            impacts = self.impacts
+            gaps = self._stored_gaps(t)
+            if len(rows) * SKIP_INTERVAL < end - first:
+                skips = self.skips[self.skip_first[t]:self.skip_first[t + 1]]
+                decoded_block, block_rows = None, None
+                for row in rows:
+                    block = bisect.bisect_left(skips, row) - 1
+                    if block < 0:
+                        continue
+                    if block != decoded_block:
+                        offset = block * SKIP_INTERVAL
+                        block_rows = list(itertools.islice(itertools.accumulate(
+                            gaps[offset:offset + SKIP_INTERVAL], initial=skips[block]), 1, None))
+                        decoded_block = block
+                    i = bisect.bisect_left(block_rows, row)
+                    if i < len(block_rows) and block_rows[i] == row:
+                        found[row] = _IMPACT_WEIGHTS[impacts[first + block * SKIP_INTERVAL + i]]
+            else:
+                wanted = set(rows)
+                stored_rows = list(itertools.islice(itertools.accumulate(gaps, initial=-1), 1, None))
+                found.update(itertools.compress(
+                    zip(stored_rows, map(_IMPACT_WEIGHTS.__getitem__, impacts[first:end])),
+                    map(wanted.__contains__, stored_rows)))
+        if term in self.tails:
+            wanted = wanted or set(rows)
+            tail_rows, weights = self._tail(term)
+            found.update(itertools.compress(zip(tail_rows, weights), map(wanted.__contains__, tail_rows)))
+        return found
+
+    # The k rows of term with the highest weights as (weight, row), best
+    # first (ties in row order); the impacts of the stored postings are
+    # scanned from the highest value down until k rows are found
+    def best(self, term, k):
+        self._catch_up()
+        best = []
+        t = self._term_id(term)
+        if t is not None and k > 0:
+            first, end = self.first[t], self.first[t + 1]
+            impacts = bytes(self.impacts[first:end])
+            for impact in range(255, 0, -1):
+                needle = _IMPACT_BYTES[impact]
+                i = impacts.find(needle)
+                while i >= 0 and len(best) < k:
+                    best.append((_IMPACT_WEIGHTS[impact], self._stored_row(t, i)))
+                    i = impacts.find(needle, i + 1)
+                if len(best) == k:
+                    break
+        rows, weights = self._tail(term)
+        best.extend(zip(weights, rows))
+        best.sort(key=lambda item: (-item[0], item[1]))
+        return best[:k]
+
+    # Ascending rows containing every one of terms
+    def match_all(self, terms):
+        terms = sorted(set(terms), key=self.count)
+        if not terms:
+            return []
+        rows = self.rows(terms[0])
+        for term in terms[1:]:
+            if not rows:
+                break
+            rows = list(filter(self.lookup(term, rows).__contains__, rows))
+        return rows
+
+    # Rows whose text equals value (what Table.positions asks an index for)
+    def get(self, value):
+        value = value or ''
+        tokens = tokenize(value)
+        rows = self.match_all(tokens) if tokens else range(len(self.column))
+        return array('I', (row for row in rows if (self.column.get(row) or '') == value))
+
+    def memory_bytes(self):
+        return self.lengths.memory_bytes() + sum(
+            tail[0].itemsize * len(tail[0]) + len(tail[1]) for tail in self.tails.values())
+
+    def export(self):
+        self._catch_up()
+        terms = set(self.tails)
+        if self.terms is not None:
+            terms.update(self.terms.get(t) for t in range(len(self.terms)))
+        vocabulary = StringColumn()
+        starts, widths = array('Q', [0]), array('B')
+        first, skip_first = array('Q', [0]), array('Q', [0])
+        skips, gaps, occurrences, impacts = array('q'), bytearray(), array('B'), bytearray()
+        lengths = self.lengths.data
+        impact_of = _Impacts(self.average_length)
+        for term in sorted(terms):
+            term_gaps, term_occurrences = array('I'), array('B')
+            t = self._term_id(term)
+            if t is not None:
+                term_gaps.extend(self._stored_gaps(t))
+                term_occurrences.extend(self.occurrences[self.first[t]:self.first[t + 1]])
+            tail = self.tails.get(term)
+            if tail is not None:
+                term_gaps.extend(tail[0])
+                term_occurrences.extend(tail[1])
+            width = _gap_width(term_gaps)
+            # Each term's gaps start on a multiple of their width
+            gaps += bytes(-len(gaps) % 4)
+            starts[-1] = len(gaps)
+            gaps += array(GAP_TYPECODES[width], term_gaps).tobytes()
+            rows = list(itertools.accumulate(term_gaps, initial=-1))
+            skips.extend(rows[:len(term_gaps):SKIP_INTERVAL])
+            del rows[0]
+            impacts += bytes(map(impact_of.__getitem__, map(
+                operator.or_, map(operator.lshift, term_occurrences, itertools.repeat(16)),
+                map(lengths.__getitem__, rows))))
+            vocabulary.append(term)
+            widths.append(width)
+            starts.append(len(gaps))
+            occurrences.extend(term_occurrences)
+            first.append(len(occurrences))
+            skip_first.append(len(skips))
+        return {'tokens': self.tokens}, {
+            'terms': vocabulary.buffer, 'termOffsets': vocabulary.offsets, 'starts': starts, 'widths': widths,
+            'first': first, 'skipFirst': skip_first, 'skips': skips, 'gaps': gaps,
+            'occurrences': occurrences, 'impacts': impacts, 'lengths': lengths}
+
+    @classmethod
+    def restore(cls, column, meta, buffers):
+        return cls(column, meta, buffers)
+
+
+# Row positions ordered by key(row), ties in row order. Appends that arrive in
+# key order cost O(1); others wait in a pending list that is folded in (by
+# binary-search insertion, or a full re-sort if it grew large) on the next read.
+class SortedIndex:
+    # order: a previously exported order covering the first len(order) rows
+    def __init__(self, length, key, order=None):
+        self.key = key
+        self._pending = []
+        # Rows may be added by a loader thread while requests read the order
+        self._lock = threading.Lock()
+        if order is None:
+            self._order = array('I', sorted(range(length), key=key))
+        else:
+            self._order = order
+            self._pending.extend(range(len(order), length))
+        self._last = key(self._order[-1]) if len(self._order) else None
+
+    def add(self, row):
+        key = self.key(row)
+        with self._lock:
+            if self._pending or (len(self._order) and key < self._last):
+                self._pending.append(row)
+                return
+            if not isinstance(self._order, array):
+                self._order = mutable_array(self._order)
+            self._order.append(row)
+            self._last = key
+
+    @property
+    def order(self):
+        if self._pending:
+            with self._lock:
+                if self._pending:
+                    self._fold_pending()
+        return self._order
+
+    def _fold_pending(self):
+        key = self.key
+        pending = self._pending
+        self._pending = []
+        if len(pending) * 16 > len(self._order):
+            rows = list(self._order)
+            rows.extend(pending)
+            rows.sort(key=lambda row: (key(row), row))
+            self._order = array('I', rows)
+        else:
+            self._order = mutable_array(self._order)
+            for row in pending:
+                self._order.insert(self._bisect((key(row), row), True), row)
+        self._last = key(self._order[-1])
+
+    # First position whose (key, row) is > target (right) or >= target (left).
+    # target is a key, or a (key, row) tuple to break ties.
+    def _bisect(self, target, right):
+        order = self._order
+        key = self.key
+        with_row = isinstance(target, tuple)
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            row = order[mid]
+            probe = (key(row), row) if with_row else key(row)
+            if probe < target or (right and probe == target):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def bisect_left(self, target):
+        self.order
+        return self._bisect(target, False)
+
+    def bisect_right(self, target):
+        self.order
+        return self._bisect(target, True)
+
+    # Rows with lo <= key <= hi, in key order
+    def between(self, lo, hi):
+        return self.order[self.bisect_left(lo):self.bisect_right(hi)]
+
+    def count_between(self, lo, hi):
+        return max(0, self.bisect_right(hi) - self.bisect_left(lo))
+
+    def __len__(self):
+        return len(self._order) + len(self._pending)
+
+    def export(self):
+        return {}, {'order': self.order}
+
+
+# Column factories per field type
+def _number(typecode):
+    return lambda: NumberColumn(typecode)
+
+
+# Factory of a hidden field computed from another (top-level) field of every
+# appended record, e.g. a parsed timestamp. It is stored, indexed and
+# snapshotted like the others but left out of the records read back.
+class Derived:
+    def __init__(self, factory, source, compute):
+        self.factory = factory
+        self.source = source
+        self.compute = compute
+
+    def __call__(self):
+        return self.factory()
+
+
+STRING = StringColumn
+NAME = NameColumn
+CATEGORY = CategoryColumn
+IP = IPColumn
+
+# Schemas: (field, column factory). Dotted fields are nested one level deep
+# ('location.lat' is record['location']['lat']); order matches the JSON records,
+# followed by the Derived fields, which they do not have.
+THREAT_SCHEMA = [
+    ('id', STRING),
+    ('ipAddress', IP),
+    ('type', CATEGORY),
+    ('severity', CATEGORY),
+    ('lastSeen', STRING),
+    ('count', _number('i')),
+    ('description', STRING),
+    ('source', NAME),
+    ('location.lat', _number('d')),
+    ('location.lng', _number('d')),
+    ('location.country', CATEGORY),
+    ('location.city', NAME),
+]
+THREAT_INDEXES = ['id', 'ipAddress', 'severity', 'type', 'source', 'location.country', 'location.city',
+                  'description']
+
+TRAFFIC_SCHEMA = [
+    ('id', STRING),
+    ('timestamp', STRING),
+    ('sourceIP', IP),
+    ('destinationIP', IP),
+    ('protocol', CATEGORY),
+    ('port', _number('i')),
+    ('bytesTransferred', _number('q')),
+    ('packetsTransferred', _number('i')),
+    ('duration', _number('d')),
+    ('status', CATEGORY),
+    ('timestampEpoch', Derived(_number('q'), 'timestamp', epoch_seconds)),
+]
+TRAFFIC_INDEXES = ['id', 'sourceIP', 'destinationIP', 'protocol', 'status']
+
+LOGIN_SCHEMA = [
+    ('id', STRING),
+    ('timestamp', STRING),
+    ('username', NAME),
+    ('ipAddress', IP),
+    ('deviceInfo', NAME),
+    ('location', NAME),
+    ('status', CATEGORY),
+    ('behaviorType', CATEGORY),
+    ('anomalyScore', _number('d')),
+    ('description', STRING),
+    ('timestampEpoch', Derived(_number('q'), 'timestamp', epoch_seconds)),
+]
+LOGIN_INDEXES = ['id', 'ipAddress', 'username', 'status', 'behaviorType', 'description']
+
+
+# A dataset stored column by column. Behaves like a read-only list of dicts
+# (len, indexing, slicing, iteration) plus append/extend for loading.
+# Fields listed in indexes get an index that every append keeps up to date:
+# the id gets an IdIndex, IP and name fields a sorted index, free-text fields
+# a TextIndex (full-text search, catching up on its first read) and other
+# fields a ValueIndex.
+class Table:
+    def __init__(self, schema, indexes=(), parts=None):
+        self.schema = schema
+        self.index_fields = list(indexes)
+        self.columns = {}
+        self._layout = []
+        meta, buffers = parts if parts is not None else ({}, {})
+        for field, factory in schema:
+            if parts is not None:
+                column_meta = meta['columns'][field]
+                self.columns[field] = COLUMN_KINDS[column_meta['kind']].restore(
+                    column_meta, _buffers_for(buffers, 'column/' + field))
+            else:
+                self.columns[field] = factory()
+            if isinstance(factory, Derived):
+                continue
+            parent, _, child = field.partition('.')
+            if child:
+                if not self._layout or self._layout[-1][0] != parent or self._layout[-1][1] is None:
+                    self._layout.append((parent, []))
+                self._layout[-1][1].append((child, self.columns[field]))
+            else:
+                self._layout.append((field, None))
+        self._flat = [field.partition('.')[::2] + (self.columns[field],) for field, factory in schema
+                      if not isinstance(factory, Derived)]
+        self._derived = [(factory.source, factory.compute, self.columns[field]) for field, factory in schema
+                         if isinstance(factory, Derived)]
+        # (bound methods, looked up once)
+        self._prepares = [(parent, child, column.prepare) for parent, child, column in self._flat]
+        self._derived_prepares = [(source, compute, column.prepare) for source, compute, column in self._derived]
+        self._commits = [column.commit for _, _, column in self._flat + self._derived]
+        self._length = meta.get('length', 0)
+        self._generation = 0
+        self.indexes = {}
+        self.sorted_indexes = {}
+        self._index_list = []
+        # Exported sorted orders not asked for yet (see sorted_index)
+        self._stored_orders = {name: _buffers_for(buffers, 'sorted/' + name)['order']
+                               for name in meta.get('sorted', ())}
+        for field in self.index_fields:
+            column = self.columns[field]
+            index_buffers = _buffers_for(buffers, 'index/' + field)
+            if isinstance(column, IPColumn):
+                index = IPIndex(column, self.sorted_index(field, column.sort_key))
+            elif isinstance(column, NameColumn):
+                index = NameIndex(column, self.sorted_index(field, column.get))
+            elif isinstance(column, StringColumn) and field != 'id':
+                index = (TextIndex.restore(column, meta['indexes'][field], index_buffers)
+                         if parts is not None else TextIndex(column))
+            elif field == 'id':
+                index = (IdIndex.restore(column, meta['indexes'][field], index_buffers)
+                         if parts is not None else IdIndex(column))
+            else:
+                index = (ValueIndex.restore(column, meta['indexes'][field], index_buffers)
+                         if parts is not None else ValueIndex(column))
+            self.indexes[field] = index
+            self._index_list.append(index)
+
+    # The values of record as its columns store them, in schema order.
+    # ValueError, TypeError or OverflowError if a column cannot hold one;
+    # nothing is changed either way.
+    def prepare(self, record):
+        get = record.get
+        values = []
+        append = values.append
+        for parent, child, prepare in self._prepares:
+            value = get(parent)
+            if child:
+                value = value.get(child) if value is not None else None
+            append(prepare(value))
+        for source, compute, prepare in self._derived_prepares:
+            append(prepare(compute(get(source))))
+        return values
+
+    # Append a record prepared by prepare
+    def commit(self, values):
+        for commit, value in zip(self._commits, values):
+            commit(value)
+        row = self._length
+        self._length += 1
+        for index in self._index_list:
+            index.add(row)
+
+    def append(self, record):
+        self.commit(self.prepare(record))
+
+    # Append all of records, or none of them if one does not fit
+    def extend(self, records):
+        for values in [self.prepare(record) for record in records]:
+            self.commit(values)
+
+    def clear(self):
+        generation = self._generation
+        self.__init__(self.schema, self.index_fields)
+        self._generation = generation + 1
+
+    # Changes whenever the contents change (tables only grow between clears)
+    @property
+    def version(self):
+        return self._generation, self._length
+
+    # Flat representation of the table: (meta, buffers) where meta is JSON-able
+    # and buffers maps names to arrays/bytearrays. Table(schema, indexes,
+    # parts) rebuilds it; the buffers may then be read-only memoryviews.
+    def export(self):
+        meta = {'length': self._length, 'columns': {}, 'indexes': {}, 'sorted': []}
+        buffers = {}
+        for field, column in self.columns.items():
+            meta['columns'][field], parts = column.export()
+            buffers.update(('column/' + field + '/' + name, data) for name, data in parts.items())
+        for field, index in self.indexes.items():
+            if isinstance(index, (IPIndex, NameIndex)):
+                continue
+            meta['indexes'][field], parts = index.export()
+            buffers.update(('index/' + field + '/' + name, data) for name, data in parts.items())
+        # (copies: a request may create a sorted index meanwhile)
+        for name, index in list(self.sorted_indexes.items()):
+            meta['sorted'].append(name)
+            buffers['sorted/' + name + '/order'] = index.export()[1]['order']
+        for name, order in list(self._stored_orders.items()):
+            if name not in self.sorted_indexes and len(order) == self._length:
+                meta['sorted'].append(name)
+                buffers['sorted/' + name + '/order'] = order
+        return meta, buffers
+
+    # Row position of the record with this id, None if there is none
+    def find_id(self, record_id):
+        index = self.indexes.get('id')
+        if index is not None:
+            return index.get(record_id)
+        for i in range(self._length):
+            if self.value(i, 'id') == record_id:
+                return i
+        return None
+
+    # Register an observer whose add(row) is called for every appended row,
+    # starting with the rows already loaded from row replay_from on (observers
+    # restored from a snapshot have already seen the rows it contains)
+    def attach(self, observer, replay_from=0):
+        for row in range(replay_from, self._length):
+            observer.add(row)
+        self._index_list.append(observer)
+        return observer
+
+    # Sorted index registered under name, built on first use and maintained by
+    # append from then on. key maps a row position to its sort key.
+    def sorted_index(self, name, key):
+        index = self.sorted_indexes.get(name)
+        if index is None:
+            order = self._stored_orders.pop(name, None)
+            index = self.sorted_indexes[name] = SortedIndex(self._length, key, order)
+            self._index_list.append(index)
+        return index
+
+    # Ascending row positions whose field equals value (uses the index if any)
+    def positions(self, field, value):
+        index = self.indexes.get(field)
+        if index is not None:
+            return index.get(value)
+        column = self.columns[field]
+        key = column.key_for(value)
+        return array('I', (i for i in range(self._length) if column.key(i) == key))
+
+    # Single field of row i without building the whole record
+    def value(self, i, field):
+        return self.columns[field].get(i)
+
+    def row(self, i):
+        record = {}
+        columns = self.columns
+        for name, children in self._layout:
+            if children is None:
+                record[name] = columns[name].get(i)
+            else:
+                record[name] = {child: column.get(i) for child, column in children}
+        return record
+
+    def rows(self, positions):
+        return [self.row(i) for i in positions]
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.rows(range(*i.indices(self._length)))
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError('table index out of range')
+        return self.row(i)
+
+    def __iter__(self):
+        for i in range(self._length):
+            yield self.row(i)
+
+    def memory_bytes(self):
+        return sum(column.memory_bytes() for column in self.columns.values())
+
+
+# The buffers under prefix/ with the prefix stripped from their names
+def _buffers_for(buffers, prefix):
+    prefix += '/'
+    return {name[len(prefix):]: data for name, data in buffers.items() if name.startswith(prefix)}
+
+
+def threat_table(records=()):
+    table = Table(THREAT_SCHEMA, THREAT_INDEXES)
+    table.extend(records)
+    return table
+
+
+def traffic_table(records=()):
+    table = Table(TRAFFIC_SCHEMA, TRAFFIC_INDEXES)
+    table.extend(records)
+    return table
+
+
+def login_table(records=()):
+    table = Table(LOGIN_SCHEMA, LOGIN_INDEXES)
+    table.extend(records)
+    return table
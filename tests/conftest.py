@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+import ingest  # noqa: E402
+import store  # noqa: E402
+from synthetic import write_csv  # noqa: E402
+
+ROWS = 3000
+
+
+@pytest.fixture(scope='session')
+def csv_path(tmp_path_factory):
+    return write_csv(str(tmp_path_factory.mktemp('csv') / 'attacks.csv'), ROWS)
+
+
+# The three dataset tables ingested from the synthetic CSV
+@pytest.fixture(scope='session')
+def tables(csv_path):
+    tables = (store.threat_table(), store.traffic_table(), store.login_table())
+    ingest.process_cybersecurity_data(csv_path, targets=tables)
+    return tables
@@ -0,0 +1,31 @@
+from flask import Flask
+
+import cache
+import serialize
+
+
+class Versioned:
+    version = (0, 3)
+
+
+def test_streamed_response_is_cached_once_sent():
+    app = Flask(__name__)
+    response_cache = cache.ResponseCache()
+    table = Versioned()
+    calls = []
+
+    @app.route('/items')
+    @response_cache.cached(table)
+    def items():
+        calls.append(1)
+        return serialize.stream_response(iter([{'id': str(i)} for i in range(3)]))
+
+    client = app.test_client()
+    first = client.get('/items')
+    assert first.is_streamed and first.get_json() == [{'id': '0'}, {'id': '1'}, {'id': '2'}]
+    second = client.get('/items')
+    assert second.data == first.data and second.headers['ETag'] and len(calls) == 1
+    assert client.get('/items', headers={'If-None-Match': second.headers['ETag']}).status_code == 304
+    table.version = (0, 4)
+    client.get('/items').get_data()
+    assert len(calls) == 2
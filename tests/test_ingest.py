@@ -0,0 +1,50 @@
+import csv
+
+import geo
+import ingest
+import store
+from synthetic import FIELDS, synthetic_rows
+
+
+def test_bad_gazetteer_falls_back_once(tmp_path, monkeypatch, capsys):
+    path = tmp_path / 'gazetteer.csv'
+    path.write_text('city,country,lat,lng,network\nPune,India,18.52,73.85,\nAgra,India,north,78.0,\n')
+    monkeypatch.setenv('CTI_GAZETTEER_PATH', str(path))
+    monkeypatch.setattr(geo, '_default', None)
+    stats = ingest.IngestStats()
+    records = list(ingest.map_rows([{'Source IP Address': '1.2.3.4', 'Geo-location Data': 'Pune, Maharashtra',
+                                     'Attack Type': 'DDoS', 'Timestamp': '2023-01-01 00:00:00'}] * 2, stats))
+    assert len(records) == 2 and stats.skipped == 0
+    assert capsys.readouterr().out.count('Ignoring gazetteer') == 1
+    assert records[0][0]['location']['country'] == geo.FALLBACK_COUNTRY
+
+
+def test_parallel_ingest_matches_serial(csv_path, monkeypatch):
+    serial_stats = ingest.IngestStats()
+    serial = ingest.process_cybersecurity_data(csv_path, stats=serial_stats)
+    monkeypatch.setattr(ingest, 'MIN_PARALLEL_BYTES', 0)
+    monkeypatch.setattr(ingest, 'MIN_SHARD_BYTES', 1 << 16)
+    parallel_stats = ingest.IngestStats()
+    parallel = ingest.process_cybersecurity_data(csv_path, stats=parallel_stats, workers=2)
+    assert parallel_stats.workers == 2 and len(ingest.find_shard_boundaries(csv_path, 8, 0)) > 1
+    assert parallel == serial
+    counters = ('rows', 'skipped', 'threats', 'traffic', 'logins')
+    assert [getattr(parallel_stats, name) for name in counters] == [getattr(serial_stats, name) for name in counters]
+
+
+def test_out_of_range_rows_are_skipped(tmp_path):
+    rows = list(synthetic_rows(6))
+    rows[1]['Anomaly Scores'] = 'inf'
+    rows[2]['Destination Port'] = str(1 << 70)
+    rows[3]['Packet Length'] = str(1 << 62)
+    rows[4]['Anomaly Scores'] = 'nan'
+    path = tmp_path / 'attacks.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    stats = ingest.IngestStats()
+    tables = (store.threat_table(), store.traffic_table(), store.login_table())
+    ingest.process_cybersecurity_data(str(path), stats=stats, targets=tables)
+    assert stats.rows == 6 and stats.skipped == 4
+    assert [record['timestamp'] for record in tables[1]] == [rows[0]['Timestamp'], rows[5]['Timestamp']]
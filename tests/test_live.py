@@ -0,0 +1,128 @@
+import asyncio
+import csv
+import io
+import json
+import threading
+import time
+
+import pytest
+
+import live
+import store
+from synthetic import FIELDS, synthetic_rows
+
+
+def csv_bytes(rows, header=False):
+    text = io.StringIO()
+    writer = csv.writer(text)
+    if header:
+        writer.writerow(FIELDS)
+    writer.writerows(row.values() for row in rows)
+    return text.getvalue().encode('utf-8')
+
+
+def follower(path, **kwargs):
+    tables = (store.threat_table(), store.traffic_table(), store.login_table())
+    return live.LogFollower(str(path), tables, live.Broker(), poll_interval=0.01, **kwargs), tables
+
+
+def test_invalid_utf8_costs_one_line(tmp_path):
+    row = next(synthetic_rows(1))
+    path = tmp_path / 'live.jsonl'
+    path.write_bytes(b'')
+    jsonl, tables = follower(path)
+    jsonl.apply(json.dumps(row).encode('utf-8') + b'\n{"Source IP Address": "\xff\xfe"}\n')
+    assert len(tables[1]) == 1 and jsonl.ingest_stats.skipped == 1
+
+    row['Payload Data'] = 'cafe'
+    path = tmp_path / 'live.csv'
+    path.write_bytes(csv_bytes([], header=True))
+    reader, tables = follower(path)
+    reader.fieldnames = FIELDS
+    reader.apply(csv_bytes([row]).replace(b'cafe', b'caf\xff'))
+    assert len(tables[1]) == 1 and tables[0][0]['description'] == 'caf\ufffd'
+
+
+def test_follower_keeps_running_after_a_failed_batch(tmp_path):
+    rows = list(synthetic_rows(30))
+    path = tmp_path / 'live.csv'
+    path.write_bytes(csv_bytes(rows[:10], header=True))
+    thread, tables = follower(path, batch_rows=10)
+    apply = thread.apply
+    calls = []
+
+    def failing_once(data, end=None):
+        calls.append(end)
+        if len(calls) == 1:
+            raise RuntimeError('bad batch')
+        return apply(data, end)
+
+    thread.apply = failing_once
+    thread.start()
+    try:
+        with open(path, 'ab') as f:
+            f.write(csv_bytes(rows[10:]))
+        deadline = time.monotonic() + 10
+        while len(tables[1]) < 20 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        thread.stop()
+        thread.join()
+    assert thread.errors == 1 and len(tables[1]) == 20
+
+
+# table.<method> failing from its calls-th call on
+def fail_from(table, method, calls):
+    original = getattr(table, method)
+    made = []
+
+    def failing(*args):
+        made.append(1)
+        if len(made) >= calls:
+            raise ValueError(f'{method} failed')
+        return original(*args)
+
+    setattr(table, method, failing)
+
+
+def test_batch_that_does_not_fit_leaves_the_tables_untouched(tmp_path):
+    rows = list(synthetic_rows(10))
+    path = tmp_path / 'live.csv'
+    path.write_bytes(csv_bytes([], header=True))
+    reader, tables = follower(path)
+    reader.fieldnames = FIELDS
+    fail_from(tables[1], 'prepare', 5)
+    with pytest.raises(ValueError):
+        reader.apply(csv_bytes(rows))
+    assert [len(table) for table in tables] == [0, 0, 0] and reader.batches == 0
+
+
+def test_follower_stops_on_a_partly_applied_batch(tmp_path):
+    rows = list(synthetic_rows(10))
+    path = tmp_path / 'live.csv'
+    path.write_bytes(csv_bytes([], header=True))
+    thread, tables = follower(path)
+    fail_from(tables[1], 'commit', 5)
+    thread.start()
+    with open(path, 'ab') as f:
+        f.write(csv_bytes(rows))
+    thread.join(10)
+    assert not thread.is_alive() and thread.errors == 1
+    assert 'partly applied' in thread.stats()['failure'] and len(tables[1]) == 4
+
+
+def test_event_stream_awaits_events_without_a_thread():
+    broker = live.Broker()
+    events = broker.stream(broker.subscribe(), heartbeat=5)
+
+    async def read():
+        first = await events.__anext__()
+        threading.Timer(0.05, broker.publish, ('delta', {'n': 1})).start()
+        started = time.monotonic()
+        return first, await events.__anext__(), time.monotonic() - started
+
+    first, delta, waited = asyncio.run(read())
+    assert first.startswith(b'retry:') and b'event: delta' in delta and waited < 2
+    events.close()
+    events.close()
+    assert broker.stats()['subscribers'] == 0
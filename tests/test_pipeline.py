@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+
+import aggregate
+import correlate
+import ingest
+import search
+import segments
+import snapshot
+import stats
+import store
+import timeseries
+from conftest import ROWS
+from synthetic import pool_address, synthetic_rows, write_csv
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def test_synthetic_rows_are_reproducible(tmp_path):
+    first = write_csv(str(tmp_path / 'a.csv'), 500, seed=7)
+    second = write_csv(str(tmp_path / 'b.csv'), 500, seed=7)
+    other = write_csv(str(tmp_path / 'c.csv'), 500, seed=8)
+    assert file_digest(first) == file_digest(second) != file_digest(other)
+
+
+def test_synthetic_cardinality_grows_with_rows():
+    rows = list(synthetic_rows(20000))
+    assert len({row['Source IP Address'] for row in rows}) > 2000
+    assert len({row['User Information'] for row in rows}) > 500
+    assert len({row['Device Information'] for row in rows}) > 100
+    timestamps = [row['Timestamp'] for row in rows]
+    assert timestamps[0] < timestamps[len(rows) // 2] < timestamps[-1]
+
+
+def test_ingest_maps_every_row(tables):
+    threats, traffic, logins = tables
+    assert len(traffic) == ROWS
+    assert len(threats) + len(logins) > 0
+    assert threats.value(0, 'id') == '1'
+    assert all(record['ipAddress'] for record in threats)
+
+
+def test_snapshot_round_trip(tables, csv_path, tmp_path):
+    path = str(tmp_path / 'snapshot.bin')
+    snapshot.write(path, dict(zip(snapshot.DATASETS, tables)), [snapshot.fingerprint(csv_path)])
+    loaded = snapshot.load(path, [csv_path])
+    assert loaded is not None
+    for table, restored in zip(tables, loaded.datasets()):
+        assert list(restored) == list(table)
+    assert snapshot.load(path, [str(tmp_path / 'missing.csv')]) is None
+
+
+def test_search_finds_payload_words(tables):
+    threats, _, logins = tables
+    result = search.run({'threats': (threats, 'description'), 'logins': (logins, 'description')},
+                        {'q': 'login', 'limit': '5'})
+    assert result['items']
+    assert all('login' in item['record']['description'].lower().split() for item in result['items'])
+
+
+def test_ip_profile_joins_the_datasets(tables):
+    threats, traffic, logins = tables
+    correlation = correlate.correlate_tables(threats, traffic, logins)
+    busiest = pool_address(0, 42)
+    profile = correlation.profile(busiest, {})
+    expected = sum(record['sourceIP'] == busiest for record in traffic)
+    assert profile['summary']['traffic']['asSource'] == expected > 0
+    times = [event['time'] for event in profile['timeline'] if event['time'] is not None]
+    assert times == sorted(times, reverse=True)
+
+
+def test_threat_aggregates_count_every_threat(tables):
+    threats = tables[0]
+    exact = threats.attach(aggregate.ThreatAggregates(threats, len(threats)))
+    assert exact.exact and sum(exact.counts) == len(threats)
+    bounded = threats.attach(aggregate.ThreatAggregates(threats, 10))
+    assert len(bounded.keys) == 10 and not bounded.exact
+    true_counts = {exact.keys[slot]: exact.counts[slot] for slot in range(len(exact.keys))}
+    for slot, key in enumerate(bounded.keys):
+        assert bounded.counts[slot] - bounded.errors[slot] <= true_counts[key] <= bounded.counts[slot]
+
+
+def test_segment_log_cuts_a_torn_frame(tmp_path):
+    directory = str(tmp_path / 'log')
+    log = segments.SegmentLog(directory)
+    log.recover(0, None)
+    for i in range(3):
+        log.append({'records': [[], [], []], 'follow': ['live.csv', i]})
+    log.close()
+    path = log.path(0)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 3)
+    frames = []
+    segments.SegmentLog(directory).recover(0, frames.append)
+    assert [frame['follow'][1] for frame in frames] == [0, 1]
+
+
+def test_snapshot_header_holds_no_data(csv_path, tmp_path):
+    tables = (store.threat_table(), store.traffic_table(), store.login_table())
+    ingest.process_cybersecurity_data(csv_path, targets=tables)
+    path = str(tmp_path / 'snapshot.bin')
+    loaded = snapshot.build(path, tables, [csv_path])
+    with open(path, 'rb') as f:
+        header, _ = snapshot.read_header(f)
+    assert len(json.dumps(header)) < 20000
+    restored = timeseries.TrafficRollups(loaded.tables['traffic'], loaded.extras['traffic_rollups'])
+    original = timeseries.TrafficRollups(tables[1])
+    for row in range(len(tables[1])):
+        original.add(row)
+    assert restored.state()['rollups'] == original.state()['rollups']
+    groups, time_field = stats.DATASET_GROUPS['logins']
+    hours = stats.GroupStats(loaded.tables['logins'], groups, time_field, loaded.extras['stats']['logins']).hours
+    assert sum(hours.values()) == len(tables[2])
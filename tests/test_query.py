@@ -0,0 +1,12 @@
+import query
+
+
+def test_walked_pages_match_sorted_pages(tables, monkeypatch):
+    traffic = tables[1]
+    requests = [{'status': 'Blocked', 'sort': '-timestamp'},
+                {'status': 'Blocked,Flagged', 'sort': 'port', 'offset': '150', 'limit': '40'},
+                {'protocol': 'TCP', 'status': 'Allowed', 'sort': '-bytesTransferred'}]
+    walked = [query.run(traffic, 'traffic', args) for args in requests]
+    monkeypatch.setattr(query, 'WALK_RATIO', 0)
+    assert walked == [query.run(traffic, 'traffic', args) for args in requests]
+    assert all(page['items'] for page in walked)
@@ -0,0 +1,52 @@
+import pytest
+
+import store
+
+
+def test_id_lookup_of_non_ids_misses(tables):
+    ids = tables[0].indexes['id']
+    assert ids.get('1') == 0 and ids.get(str(len(ids))) == len(ids) - 1
+    for value in ('²', '٣', '9' * 5000, '01', str(len(ids) + 1), ''):
+        assert ids.get(value) is None
+
+
+def test_name_lookup_matches_a_scan(tables):
+    logins = tables[2]
+    username = logins.value(0, 'username')
+    expected = [row for row in range(len(logins)) if logins.value(row, 'username') == username]
+    assert list(logins.positions('username', username)) == expected
+    assert len(logins.positions('username', 'nobody at all')) == 0
+
+
+def test_text_index_catches_up_on_read():
+    column = store.StringColumn()
+    index = store.TextIndex(column)
+    for row, text in enumerate(['Login failed', 'shell upload', 'login OK login']):
+        column.append(text)
+        index.add(row)
+    assert index.rows('login') == [0, 2]
+    column.append('LOGIN again')
+    index.add(3)
+    assert index.rows('login') == [0, 2, 3]
+    meta, buffers = index.export()
+    restored = store.TextIndex.restore(column, meta, {name: memoryview(buffer) for name, buffer in buffers.items()})
+    column.append('no match')
+    restored.add(4)
+    column.append('login')
+    restored.add(5)
+    assert restored.rows('login') == [0, 2, 3, 5]
+    assert restored.lookup('login', [2, 4, 5]).keys() == {2, 5}
+
+
+def test_failed_append_changes_nothing(tables):
+    table = store.traffic_table()
+    records = [dict(record) for record in tables[1][:3]]
+    table.append(records[0])
+    bad = dict(records[2], port=1 << 70)
+    with pytest.raises(OverflowError):
+        table.append(bad)
+    with pytest.raises(OverflowError):
+        table.extend([records[1], bad])
+    assert len(table) == 1 and {len(column) for column in table.columns.values()} == {1}
+    table.extend(records[1:])
+    assert list(table) == records
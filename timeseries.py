@@ -0,0 +1,279 @@
+import bisect
+import itertools
+import re
+import threading
+from array import array
+
+from query import QueryError
+from store import NO_TIME, epoch_seconds
+
+# Time-windowed rollups of the traffic dataset.
+#
+# Traffic timestamps are parsed once, when a record is appended, into the
+# table's hidden timestampEpoch column (seconds since the Unix epoch, UTC),
+# which has a sorted index of its own. TrafficRollups is attached to the table
+# like the chart counts and adds every record to one bucket per granularity
+# (1 minute, 1 hour, 1 day): record count, bytes and packets transferred and
+# counts per status and protocol.
+#
+# series(since, until, step) answers from the coarsest rollup whose buckets
+# divide the step, so a chart of several months reads a few thousand hourly or
+# daily buckets - never the records. Steps are aligned to multiples of their
+# length since the epoch (days start at 00:00 UTC).
+#
+# The snapshot keeps the buckets of every granularity, so a warm start turns
+# each saved bucket into one list instead of merging minutes into hours and days.
+
+TIME_FIELD = 'timestampEpoch'
+
+# Rollup granularities: name -> seconds
+GRANULARITIES = {'1m': 60, '1h': 3600, '1d': 86400}
+
+# Step units: suffix -> seconds
+STEP_UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+
+# Steps picked when none is given: the finest one giving no more points than
+# there are non-empty minutes in the range (at least AUTO_MIN_POINTS, at most
+# MAX_POINTS), so sparse data is not padded with thousands of empty steps
+AUTO_STEPS = [60, 300, 900, 3600, 6 * 3600, 86400, 7 * 86400, 30 * 86400]
+AUTO_MIN_POINTS = 100
+
+# Most buckets returned by one query
+MAX_POINTS = 10000
+
+# Bucket fields: record count, summed bytes and packets transferred, then the
+# counts per status and per protocol as lists indexed by category code
+COUNT, BYTES, PACKETS, STATUS, PROTOCOL = range(5)
+
+
+def _new_bucket():
+    return [0, 0, 0, [], []]
+
+
+# Add n to counts[code], growing counts as needed
+def _bump(counts, code, n):
+    if code >= len(counts):
+        counts.extend([0] * (code + 1 - len(counts)))
+    counts[code] += n
+
+
+# Epoch seconds of a since/until parameter: epoch seconds, or a timestamp as
+# the records have them ("2023-05-30 06:33:58", ISO 8601, a bare date)
+def parse_time(raw, name):
+    try:
+        return int(raw)
+    except ValueError:
+        pass
+    seconds = epoch_seconds(raw)
+    if seconds == NO_TIME:
+        raise QueryError(f"'{name}' must be epoch seconds or a timestamp")
+    return seconds
+
+
+# Step length in seconds of a step parameter such as '5m', '1h' or '7d'
+def parse_step(raw):
+    match = re.fullmatch(r'(\d+)([mhd])', raw or '')
+    if not match or not int(match.group(1)):
+        raise QueryError("'step' must be a number of minutes, hours or days, e.g. 5m, 1h or 7d")
+    return int(match.group(1)) * STEP_UNITS[match.group(2)]
+
+
+# Buckets of one granularity: start (epoch seconds) -> bucket, plus the starts
+# in order (sorted again on the first read after an out-of-order bucket)
+class Rollup:
+    def __init__(self, seconds, new_bucket=_new_bucket):
+        self.seconds = seconds
+        self.new_bucket = new_bucket
+        self.buckets = {}
+        self._starts = []
+        self._sorted = True
+
+    # The bucket containing epoch, created if needed (the caller holds the lock)
+    def bucket(self, epoch):
+        start = epoch - epoch % self.seconds
+        bucket = self.buckets.get(start)
+        if bucket is None:
+            bucket = self.buckets[start] = self.new_bucket()
+            if self._starts and start < self._starts[-1]:
+                self._sorted = False
+            self._starts.append(start)
+        return bucket
+
+    # Bucket starts in [since, until), in order (the caller holds the lock)
+    def starts(self, since, until):
+        if not self._sorted:
+            self._starts.sort()
+            self._sorted = True
+        starts = self._starts
+        return starts[bisect.bisect_left(starts, since):bisect.bisect_left(starts, until)]
+
+    def __len__(self):
+        return len(self.buckets)
+
+    # Buckets of a saved state() entry, built in one pass (before any is added)
+    def restore(self, saved, statuses, protocols):
+        by_status = saved['byStatus'].tolist()
+        by_protocol = saved['byProtocol'].tolist()
+        starts = saved['starts'].tolist()
+        self.buckets = {
+            start: [count, nbytes, packets, by_status[i * statuses:(i + 1) * statuses],
+                    by_protocol[i * protocols:(i + 1) * protocols]]
+            for i, (start, count, nbytes, packets) in enumerate(
+                zip(starts, saved['counts'].tolist(), saved['bytes'].tolist(), saved['packets'].tolist()))}
+        self._starts = starts
+        self._sorted = False
+
+    # Saved form of the buckets: one array per bucket field, the counts per
+    # status and protocol flattened with every bucket padded to the given
+    # number of codes (the caller holds the lock)
+    def state(self, statuses, protocols):
+        buckets = list(self.buckets.values())
+        return {
+            'starts': array('q', self.buckets),
+            'counts': array('q', (bucket[COUNT] for bucket in buckets)),
+            'bytes': array('q', (bucket[BYTES] for bucket in buckets)),
+            'packets': array('q', (bucket[PACKETS] for bucket in buckets)),
+            'byStatus': array('q', itertools.chain.from_iterable(
+                bucket[STATUS] + [0] * (statuses - len(bucket[STATUS])) for bucket in buckets)),
+            'byProtocol': array('q', itertools.chain.from_iterable(
+                bucket[PROTOCOL] + [0] * (protocols - len(bucket[PROTOCOL])) for bucket in buckets)),
+        }
+
+
+# Traffic rollups per granularity; attach it to the traffic table
+# (table.attach) so it is filled with the existing rows and kept up to date.
+# state is a previous state(), e.g. from a snapshot of the same table.
+class TrafficRollups:
+    def __init__(self, table, state=None):
+        self.table = table
+        self.time = table.columns[TIME_FIELD]
+        self.bytes = table.columns['bytesTransferred']
+        self.packets = table.columns['packetsTransferred']
+        self.status = table.columns['status']
+        self.protocol = table.columns['protocol']
+        # Rows in time order, for the time range of the data
+        self.order = table.sorted_index(TIME_FIELD, self.time.key)
+        self.rollups = {name: Rollup(seconds, self._new_bucket) for name, seconds in GRANULARITIES.items()}
+        self._rollups = list(self.rollups.values())
+        self.total = 0
+        self.untimed = 0
+        # Rows may be added by a loader thread while requests read the buckets
+        self._lock = threading.Lock()
+        if state is not None:
+            for name, rollup in self.rollups.items():
+                rollup.restore(state['rollups'][name], state['statuses'], state['protocols'])
+            self.total = state['total']
+            self.untimed = state['untimed']
+
+    # Empty bucket with room for the statuses and protocols seen so far
+    def _new_bucket(self):
+        return [0, 0, 0, [0] * len(self.status.values), [0] * len(self.protocol.values)]
+
+    def add(self, row):
+        self.total += 1
+        epoch = self.time.get(row)
+        if epoch == NO_TIME:
+            self.untimed += 1
+            return
+        nbytes, packets = self.bytes.get(row), self.packets.get(row)
+        status, protocol = self.status.key(row), self.protocol.key(row)
+        with self._lock:
+            for rollup in self._rollups:
+                bucket = rollup.bucket(epoch)
+                bucket[COUNT] += 1
+                bucket[BYTES] += nbytes
+                bucket[PACKETS] += packets
+                counts = bucket[STATUS]
+                if status < len(counts):
+                    counts[status] += 1
+                else:
+                    _bump(counts, status, 1)
+                counts = bucket[PROTOCOL]
+                if protocol < len(counts):
+                    counts[protocol] += 1
+                else:
+                    _bump(counts, protocol, 1)
+
+    # (first, last) record time in epoch seconds, None without timed records
+    def extent(self):
+        order = self.order.order
+        first = self.order.bisect_right(NO_TIME)
+        if first >= len(order):
+            return None
+        return self.time.get(order[first]), self.time.get(order[-1])
+
+    # Traffic per step from since to until (epoch seconds, both included;
+    # default: the whole data), from the coarsest rollup dividing the step.
+    # Without a step the finest of AUTO_STEPS giving at most as many points as
+    # the range has non-empty minutes is used (see AUTO_MIN_POINTS). The series are returned column-wise, one value per
+    # step in the range (as chart libraries take them), plus their totals.
+    def series(self, since=None, until=None, step=None):
+        if since is None or until is None:
+            extent = self.extent() or (0, 0)
+            since = extent[0] if since is None else since
+            until = extent[1] if until is None else until
+        if since > until:
+            raise QueryError("'since' must not be after 'until'")
+        if step is None:
+            with self._lock:
+                occupied = len(self.rollups['1m'].starts(since - since % 60, until + 1))
+            most = min(MAX_POINTS, max(AUTO_MIN_POINTS, occupied))
+            step = next((step for step in AUTO_STEPS
+                         if until // step - since // step < most), AUTO_STEPS[-1])
+        start = since - since % step
+        end = until - until % step + step
+        points = (end - start) // step
+        if points > MAX_POINTS:
+            raise QueryError(f"more than {MAX_POINTS} buckets: use a longer 'step' or a shorter range")
+        name = max((name for name, seconds in GRANULARITIES.items() if step % seconds == 0),
+                   key=GRANULARITIES.get)
+
+        rollup = self.rollups[name]
+        counts, nbytes, packets = [0] * points, [0] * points, [0] * points
+        by_category = ({}, {})
+        with self._lock:
+            for bucket_start in rollup.starts(start, end):
+                bucket = rollup.buckets[bucket_start]
+                i = (bucket_start - start) // step
+                counts[i] += bucket[COUNT]
+                nbytes[i] += bucket[BYTES]
+                packets[i] += bucket[PACKETS]
+                for series, category_counts in zip(by_category, bucket[STATUS:]):
+                    for code, n in enumerate(category_counts):
+                        if n:
+                            if code not in series:
+                                series[code] = [0] * points
+                            series[code][i] += n
+
+        by_status, by_protocol = (
+            {column.values[code]: values for code, values in sorted(series.items())}
+            for column, series in zip((self.status, self.protocol), by_category))
+        return {
+            'since': start,
+            'until': end,
+            'step': step,
+            'rollup': name,
+            'total': {
+                'count': sum(counts),
+                'bytesTransferred': sum(nbytes),
+                'packetsTransferred': sum(packets),
+                'byStatus': {value: sum(values) for value, values in by_status.items()},
+                'byProtocol': {value: sum(values) for value, values in by_protocol.items()},
+            },
+            'time': list(range(start, end, step)),
+            'count': counts,
+            'bytesTransferred': nbytes,
+            'packetsTransferred': packets,
+            'byStatus': by_status,
+            'byProtocol': by_protocol,
+        }
+
+    # Snapshot state: the buckets of every granularity (Rollup.state), padded
+    # to the statuses and protocols seen so far
+    def state(self):
+        statuses, protocols = len(self.status.values), len(self.protocol.values)
+        with self._lock:
+            rollups = {name: rollup.state(statuses, protocols) for name, rollup in self.rollups.items()}
+            total, untimed = self.total, self.untimed
+        return {'total': total, 'untimed': untimed, 'statuses': statuses, 'protocols': protocols,
+                'rollups': rollups}